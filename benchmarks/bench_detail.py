@@ -0,0 +1,116 @@
+"""
+Compare the latency of the single-query detail endpoints with the previous two-query implementation
+
+    $ python benchmarks/bench_detail.py --books 333334 --authors-per-book 3 --requests 2000
+    $ python benchmarks/bench_detail.py --books 333334 --authors-per-book 3 --requests 2000 --without-indexes
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import create_app, db, LOG, LOGGER  # noqa: E402
+from src.models import Author, AuthorBook, Book  # noqa: E402
+
+
+def previous_book_detail(id):
+    book_instance = Book.query.get_or_404(id)
+    author_instance = AuthorBook.query.filter_by(book_id=book_instance.id).all()
+    return {
+        'id': book_instance.id,
+        'name': book_instance.name,
+        'publication_year': book_instance.publication_year,
+        'authors': [author.author_id for author in author_instance]
+    }, 200
+
+
+def previous_author_detail(id):
+    author_instance = Author.query.get_or_404(id)
+    author_book_instance = AuthorBook.query.filter_by(author_id=author_instance.id).all()
+    return {
+        'id': author_instance.id,
+        'name': author_instance.name,
+        'books': [book.book_id for book in author_book_instance]
+    }, 200
+
+
+def seed(books: int, authors: int, authors_per_book: int):
+    db.session.execute(Author.__table__.insert(), [{"id": i, "name": f"Author {i}"} for i in range(1, authors + 1)])
+    db.session.execute(
+        Book.__table__.insert(),
+        [{"id": i, "name": f"Book {i}", "edition": "1st", "publication_year": 1900 + i % 120}
+         for i in range(1, books + 1)],
+    )
+    db.session.execute(
+        AuthorBook.__table__.insert(),
+        [{"book_id": book_id, "author_id": author_id}
+         for book_id in range(1, books + 1) for author_id in random.sample(range(1, authors + 1), authors_per_book)],
+    )
+    db.session.commit()
+
+
+def measure(client, url_template: str, ids: list) -> list:
+    timings = []
+    for id in ids:
+        started = time.perf_counter()
+        response = client.get(url_template.format(id=id))
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.data
+    return timings
+
+
+def report(name: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<28} mean {statistics.mean(timings):7.3f} ms   p50 {statistics.median(timings):7.3f} ms   "
+          f"p95 {p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--authors", type=int, default=2000)
+    parser.add_argument("--authors-per-book", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000)
+    # Without the indexes on author_books both paths are dominated by the scan of the association table
+    parser.add_argument("--without-indexes", action="store_true",
+                        help="drop the author_books indexes, as before migration 9e4b7c1d2a58")
+    options = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(), "bench.db")
+    # Measure the queries: the response cache would answer the repeated IDs
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}", "TESTING": True,
+                      "RESPONSE_CACHE_BACKEND": "none"})
+    LOG.configure(LOGGER, level=logging.WARNING)
+    app.add_url_rule("/previous/books/<int:id>", "previous_book_detail", previous_book_detail)
+    app.add_url_rule("/previous/authors/<int:id>", "previous_author_detail", previous_author_detail)
+
+    with app.app_context():
+        db.create_all()
+        seed(options.books, options.authors, options.authors_per_book)
+        if options.without_indexes:
+            for index in AuthorBook.__table__.indexes:
+                index.drop(db.engine)
+
+        client = app.test_client()
+        book_ids = [random.randint(1, options.books) for _ in range(options.requests)]
+        author_ids = [random.randint(1, options.authors) for _ in range(options.requests)]
+
+        # Warm up the connection and the page cache
+        measure(client, "/books/{id}", book_ids[:100])
+        measure(client, "/previous/books/{id}", book_ids[:100])
+
+        report("GET /books/<id> (previous)", measure(client, "/previous/books/{id}", book_ids))
+        report("GET /books/<id>", measure(client, "/books/{id}", book_ids))
+        report("GET /authors/<id> (previous)", measure(client, "/previous/authors/{id}", author_ids))
+        report("GET /authors/<id>", measure(client, "/authors/{id}", author_ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compare the rows per second of the marshmallow listing path with the column-only serializer
+
+    $ python benchmarks/bench_serializers.py --books 10000 100000 --authors-per-book 2
+
+Each path loads every book with its author IDs, serializes them and encodes the JSON body:
+  marshmallow: ORM objects + selectinload + books_schema.dump + json.dumps (what jsonify did)
+  fast:        column-only rows + RowSerializer.dump + serializers.dumps (orjson when installed)
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from src import create_app, db, LOGGER  # noqa: E402
+from src.models import Author, AuthorBook, Book, books_schema  # noqa: E402
+from src.serializers import book_rows, dumps, orjson  # noqa: E402
+
+
+def seed(books: int, authors: int, authors_per_book: int):
+    db.session.execute(Author.__table__.delete())
+    db.session.execute(Book.__table__.delete())
+    db.session.execute(AuthorBook.__table__.delete())
+    db.session.execute(Author.__table__.insert(), [{"id": i, "name": f"Author {i}"} for i in range(1, authors + 1)])
+    db.session.execute(
+        Book.__table__.insert(),
+        [{"id": i, "name": f"Book {i}", "edition": "1st", "publication_year": 1900 + i % 120}
+         for i in range(1, books + 1)],
+    )
+    db.session.execute(
+        AuthorBook.__table__.insert(),
+        [{"book_id": book_id, "author_id": (book_id * 7 + n) % authors + 1}
+         for book_id in range(1, books + 1) for n in range(authors_per_book)],
+    )
+    db.session.commit()
+
+
+def marshmallow_path() -> tuple:
+    started = time.perf_counter()
+    rows = db.session.query(Book).options(selectinload(Book.authors)).order_by(Book.id).all()
+    fetched = time.perf_counter()
+    body = json.dumps(books_schema.dump(rows, many=True)).encode()
+    finished = time.perf_counter()
+    db.session.expunge_all()
+    return len(rows), fetched - started, finished - fetched, len(body)
+
+
+def fast_path() -> tuple:
+    started = time.perf_counter()
+    rows = db.session.query(*book_rows.columns(Book)).order_by(Book.id).all()
+    links = book_rows.linked_ids([row.id for row in rows])
+    fetched = time.perf_counter()
+    body = dumps(book_rows.serialize(rows, links))
+    finished = time.perf_counter()
+    return len(rows), fetched - started, finished - fetched, len(body)
+
+
+def report(name: str, path, repeat: int):
+    # Best of 'repeat' runs. Loading the author links is part of the fetch time in both paths
+    rows, fetch, serialize, size = min((path() for _ in range(repeat)), key=lambda run: run[1] + run[2])
+    total = fetch + serialize
+    print(f"  {name:<12} {rows / total:>10,.0f} rows/s   fetch {fetch * 1000:8.1f} ms   "
+          f"serialize+encode {serialize * 1000:8.1f} ms ({rows / serialize:>10,.0f} rows/s)   {size:,} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--authors", type=int, default=2000)
+    parser.add_argument("--authors-per-book", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args()
+
+    LOGGER.setLevel(logging.WARNING)
+    database = os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}", "TESTING": True})
+
+    print(f"JSON backend: {'orjson' if orjson is not None else 'json'}")
+    with app.app_context():
+        db.create_all()
+        for books in options.books:
+            seed(books, options.authors, options.authors_per_book)
+            print(f"{books:,} books")
+            report("marshmallow", marshmallow_path, options.repeat)
+            report("fast", fast_path, options.repeat)
+
+
+if __name__ == "__main__":
+    main()
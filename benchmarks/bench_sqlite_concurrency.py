@@ -0,0 +1,148 @@
+"""
+Measure the read throughput of the SQLite profiles while a bulk import writes to the database
+
+    $ python benchmarks/bench_sqlite_concurrency.py --books 100000 --readers 4 --import-rows 50000
+
+For each profile a fresh catalog is generated, then reader processes (like the workers of a WSGI server) request
+book details and list pages: first alone, then while the main process imports a CSV file through '/books/add/bulk'.
+The reads failing or waiting on the write lock show in the error count and the latency percentiles.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import create_app, db, LOG, LOGGER  # noqa: E402
+from src.catalog import generate_catalog  # noqa: E402
+
+
+def get_app(database: str, profile: str):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}",
+        "SQLITE_PROFILE": profile,
+        "RESPONSE_CACHE_BACKEND": "none",
+        "SLOW_QUERY_THRESHOLD_MS": None,
+        "METRICS_ENABLED": False,
+    })
+    LOG.configure(LOGGER, level=logging.WARNING)
+    return app
+
+
+def reader(database: str, profile: str, books: int, seed: int, stop, results):
+    rng = random.Random(seed)
+    client = get_app(database, profile).test_client()
+    timings = []
+    errors = []
+    while not stop.is_set():
+        url = f"/books/{rng.randint(1, books)}" if rng.random() < 0.8 else f"/books?start={rng.randint(1, books)}"
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+    results.put((timings, errors))
+
+
+def read_phase(database: str, profile: str, books: int, readers: int, seconds: float, write=None) -> dict:
+    # Fork: the readers start with the modules loaded, each creating its own engine
+    context = multiprocessing.get_context("fork")
+    stop = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=reader, args=(database, profile, books, seed, stop, results))
+                 for seed in range(readers)]
+
+    for process in processes:
+        process.start()
+    # Let the readers create their application before measuring
+    time.sleep(1)
+    started = time.perf_counter()
+    if write is None:
+        time.sleep(seconds)
+    else:
+        write()
+    stop.set()
+
+    timings = []
+    errors = []
+    for _ in processes:
+        process_timings, process_errors = results.get()
+        timings.extend(process_timings)
+        errors.extend(process_errors)
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    timings.sort()
+    return {
+        "reads": len(timings),
+        "reads_per_second": round(len(timings) / elapsed, 1),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95)], 2),
+        "p99_ms": round(timings[int(len(timings) * 0.99)], 2),
+        "max_ms": round(timings[-1], 2),
+        "errors": len(errors),
+        "seconds": round(elapsed, 2),
+    }
+
+
+def bulk_import(app, rows: int, authors: int, batch_size: int, result: dict):
+    rng = random.Random(1)
+    body = "name,edition,publication_year,authors\n" + "".join(
+        f"Imported Book {i},1st Edition,{rng.randint(1900, 2024)},{rng.randint(1, authors)}\n" for i in range(rows)
+    )
+    started = time.perf_counter()
+    response = app.test_client().post(f"/books/add/bulk?batch_size={batch_size}", data=body, content_type="text/csv")
+    result["status"] = response.status_code
+    result["seconds"] = round(time.perf_counter() - started, 2)
+
+
+def run_profile(profile: str, options) -> dict:
+    database = os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = get_app(database, profile)
+
+    authors = max(1, options.books // 5)
+    with app.app_context():
+        db.create_all()
+        generate_catalog(options.books, authors)
+
+    # Do not share the connections of the pool with the forked readers
+    with app.app_context():
+        db.engine.dispose()
+
+    idle = read_phase(database, profile, options.books, options.readers, options.seconds)
+    imported = {}
+    during_import = read_phase(database, profile, options.books, options.readers, options.seconds,
+                               lambda: bulk_import(app, options.import_rows, authors, options.batch_size, imported))
+
+    for phase, result in (("idle", idle), ("during import", during_import)):
+        print(f"{profile:<10} {phase:<14} {result['reads_per_second']:8.1f} reads/s  p50 {result['p50_ms']:8.2f} ms  "
+              f"p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  max {result['max_ms']:8.2f} ms  "
+              f"{result['errors']} errors")
+    print(f"{profile:<10} import of {options.import_rows:,} rows: {imported['seconds']} s "
+          f"(status {imported['status']})")
+    return {"idle": idle, "during_import": during_import, "import": imported}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--readers", type=int, default=4, help="reader processes")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of the read phase without import")
+    parser.add_argument("--import-rows", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows committed per transaction by the import")
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"])
+    options = parser.parse_args()
+
+    for profile in options.profiles:
+        run_profile(profile, options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Run scripted workloads against every author and book endpoint on a synthetic catalog
+
+    $ python benchmarks/run_benchmarks.py --books 1000 100000 --requests 200 --output benchmarks/results/run.json
+    $ python benchmarks/run_benchmarks.py --books 100000 --compare benchmarks/results/run.json
+
+For each catalog size a fresh SQLite database is generated with the 'generate-catalog' command code, then every
+workload sends its requests through the test client. Each workload reports p50/p95/p99 latency, throughput and the
+peak RSS of the process. The results are written as JSON so runs can be compared with --compare.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import create_app, db, LOG, LOGGER  # noqa: E402
+from src.catalog import generate_catalog  # noqa: E402
+from src.models import Author, Book  # noqa: E402
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(timings: list, fraction: float) -> float:
+    index = min(len(timings) - 1, max(0, round(fraction * len(timings)) - 1))
+    return timings[index]
+
+
+class Workload:
+    """
+    A named series of requests: 'build(rng, state)' returns the (method, url, keyword arguments) of the next one
+    """
+
+    def __init__(self, name: str, build, requests: int = None, expected=(200,), stream: bool = False):
+        self.name = name
+        self.build = build
+        self.requests = requests
+        self.expected = expected
+        self.stream = stream
+
+
+def json_body(value) -> dict:
+    return {"data": json.dumps(value), "content_type": "application/json"}
+
+
+def csv_body(header: str, rows: list) -> dict:
+    return {"data": header + "\n" + "\n".join(rows) + "\n", "content_type": "text/csv"}
+
+
+def next_cursor(client, url: str) -> str:
+    return json.loads(client.get(url).data)["next"]
+
+
+def get_workloads(client, books: int, authors: int) -> list:
+    """
+    Return the workloads and their shared state: reads first, then writes, the deletes removing what the adds
+    created
+    """
+
+    state = {"added_books": [], "added_authors": []}
+    second_books_page = next_cursor(client, "/books?limit=20&count=none")
+    second_authors_page = next_cursor(client, "/authors?limit=20&count=none")
+
+    def random_book(rng):
+        return rng.randint(1, books)
+
+    def random_author(rng):
+        return rng.randint(1, authors)
+
+    def add_book(rng):
+        return "POST", "/books/add", json_body({"name": f"Benchmark {rng.random()}", "edition": "1st Edition",
+                                                "publication_year": rng.randint(1900, 2024),
+                                                "authors": [random_author(rng)]})
+
+    def add_author(rng):
+        return "POST", "/authors/add", json_body({"name": f"Benchmark Author {rng.random()}"})
+
+    def batch_books(rng):
+        operations = [{"op": "update", "id": random_book(rng), "data": {"edition": "Benchmark Edition"}}
+                      for _ in range(10)]
+        operations = list({operation["id"]: operation for operation in operations}.values())
+        return "POST", "/books/batch", json_body({"mode": "best_effort", "operations": operations})
+
+    def batch_authors(rng):
+        operations = [{"op": "create", "data": {"name": f"Batch Author {rng.random()}"}} for _ in range(10)]
+        return "POST", "/authors/batch", json_body({"operations": operations})
+
+    def delete_added(key: str, url: str):
+        def build(rng):
+            return "DELETE", url.format(state[key].pop()), {}
+        return build
+
+    return [
+        Workload("list_books first page", lambda rng: ("GET", "/books", {})),
+        Workload("list_books keyset page", lambda rng: ("GET", second_books_page, {})),
+        Workload("list_books offset page", lambda rng: ("GET", f"/books?start={rng.randint(1, books)}&limit=20", {})),
+        Workload("list_books year filter",
+                 lambda rng: ("GET", f"/books?publication_year__gte={rng.randint(1900, 2024)}", {})),
+        Workload("list_books search", lambda rng: ("GET", f"/books?q={rng.choice(['river', 'sea', 'star'])}", {})),
+        Workload("book_detail", lambda rng: ("GET", f"/books/{random_book(rng)}", {})),
+        Workload("export_books", lambda rng: ("GET", "/books/export", {}), requests=1, stream=True),
+        Workload("list_authors first page", lambda rng: ("GET", "/authors", {})),
+        Workload("list_authors keyset page", lambda rng: ("GET", second_authors_page, {})),
+        Workload("list_authors name search",
+                 lambda rng: ("GET", f"/authors?name={rng.choice(['jorge', 'maria', 'rosa'])}", {})),
+        Workload("author_detail", lambda rng: ("GET", f"/authors/{random_author(rng)}", {})),
+        Workload("export_authors", lambda rng: ("GET", "/authors/export", {}), requests=1, stream=True),
+        Workload("stats", lambda rng: ("GET", "/stats", {})),
+        Workload("add_book", add_book, expected=(201,)),
+        Workload("add_author", add_author, expected=(201,)),
+        Workload("edit_book", lambda rng: ("PUT", f"/books/edit/{random_book(rng)}",
+                                           json_body({"edition": "Benchmark Edition"}))),
+        Workload("edit_author", lambda rng: ("PUT", f"/authors/edit/{random_author(rng)}",
+                                             json_body({"name": f"Edited Author {rng.random()}"}))),
+        Workload("batch_books 10 updates", batch_books),
+        Workload("batch_authors 10 creates", batch_authors),
+        Workload("add_author_bulk 100 rows",
+                 lambda rng: ("POST", "/authors/add/bulk",
+                              csv_body("name", [f"Bulk Author {rng.random()}" for _ in range(100)])),
+                 requests=10, expected=(201,)),
+        Workload("add_book_bulk 100 rows",
+                 lambda rng: ("POST", "/books/add/bulk",
+                              csv_body("name,edition,publication_year,authors",
+                                       [f"Bulk Book {rng.random()},1st Edition,2001,{random_author(rng)}"
+                                        for _ in range(100)])),
+                 requests=10, expected=(201,)),
+        Workload("delete_book", delete_added("added_books", "/books/delete/{}")),
+        Workload("delete_author", delete_added("added_authors", "/authors/delete/{}")),
+    ], state
+
+
+def run_workload(client, workload: Workload, requests: int, rng: random.Random, state: dict) -> dict:
+    count = workload.requests or requests
+    if workload.name.startswith("delete_"):
+        count = min(count, len(state["added_books" if workload.name == "delete_book" else "added_authors"]))
+
+    timings = []
+    started = time.perf_counter()
+    for _ in range(count):
+        method, url, options = workload.build(rng)
+        request_started = time.perf_counter()
+        response = client.open(url, method=method, buffered=not workload.stream, **options)
+        if workload.stream:
+            for _ in response.response:
+                pass
+        timings.append((time.perf_counter() - request_started) * 1000)
+
+        if response.status_code not in workload.expected:
+            raise RuntimeError(f"{workload.name}: {method} {url} returned {response.status_code}: {response.data}")
+        if workload.name == "add_book":
+            state["added_books"].append(json.loads(response.data)["id"])
+        elif workload.name == "add_author":
+            state["added_authors"].append(json.loads(response.data)["id"])
+
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "requests": count,
+        "mean_ms": round(statistics.mean(timings), 3) if timings else None,
+        "p50_ms": round(percentile(timings, 0.50), 3) if timings else None,
+        "p95_ms": round(percentile(timings, 0.95), 3) if timings else None,
+        "p99_ms": round(percentile(timings, 0.99), 3) if timings else None,
+        "throughput_rps": round(count / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_catalog(books: int, options) -> dict:
+    authors = options.authors or max(1, books // 5)
+    database = os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}",
+        "TESTING": True,
+        "RESPONSE_CACHE_BACKEND": options.cache_backend,
+        "LOG_LEVEL": "WARNING",
+        "SLOW_QUERY_THRESHOLD_MS": None,
+        "METRICS_DIR": os.path.join(os.path.dirname(database), "metrics"),
+    })
+    LOG.configure(LOGGER, level=logging.WARNING)
+
+    with app.app_context():
+        db.create_all()
+        generated = generate_catalog(books, authors, seed=options.seed)
+        print(f"{books:,} books, {authors:,} authors, {generated['links']:,} links generated in "
+              f"{generated['seconds']} s")
+
+        client = app.test_client()
+        client.get("/")
+        workloads, state = get_workloads(client, books, authors)
+        rng = random.Random(options.seed)
+
+        results = {}
+        for workload in workloads:
+            if options.only and not any(name in workload.name for name in options.only):
+                continue
+            results[workload.name] = run_workload(client, workload, options.requests, rng, state)
+            result = results[workload.name]
+            print(f"  {workload.name:<28} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                  f"p99 {result['p99_ms']:9.2f} ms  {result['throughput_rps']:9.1f} req/s  "
+                  f"peak RSS {result['peak_rss_mb']} MB")
+
+        counts = {"books": db.session.query(Book).count(), "authors": db.session.query(Author).count()}
+
+    return {"generated": generated, "final_counts": counts, "workloads": results}
+
+
+def compare(previous: dict, current: dict):
+    """
+    Print the p50/p95 change of every workload found in both runs
+    """
+
+    for books, catalog in current["catalogs"].items():
+        previous_catalog = previous["catalogs"].get(books)
+        if previous_catalog is None:
+            continue
+        print(f"{int(books):,} books compared with {previous['started_at']}")
+        for name, result in catalog["workloads"].items():
+            before = previous_catalog["workloads"].get(name)
+            if before is None or not before["p50_ms"] or not result["p50_ms"]:
+                continue
+            changes = [f"{key[:3]} {(result[key] - before[key]) / before[key] * 100:+7.1f}%"
+                       for key in ("p50_ms", "p95_ms")]
+            print(f"  {name:<28} {'  '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--authors", type=int, default=None, help="default: books / 5")
+    parser.add_argument("--requests", type=int, default=200, help="requests per workload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-backend", default="none", choices=("memory", "file", "none"),
+                        help="response cache used during the run (none measures the database path)")
+    parser.add_argument("--only", nargs="+", help="run the workloads whose name contains one of these words")
+    parser.add_argument("--output", help="JSON file receiving the results")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    options = parser.parse_args()
+
+    run = {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": vars(options),
+        "catalogs": {},
+    }
+    for books in options.books:
+        run["catalogs"][str(books)] = run_catalog(books, options)
+
+    if options.output:
+        os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+        with open(options.output, "w") as output:
+            json.dump(run, output, indent=2)
+        print(f"Results written to {options.output}")
+
+    if options.compare:
+        with open(options.compare) as previous:
+            compare(json.load(previous), run)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,35 @@ class Config(object):
     # Flask settings
     DEBUG = True
     TESTING = False
-    DATABASE_URI = "sqlite:///:memory:"
+    DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///./olist.db")
+
+    # Connection pool of the server databases (PostgreSQL): connections kept open, extra connections allowed under
+    # load, seconds before a connection is replaced, and a liveness check when a connection is taken from the pool
+    DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 10))
+    DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", 20))
+    DATABASE_POOL_RECYCLE = 1800
+    DATABASE_POOL_PRE_PING = True
+    DATABASE_POOL_TIMEOUT = 30
+
+    # Read replicas serving the list and detail views (comma separated URIs). A client reads from the primary for
+    # READ_YOUR_WRITES_SECONDS after it wrote; a failing replica is left out for REPLICA_RETRY_SECONDS.
+    DATABASE_REPLICA_URIS = [uri for uri in os.getenv("DATABASE_REPLICA_URIS", "").split(",") if uri]
+    READ_YOUR_WRITES_SECONDS = 5
+    REPLICA_CHECK_SECONDS = 5
+    REPLICA_RETRY_SECONDS = 30
+
+    # SQLite engine profile (see src/database.py): "default", or "production" for WAL, tuned pragmas and pooling
+    SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+
+    # Logging settings: level, 'json' or 'text' output, and the length above which a message is truncated
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = "json"
+    LOG_MAX_LENGTH = 1000
+
+    # SQL statements slower than this are logged with their query plan (None disables the slow query log)
+    SLOW_QUERY_THRESHOLD_MS = 200
+    # On PostgreSQL, plan the slow SELECT statements with EXPLAIN ANALYZE, which runs them a second time
+    SLOW_QUERY_EXPLAIN_ANALYZE = False
 
 
 class DevelopmentConfig(Config):
@@ -18,6 +46,8 @@ class DevelopmentConfig(Config):
     """
 
     SQLALCHEMY_ECHO = True
+    LOG_LEVEL = "DEBUG"
+    LOG_FORMAT = "text"
 
 
 class ProductionConfig(Config):
@@ -27,6 +57,8 @@ class ProductionConfig(Config):
 
     DEBUG = False
     DATABASE_URI = os.getenv("DATABASE_URI")
+    SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")
 
 
 class TestingConfig(Config):
@@ -35,6 +67,7 @@ class TestingConfig(Config):
     """
 
     TESTING = True
+    DATABASE_URI = "sqlite:///:memory:"
 
 
 app_config = {"development": DevelopmentConfig, "production": ProductionConfig, "testing": TestingConfig}
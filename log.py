@@ -1,7 +1,10 @@
+import atexit
 import datetime
+import json
 import logging
+import queue
 import sys
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
 is_color_log_presented = True
 try:
@@ -9,12 +12,74 @@ try:
 except ImportError:
     is_color_log_presented = False
 
+try:
+    from flask import has_request_context, request
+except ImportError:
+    has_request_context = None
+
+LOG_FORMATS = ("json", "text")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a record as one JSON object per line
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in ("method", "path", "endpoint"):
+            if hasattr(record, name):
+                entry[name] = getattr(record, name)
+        return json.dumps(entry, default=str)
+
+
+class TruncateFilter(logging.Filter):
+    """
+    Cut messages longer than 'max_length' characters, so a large payload is never queued or written in full
+    """
+
+    def __init__(self, max_length):
+        super().__init__()
+        self.max_length = max_length
+
+    def filter(self, record):
+        message = record.getMessage()
+        if self.max_length and len(message) > self.max_length:
+            record.msg = f"{message[:self.max_length]}... [{len(message) - self.max_length} characters truncated]"
+            record.args = None
+        return True
+
+
+class RequestFilter(logging.Filter):
+    """
+    Add the request being handled to the record, while the logging thread still has access to it
+    """
+
+    def filter(self, record):
+        if has_request_context is not None and has_request_context():
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+        return True
+
 
 class Log:
     def __init__(self, logfile_name):
         self.log_file_formatter = logging.Formatter("%(asctime)s %(levelname)-8s | %(message)s")
         self.log_file = logfile_name
         self.log_level = logging.DEBUG
+        self.log_format = "text"
+        self.max_length = 1000
+        self.listener = None
+        atexit.register(self.stop)
+
+    def get_formatter(self):
+        return JsonFormatter() if self.log_format == "json" else self.log_file_formatter
 
     def get_console_handler(self):
         """
@@ -23,7 +88,7 @@ class Log:
 
         console_handler = logging.StreamHandler(sys.stdout)
 
-        if is_color_log_presented:
+        if is_color_log_presented and self.log_format == "text":
             log_stream_format = " %(log_color)s%(asctime)s %(levelname)-8s%(reset)s | %(log_color)s%(message)s%(reset)s"
             # The available color names are 'black', 'red', 'green', 'yellow', 'blue', 'purple', 'cyan' and 'white'.
             log_stream_formatter = colorlog.ColoredFormatter(
@@ -38,7 +103,7 @@ class Log:
             )
             console_handler.setFormatter(log_stream_formatter)
         else:
-            console_handler.setFormatter(self.log_file_formatter)
+            console_handler.setFormatter(self.get_formatter())
 
         return console_handler
 
@@ -52,14 +117,58 @@ class Log:
         file_handler = TimedRotatingFileHandler(
             filename=datetime.datetime.now().strftime(self.log_file + "_%Y%m%d.log"),
             when="midnight",
+            delay=True,
         )
-        file_handler.setFormatter(self.log_file_formatter)
+        file_handler.setFormatter(self.get_formatter())
         return file_handler
 
     def get_logger(self, logger_name):
+        """
+        Return a logger that only puts records on a queue: a background thread formats and writes them
+        """
+
         logger = logging.getLogger(logger_name)
-        logger.setLevel(self.log_level)
-        logger.addHandler(self.get_console_handler())
-        logger.addHandler(self.get_file_handler())
         logger.propagate = False
+        self.configure(logger)
+        return logger
+
+    def configure(self, logger, level=None, log_format=None, max_length=None):
+        """
+        (Re)build the handlers of 'logger' with the given level, output format ('json' or 'text') and message limit
+        """
+
+        if level is not None:
+            self.log_level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        if log_format is not None:
+            if log_format not in LOG_FORMATS:
+                raise ValueError(f"The log format must be one of: {', '.join(LOG_FORMATS)}.")
+            self.log_format = log_format
+        if max_length is not None:
+            self.max_length = max_length
+
+        self.stop()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(RequestFilter())
+        queue_handler.addFilter(TruncateFilter(self.max_length))
+
+        self.listener = QueueListener(log_queue, self.get_console_handler(), self.get_file_handler())
+        self.listener.start()
+
+        logger.setLevel(self.log_level)
+        logger.addHandler(queue_handler)
         return logger
+
+    def stop(self):
+        """
+        Write the queued records and stop the logging thread
+        """
+
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
@@ -0,0 +1,142 @@
+"""summary tables for the catalog stats, kept by triggers
+
+Revision ID: 2b6f8d4a1c37
+Revises: 9e4b7c1d2a58
+Create Date: 2026-10-17 14:02:17.530962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b6f8d4a1c37'
+down_revision = '9e4b7c1d2a58'
+branch_labels = None
+depends_on = None
+
+TOTALS = ('catalog_totals', ('name', 'shard'), 'total')
+YEARS = ('book_year_counts', ('publication_year', 'shard'), 'books')
+AUTHORS = ('author_book_counts', ('author_id',), 'books')
+
+# Concurrent PostgreSQL transactions update different shards of the totals and of the year counts
+SHARD_EXPRESSIONS = {
+    'sqlite': '0',
+    'postgresql': '(txid_current() & 15)',
+}
+
+
+def add(counter, keys, delta):
+    table_name, key_columns, count_column = counter
+    columns = ', '.join(key_columns)
+    match = ' AND '.join(f'{column} = {key}' for column, key in zip(key_columns, keys))
+    return (f"INSERT INTO {table_name} ({columns}, {count_column}) SELECT {', '.join(keys)}, {delta} "
+            f'WHERE {keys[0]} IS NOT NULL '
+            f'ON CONFLICT ({columns}) DO UPDATE SET {count_column} = {table_name}.{count_column} + {delta}; '
+            f'DELETE FROM {table_name} WHERE {match} AND {count_column} = 0;')
+
+
+def stats_triggers(shard):
+    return {
+        'books': {
+            'INSERT': [add(YEARS, ('new.publication_year', shard), 1), add(TOTALS, ("'books'", shard), 1)],
+            'DELETE': [add(YEARS, ('old.publication_year', shard), -1), add(TOTALS, ("'books'", shard), -1)],
+            'UPDATE': ('publication_year', [add(YEARS, ('old.publication_year', shard), -1),
+                                            add(YEARS, ('new.publication_year', shard), 1)]),
+        },
+        'authors': {
+            'INSERT': [add(TOTALS, ("'authors'", shard), 1)],
+            'DELETE': [add(TOTALS, ("'authors'", shard), -1),
+                       'DELETE FROM author_book_counts WHERE author_id = old.id;'],
+        },
+        'author_books': {
+            'INSERT': [add(AUTHORS, ('new.author_id',), 1)],
+            'DELETE': [add(AUTHORS, ('old.author_id',), -1)],
+            'UPDATE': ('author_id', [add(AUTHORS, ('old.author_id',), -1), add(AUTHORS, ('new.author_id',), 1)]),
+        },
+    }
+
+
+def sqlite_upgrade(table_name, events):
+    trigger = f'{table_name}_stats'
+    op.execute(f"CREATE TRIGGER {trigger}_ai AFTER INSERT ON {table_name} BEGIN {' '.join(events['INSERT'])} END")
+    op.execute(f"CREATE TRIGGER {trigger}_ad AFTER DELETE ON {table_name} BEGIN {' '.join(events['DELETE'])} END")
+    if 'UPDATE' in events:
+        name, update = events['UPDATE']
+        op.execute(f"CREATE TRIGGER {trigger}_au AFTER UPDATE OF {name} ON {table_name} "
+                   f"WHEN old.{name} IS NOT new.{name} BEGIN {' '.join(update)} END")
+
+
+def postgresql_upgrade(table_name, events):
+    trigger = f'{table_name}_stats'
+    branches = (f"IF TG_OP = 'INSERT' THEN {' '.join(events['INSERT'])} "
+                f"ELSIF TG_OP = 'DELETE' THEN {' '.join(events['DELETE'])} ")
+    operations = 'INSERT OR DELETE'
+    if 'UPDATE' in events:
+        name, update = events['UPDATE']
+        branches += f"ELSIF old.{name} IS DISTINCT FROM new.{name} THEN {' '.join(update)} "
+        operations += f' OR UPDATE OF {name}'
+
+    op.execute(f'CREATE OR REPLACE FUNCTION {trigger}() RETURNS trigger AS $$ BEGIN {branches}END IF; RETURN NULL; '
+               f'END; $$ LANGUAGE plpgsql')
+    op.execute(f'CREATE TRIGGER {trigger} AFTER {operations} ON {table_name} FOR EACH ROW EXECUTE PROCEDURE {trigger}()')
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('catalog_totals',
+                    sa.Column('name', sa.String(length=32), nullable=False),
+                    sa.Column('shard', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('total', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('name', 'shard')
+                    )
+    op.create_table('book_year_counts',
+                    sa.Column('publication_year', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('shard', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('books', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('publication_year', 'shard')
+                    )
+    op.create_table('author_book_counts',
+                    sa.Column('author_id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('books', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('author_id')
+                    )
+    op.create_index('ix_author_book_counts_books', 'author_book_counts', [sa.text('books DESC'), 'author_id'],
+                    unique=False)
+    # ### end Alembic commands ###
+
+    # Count the rows written before this migration, then keep counting with the triggers
+    op.execute("INSERT INTO catalog_totals (name, shard, total) "
+               "SELECT 'authors', 0, count(*) FROM authors HAVING count(*) > 0")
+    op.execute("INSERT INTO catalog_totals (name, shard, total) "
+               "SELECT 'books', 0, count(*) FROM books HAVING count(*) > 0")
+    op.execute('INSERT INTO book_year_counts (publication_year, shard, books) '
+               'SELECT publication_year, 0, count(*) FROM books GROUP BY publication_year')
+    op.execute('INSERT INTO author_book_counts (author_id, books) '
+               'SELECT author_id, count(*) FROM author_books WHERE author_id IS NOT NULL GROUP BY author_id')
+
+    dialect = op.get_bind().dialect.name
+    for table_name, events in stats_triggers(SHARD_EXPRESSIONS.get(dialect, '0')).items():
+        if dialect == 'sqlite':
+            sqlite_upgrade(table_name, events)
+        elif dialect == 'postgresql':
+            postgresql_upgrade(table_name, events)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table_name in ('books', 'authors', 'author_books'):
+        trigger = f'{table_name}_stats'
+        if dialect == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {trigger}_{suffix}')
+        elif dialect == 'postgresql':
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger} ON {table_name}')
+            op.execute(f'DROP FUNCTION IF EXISTS {trigger}()')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index('ix_author_book_counts_books', table_name='author_book_counts')
+    op.drop_table('author_book_counts')
+    op.drop_table('book_year_counts')
+    op.drop_table('catalog_totals')
+    # ### end Alembic commands ###
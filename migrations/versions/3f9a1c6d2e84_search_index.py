@@ -0,0 +1,72 @@
+"""full-text search index for book and author names
+
+Revision ID: 3f9a1c6d2e84
+Revises: bbc7afb61a4f
+Create Date: 2026-10-17 10:12:41.208417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c6d2e84'
+down_revision = 'bbc7afb61a4f'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = {
+    'authors': ('name',),
+    'books': ('name', 'edition'),
+}
+
+
+def sqlite_upgrade(table_name, columns):
+    fts = f'{table_name}_fts'
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+
+    op.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table_name}', content_rowid='id', "
+               f"tokenize='unicode61 remove_diacritics 2')")
+    op.execute(f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+               f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END")
+    op.execute(f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+               f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END")
+    op.execute(f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table_name} BEGIN "
+               f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+               f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END")
+    # Index the rows written before this migration
+    op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def sqlite_downgrade(table_name):
+    fts = f'{table_name}_fts'
+    for suffix in ('ai', 'ad', 'au'):
+        op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+    op.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table_name, columns in SEARCH_COLUMNS.items():
+        if dialect == 'sqlite':
+            sqlite_upgrade(table_name, columns)
+        elif dialect == 'postgresql':
+            for name in columns:
+                op.create_index(
+                    f'ix_{table_name}_{name}_search',
+                    table_name,
+                    [sa.text(f"to_tsvector('simple', coalesce({name}, ''))")],
+                    postgresql_using='gin',
+                )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table_name, columns in SEARCH_COLUMNS.items():
+        if dialect == 'sqlite':
+            sqlite_downgrade(table_name)
+        elif dialect == 'postgresql':
+            for name in columns:
+                op.drop_index(f'ix_{table_name}_{name}_search', table_name=table_name)
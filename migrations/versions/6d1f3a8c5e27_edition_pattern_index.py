@@ -0,0 +1,27 @@
+"""index of the book editions for the prefix filter on PostgreSQL
+
+Revision ID: 6d1f3a8c5e27
+Revises: 2b6f8d4a1c37
+Create Date: 2026-10-17 18:36:52.104385
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6d1f3a8c5e27'
+down_revision = '2b6f8d4a1c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # LIKE 'prefix%' only uses an index of the pattern operators under a collation other than C
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index('ix_books_edition_pattern', 'books', ['edition'], unique=False,
+                        postgresql_ops={'edition': 'text_pattern_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_books_edition_pattern', table_name='books')
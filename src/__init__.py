@@ -3,13 +3,14 @@ import os
 from flask import Flask, jsonify
 from flask_marshmallow import Marshmallow
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
 
 from log import Log
+from src.database import Database
 
-LOGGER = Log("work-at-olist").get_logger(logger_name="app")
+LOG = Log("work-at-olist")
+LOGGER = LOG.get_logger(logger_name="app")
 
-db = SQLAlchemy()
+db = Database()
 ma = Marshmallow()
 
 ALLOWED_EXTENSIONS = {'csv'}
@@ -21,6 +22,32 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def load_config(app, test_config=None):
+    """
+    Add the configuration class named by FLASK_CONFIG and the instance config.py, or the test configuration, to the
+    defaults of 'app'
+    """
+
+    if test_config is None:
+        config_name = os.getenv("FLASK_CONFIG")
+        if config_name is not None:
+            LOGGER.info(f"Get configs from the {config_name} configuration of config.py")
+            from config import app_config
+            if config_name not in app_config:
+                raise ValueError(f"FLASK_CONFIG must be one of: {', '.join(app_config)}.")
+            app.config.from_object(app_config[config_name])
+
+        LOGGER.info("test-config is None. Get configs from the instance config.py")
+        app.config.from_pyfile("config.py", silent=True)
+    else:
+        LOGGER.info(f"test-config is not None ({test_config}). Add configs from mapping")
+        app.config.from_mapping(test_config)
+
+    # The config classes name the database DATABASE_URI
+    if app.config.get("DATABASE_URI"):
+        app.config["SQLALCHEMY_DATABASE_URI"] = app.config["DATABASE_URI"]
+
+
 def create_app(test_config=None):
     LOGGER.info("Initialize Flask app")
     app = Flask(__name__, instance_relative_config=True)
@@ -28,15 +55,42 @@ def create_app(test_config=None):
         SECRET_KEY="TeMpOrArY",
         SQLALCHEMY_DATABASE_URI="sqlite:///./olist.db",
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
-        UPLOAD_FOLDER=UPLOAD_FOLDER
+        SQLITE_PROFILE="default",
+        DATABASE_POOL_SIZE=10,
+        DATABASE_MAX_OVERFLOW=20,
+        DATABASE_POOL_RECYCLE=1800,
+        DATABASE_POOL_PRE_PING=True,
+        DATABASE_POOL_TIMEOUT=30,
+        DATABASE_REPLICA_URIS=[],
+        READ_YOUR_WRITES_SECONDS=5,
+        REPLICA_CHECK_SECONDS=5,
+        REPLICA_RETRY_SECONDS=30,
+        UPLOAD_FOLDER=UPLOAD_FOLDER,
+        COUNT_CACHE_TTL=300,
+        BULK_BATCH_SIZE=1000,
+        IMPORT_WORKERS=2,
+        IMPORT_JOB_STALE_SECONDS=60,
+        IMPORT_JOB_HEARTBEAT_SECONDS=15,
+        BATCH_MAX_OPERATIONS=1000,
+        RESPONSE_CACHE_BACKEND="memory",
+        RESPONSE_CACHE_TTL=60,
+        RESPONSE_CACHE_MAX_ENTRIES=1024,
+        RESPONSE_CACHE_DIR=None,
+        EXPORT_CHUNK_SIZE=1000,
+        LOG_LEVEL="INFO",
+        LOG_FORMAT="json",
+        LOG_MAX_LENGTH=1000,
+        METRICS_ENABLED=True,
+        METRICS_DIR=None,
+        SLOW_QUERY_THRESHOLD_MS=200,
+        SLOW_QUERY_LOG=None,
+        SLOW_QUERY_EXPLAIN_ANALYZE=False,
     )
 
-    if test_config is None:
-        LOGGER.info("test-config is None. Get configs from config.py")
-        app.config.from_pyfile("config.py", silent=True)
-    else:
-        LOGGER.info(f"test-config is not None ({test_config}). Add configs from mapping")
-        app.config.from_mapping(test_config)
+    load_config(app, test_config)
+
+    LOG.configure(LOGGER, level=app.config["LOG_LEVEL"], log_format=app.config["LOG_FORMAT"],
+                  max_length=app.config["LOG_MAX_LENGTH"])
 
     LOGGER.info("Create 'instance' folder")
     try:
@@ -44,6 +98,9 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    from src.replicas import configure_replicas, install_replicas
+    configure_replicas(app)
+
     LOGGER.info("Initialize the application for the use with its DB")
     db.init_app(app)
 
@@ -57,6 +114,31 @@ def create_app(test_config=None):
     from src.book import book as book_blueprint
     app.register_blueprint(book_blueprint)
 
+    from src.search import search as search_blueprint
+    app.register_blueprint(search_blueprint)
+
+    from src.imports import imports as imports_blueprint
+    app.register_blueprint(imports_blueprint)
+
+    from src.stats import stats as stats_blueprint
+    app.register_blueprint(stats_blueprint)
+
+    from src.metrics import install_metrics
+    install_metrics(app)
+    install_replicas(app)
+
+    from src.slow_queries import slow_queries_command
+    app.cli.add_command(slow_queries_command)
+
+    from src.catalog import generate_catalog_command
+    app.cli.add_command(generate_catalog_command)
+
+    from src.stats.summary import rebuild_stats_command
+    app.cli.add_command(rebuild_stats_command)
+
+    from src.imports.jobs import install_import_jobs
+    install_import_jobs(app)
+
     # Error handling
     @app.errorhandler(400)
     def bad_request(e):
@@ -1,101 +1,102 @@
+import csv
 import os
-from csv import DictReader
 
 from flask import abort, jsonify, request, url_for
 from sqlalchemy.exc import SQLAlchemyError
-from werkzeug.utils import secure_filename
 
 from . import author
-from .. import allowed_file, current_dir, db, LOGGER
-from ..models import Author, authors_schema, author_schema, AuthorBook
-
-
-def get_paginated_list(query_result: list, url: str, start: int, limit: int) -> dict:
-    """
-    Return a paginate response
-    """
-
-    if not isinstance(start, int):
-        start = int(start)
-
-    if not isinstance(limit, int):
-        limit = int(limit)
-
-    count = len(query_result)
-
-    if count < start:
-        abort(404)
-
-    pages = {"start": start, "limit": limit, "count": count}
-
-    LOGGER.info("Build the urls to return")
-    if start == 1:
-        pages["previous"] = ""
-    else:
-        start_copy = max(1, start - limit)
-        limit_copy = start - 1
-        pages["previous"] = url + "?start=%d&limit=%d" % (start_copy, limit_copy)
-
-    if start + limit > count:
-        pages["next"] = ""
-    else:
-        start_copy = start + limit
-        pages["next"] = url + "?start=%d&limit=%d" % (start_copy, limit)
-
-    LOGGER.info("Extract result according to the bounds")
-    pages["results"] = query_result[(start - 1): (start - 1 + limit)]
-    return pages
+from .. import current_dir, db, LOGGER
+from ..batch import clean_author_fields, run_batch
+from ..bulk import (delete_rows, get_batch_size, get_resume_from, get_upload_stream, import_authors,
+                    ImportReport, open_csv)
+from ..cache import cached
+from ..export import export_response
+from ..imports.jobs import is_async_request, submit_import
+from ..models import Author, author_schema, AuthorBook
+from ..pagination import paginate
+from ..queries import aggregate_ids, split_ids
+from ..replicas import raise_replica_error, read_replica
+from ..search.index import match_clause
+from ..serializers import author_rows, json_response
+from ..versions import conditional
 
 
 # Author views
 @author.route("/authors", methods=["GET"])
 @author.route("/authors/page/<int:page>")
-def list_authors(page=1, per_page=20):
+@read_replica
+@conditional("authors", "author_books")
+@cached("authors", "author_books")
+def list_authors(page=None, per_page=20):
     """
     List all authors
     """
 
     LOGGER.info("Get the list of authors from the database")
-    all_authors = None
-    try:
-        query = db.session.query(Author)
+    # Column-only rows: the books of the whole page are loaded with one extra query by the serializer
+    query = db.session.query(*author_rows.columns(Author))
 
-        if "name" in request.args:
-            query = query.filter(Author.name.like(f'%{request.args.get("name")}%'))
+    if "q" in request.args:
+        query = query.filter(match_clause(Author, request.args.get("q")))
 
-        all_authors = authors_schema.dump(query.order_by(Author.name.asc()).all(), many=True)
+    if "name" in request.args:
+        query = query.filter(match_clause(Author, request.args.get("name"), columns=("name",)))
 
-    except Exception as error:
-        LOGGER.error(f"ExceptionError: {error}")
+    try:
+        all_authors = paginate(
+            query=query,
+            columns=(Author.name, Author.id),
+            schema=author_rows,
+            endpoint="author.list_authors",
+            page=page,
+            per_page=per_page,
+        )
+    except SQLAlchemyError as error:
+        raise_replica_error(error)
+        LOGGER.error(f"SQLAlchemyError: {error}")
         abort(500, error)
 
-    if all_authors is None:
-        return jsonify({"message": "There is no data to show"})
+    LOGGER.info(f"Response the list of authors: {len(all_authors['results'])} results")
+    return json_response(all_authors)
 
-    LOGGER.info(f"Response the list of authors: {all_authors}")
-    return get_paginated_list(
-        query_result=all_authors,
-        url=url_for("author.list_authors"),
-        start=request.args.get("start", page),
-        limit=request.args.get("limit", per_page),
-    )
+
+@author.route("/authors/export", methods=["GET"])
+def export_authors():
+    """
+    Stream all authors with their book IDs as NDJSON or CSV
+    """
+
+    query = db.session.query(Author.id, Author.name).order_by(Author.id)
+    return export_response(query, AuthorBook.author_id, AuthorBook.book_id, "books", "authors")
 
 
 @author.route("/authors/<int:id>", methods=["GET"])
+@read_replica
+@conditional("authors", "author_books")
+@cached("authors", "author_books")
 def author_detail(id):
     """
     List details for an author
     """
 
-    author_instance = Author.query.get_or_404(id)
-    author_book_instance = AuthorBook.query.filter_by(author_id=author_instance.id).all()
-    books = [book.book_id for book in author_book_instance]
+    # Fetch the author columns and its book IDs in a single query
+    author_row = (
+        db.session.query(Author.id, Author.name, aggregate_ids(AuthorBook.book_id))
+        .outerjoin(AuthorBook, AuthorBook.author_id == Author.id)
+        .filter(Author.id == id)
+        .group_by(Author.id)
+        .first()
+    )
+    if author_row is None:
+        abort(404)
+
+    author_id, name, books = author_row
 
-    LOGGER.info(f"Return details for the author: '{author_instance.name}'")
+    LOGGER.info(f"Return details for the author: '{name}'")
     return {
-        'id': author_instance.id,
-        'name': author_instance.name,
-        'books': books
+        'id': author_id,
+        'name': name,
+        'books': split_ids(books)
     }, 200
 
 
@@ -139,31 +140,56 @@ def add_author_bulk():
 
     LOGGER.info('Import authors in bulk')
 
-    csv_file = 'author/authors_bulk.csv'
-    data_file = os.path.join(current_dir, csv_file)
+    default_file = None
+    stream = get_upload_stream()
+    if stream is None:
+        LOGGER.info('There is no file in the request. Using the default one.')
+        default_file = stream = open(os.path.join(current_dir, 'author/authors_bulk.csv'), 'rb')
+
+    try:
+        return import_author_stream(stream)
+    finally:
+        if default_file is not None:
+            default_file.close()
 
-    if 'csv_upload' in request.files:
-        LOGGER.info('Request there is a file part. Using it.')
-        data_file = request.files['csv_upload']
-        if data_file and allowed_file(data_file.filename):
-            filename = secure_filename(data_file.filename)
-            data_file.save(os.path.join(current_dir, f'static/{filename}'))
-            data_file = os.path.join(current_dir, f'static/{data_file.filename}')
 
-    with open(data_file, newline='') as csv_file:
-        reader = DictReader(csv_file)
+def import_author_stream(stream):
+    """
+    Import the authors of a CSV stream, in the request or as a background job
+    """
 
-        LOGGER.info("Add authors in bulk to the database")
-        try:
-            db.session.bulk_insert_mappings(Author, reader)
-            db.session.commit()
-        except SQLAlchemyError as e:
-            db.session.rollback()
-            abort(403, f"SQLAlchemyError: {e}")
-        except Exception as e:
-            abort(500, e)
+    batch_size = get_batch_size()
 
-    return jsonify({"message": "The authors have successfully been imported."}), 201
+    if is_async_request():
+        job = submit_import("authors", stream, batch_size)
+        LOGGER.info(f"Authors import queued as job {job.id}")
+        return jsonify(job.to_dict()), 202, {"Location": url_for("imports.import_status", id=job.id)}
+
+    report = ImportReport(resume_from=get_resume_from())
+
+    LOGGER.info(f"Add authors in bulk to the database, {batch_size} rows per transaction")
+    try:
+        result = import_authors(open_csv(stream), batch_size, report)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        abort(403, f"SQLAlchemyError: {e}. {report.committed_rows} rows were committed, "
+                   f"resume with resume_from={report.committed_rows}.")
+    except (csv.Error, UnicodeDecodeError) as e:
+        db.session.rollback()
+        abort(400, f"Invalid CSV file: {e}. {report.committed_rows} rows were committed, "
+                   f"resume with resume_from={report.committed_rows}.")
+
+    return jsonify({"message": "The authors have successfully been imported.", **result}), 201
+
+
+@author.route("/authors/batch", methods=["POST"])
+def batch_authors():
+    """
+    Create, update and delete authors in one transaction
+    """
+
+    LOGGER.info("Run a batch of author operations")
+    return run_batch(Author, clean_author_fields, AuthorBook.author_id)
 
 
 @author.route("/authors/edit/<int:id>", methods=["PUT"])
@@ -196,14 +222,12 @@ def edit_author(id):
 @author.route("/authors/delete/<int:id>", methods=["DELETE"])
 def delete_author(id):
     """
-    Delete an author from the database
+    Delete an author and its book links from the database
     """
 
-    author = Author.query.get_or_404(id)
-
-    LOGGER.info(f"Delete {author} from the database")
+    LOGGER.info(f"Delete the author {id} from the database")
     try:
-        db.session.delete(author)
+        deleted = delete_rows(Author, AuthorBook.author_id, Author.id == id)
         db.session.commit()
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -211,4 +235,7 @@ def delete_author(id):
     except Exception as e:
         abort(500, e)
 
+    if not deleted:
+        abort(404)
+
     return jsonify({"message": "The author has successfully been deleted."}), 200
@@ -0,0 +1,317 @@
+from collections import defaultdict
+
+from flask import abort, current_app, jsonify, request
+from sqlalchemy import bindparam
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db, LOGGER
+from .bulk import delete_rows, reserve_ids
+from .filters import INTEGER_MAX, INTEGER_MIN
+from .models import Author, AuthorBook
+
+BATCH_MODES = ("atomic", "best_effort")
+OPERATIONS = {"create": 201, "update": 200, "delete": 200}
+
+
+class BatchItem:
+    """
+    One operation of a batch request and its outcome
+    """
+
+    def __init__(self, index: int, operation):
+        self.index = index
+        self.operation = operation
+        self.op = operation.get("op") if isinstance(operation, dict) else None
+        self.id = None
+        self.values = {}
+        self.author_ids = []
+        self.status = None
+        self.error = None
+
+    def fail(self, status: int, error: str):
+        self.status = status
+        self.error = error
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def to_dict(self) -> dict:
+        result = {"index": self.index, "op": self.op, "id": self.id, "status": self.status}
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+
+def to_integer(value) -> int:
+    """
+    Convert 'value' to an integer an INTEGER column can store, or raise TypeError or ValueError
+    """
+
+    value = int(value)
+    if not INTEGER_MIN <= value <= INTEGER_MAX:
+        raise ValueError(f"{value} is out of range.")
+    return value
+
+
+def parse_author_ids(values) -> list:
+    """
+    Return the distinct author IDs of an operation, or raise ValueError
+    """
+
+    if not isinstance(values, list):
+        raise ValueError("authors must be a list of author IDs.")
+
+    try:
+        return list(dict.fromkeys(to_integer(value) for value in values))
+    except (TypeError, ValueError):
+        raise ValueError("authors must be a list of author IDs.")
+
+
+def clean_author_fields(op: str, data: dict) -> tuple:
+    """
+    Validate the fields of an author operation and return the column values and author IDs, or raise ValueError
+    """
+
+    if op == "create" or "name" in data:
+        name = data.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError("Name cannot be empty or null.")
+        return {"name": name}, []
+
+    return {}, []
+
+
+def clean_book_fields(op: str, data: dict) -> tuple:
+    """
+    Validate the fields of a book operation and return the column values and author IDs, or raise ValueError
+    """
+
+    if op == "create":
+        missing_fields = [field for field in ("name", "edition", "publication_year") if field not in data]
+        if missing_fields:
+            raise ValueError(f"{' and '.join(missing_fields)} "
+                             f"{'field is' if len(missing_fields) == 1 else 'fields are'} missing.")
+
+    values = {}
+    for field in ("name", "edition"):
+        if field in data:
+            if not isinstance(data[field], str) or not data[field].strip():
+                raise ValueError(f"{field} cannot be empty or null.")
+            values[field] = data[field]
+
+    if "publication_year" in data:
+        try:
+            values["publication_year"] = to_integer(data["publication_year"])
+        except (TypeError, ValueError):
+            raise ValueError(f"publication_year must be an integer between {INTEGER_MIN} and {INTEGER_MAX}.")
+
+    author_ids = parse_author_ids(data["authors"]) if "authors" in data else []
+    return values, author_ids
+
+
+def get_batch_request() -> tuple:
+    """
+    Return the mode and the operations of a batch request
+    """
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("operations"), list):
+        abort(400, "The body must be a JSON object with a list of operations.")
+
+    mode = body.get("mode", "atomic")
+    if mode not in BATCH_MODES:
+        abort(400, f"mode must be one of: {', '.join(BATCH_MODES)}.")
+
+    operations = body["operations"]
+    max_operations = current_app.config["BATCH_MAX_OPERATIONS"]
+    if len(operations) > max_operations:
+        abort(400, f"A batch cannot have more than {max_operations} operations.")
+
+    return mode, operations
+
+
+def read_target_id(item: BatchItem, entity: str, seen_ids: set) -> bool:
+    """
+    Read the ID of the row an update or a delete targets, which a batch may only target once
+    """
+
+    try:
+        item.id = to_integer(item.operation.get("id"))
+    except (TypeError, ValueError):
+        item.fail(400, "id must be an integer.")
+        return False
+
+    if item.id in seen_ids:
+        item.fail(400, f"The {entity} {item.id} appears in more than one operation.")
+        return False
+
+    seen_ids.add(item.id)
+    return True
+
+
+def read_data(item: BatchItem, clean) -> bool:
+    """
+    Read the column values and author IDs of a create or an update
+    """
+
+    data = item.operation.get("data")
+    if not isinstance(data, dict):
+        item.fail(400, "data must be an object.")
+        return False
+
+    try:
+        item.values, item.author_ids = clean(item.op, data)
+    except ValueError as e:
+        item.fail(400, str(e))
+        return False
+    return True
+
+
+def validate_create(item: BatchItem, entity: str, seen_ids: set, clean):
+    read_data(item, clean)
+
+
+def validate_update(item: BatchItem, entity: str, seen_ids: set, clean):
+    if read_target_id(item, entity, seen_ids):
+        read_data(item, clean)
+
+
+def validate_delete(item: BatchItem, entity: str, seen_ids: set, clean):
+    read_target_id(item, entity, seen_ids)
+
+
+VALIDATORS = {"create": validate_create, "update": validate_update, "delete": validate_delete}
+
+
+def check_existing_ids(model, items: list, entity: str):
+    """
+    Fail the operations targeting a missing row, with one IN query
+    """
+
+    ids = {item.id for item in items if item.id is not None and not item.failed}
+    if not ids:
+        return
+
+    found = {id for id, in db.session.query(model.id).filter(model.id.in_(ids))}
+    for item in items:
+        if item.id is not None and not item.failed and item.id not in found:
+            item.fail(404, f"There is no {entity} with the ID: {item.id}.")
+
+
+def check_author_ids(items: list):
+    """
+    Fail the operations linking to a missing author, with one IN query
+    """
+
+    author_ids = {author_id for item in items if not item.failed for author_id in item.author_ids}
+    if not author_ids:
+        return
+
+    found = {id for id, in db.session.query(Author.id).filter(Author.id.in_(author_ids))}
+    for item in items:
+        unknown = [str(author_id) for author_id in item.author_ids if author_id not in found]
+        if unknown and not item.failed:
+            item.fail(400, f"There is no author with the ID: {', '.join(unknown)}.")
+
+
+def validate_items(model, items: list, clean):
+    """
+    Check the shape and the fields of every operation, then the referenced IDs with one IN query per table
+    """
+
+    entity = model.__tablename__[:-1]
+    seen_ids = set()
+    for item in items:
+        if not isinstance(item.op, str) or item.op not in OPERATIONS:
+            item.fail(400, f"op must be one of: {', '.join(OPERATIONS)}.")
+            continue
+        VALIDATORS[item.op](item, entity, seen_ids, clean)
+
+    check_existing_ids(model, items, entity)
+    check_author_ids(items)
+
+
+def write_items(model, items: list, link_column):
+    """
+    Apply the valid operations with bulk statements: one INSERT, one UPDATE per set of updated columns, one DELETE
+    """
+
+    table = model.__table__
+    links = []
+
+    creates = [item for item in items if item.op == "create"]
+    if creates:
+        ids = reserve_ids(model, len(creates))
+        for item in creates:
+            item.id = next(ids)
+        db.session.execute(table.insert(), [dict(item.values, id=item.id) for item in creates])
+        links.extend((item.id, author_id) for item in creates for author_id in item.author_ids)
+
+    updates = [item for item in items if item.op == "update"]
+    updates_by_columns = defaultdict(list)
+    for item in updates:
+        if item.values:
+            updates_by_columns[tuple(sorted(item.values))].append(item)
+
+    for columns, column_items in updates_by_columns.items():
+        statement = table.update().where(table.c.id == bindparam("item_id")).values(
+            {column: bindparam(f"item_{column}") for column in columns}
+        )
+        db.session.execute(statement, [dict({f"item_{key}": value for key, value in item.values.items()},
+                                            item_id=item.id) for item in column_items])
+
+    # Updates only add the authors a book is not linked to yet, like edit_book
+    linked_books = [item.id for item in updates if item.author_ids]
+    if linked_books:
+        existing = set(db.session.query(AuthorBook.book_id, AuthorBook.author_id)
+                       .filter(AuthorBook.book_id.in_(linked_books)))
+        links.extend((item.id, author_id) for item in updates for author_id in item.author_ids
+                     if (item.id, author_id) not in existing)
+
+    if links:
+        db.session.execute(AuthorBook.__table__.insert(),
+                           [{"book_id": book_id, "author_id": author_id}
+                            for book_id, author_id in dict.fromkeys(links)])
+
+    deleted_ids = [item.id for item in items if item.op == "delete"]
+    if deleted_ids:
+        delete_rows(model, link_column, table.c.id.in_(deleted_ids))
+
+    for item in items:
+        item.status = OPERATIONS[item.op]
+
+
+def run_batch(model, clean, link_column):
+    """
+    Run the create/update/delete operations of a batch request in one transaction
+
+    In 'atomic' mode a single invalid operation rejects the whole batch. In 'best_effort' mode invalid operations
+    are reported and the others applied. A database error rolls the whole batch back in both modes.
+    """
+
+    mode, operations = get_batch_request()
+    items = [BatchItem(index, operation) for index, operation in enumerate(operations)]
+
+    LOGGER.info(f"Validate a batch of {len(items)} {model.__tablename__} operations ({mode})")
+    validate_items(model, items, clean)
+    failed = [item for item in items if item.failed]
+
+    if failed and mode == "atomic":
+        for item in items:
+            if not item.failed:
+                item.fail(409, "Not applied: the batch has invalid operations.")
+        return jsonify({"mode": mode, "succeeded": 0, "failed": len(items),
+                        "results": [item.to_dict() for item in items]}), 400
+
+    valid = [item for item in items if not item.failed]
+    LOGGER.info(f"Apply {len(valid)} {model.__tablename__} operations")
+    try:
+        write_items(model, valid, link_column)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        abort(400, f"SQLAlchemyError: {e}.")
+
+    return jsonify({"mode": mode, "succeeded": len(valid), "failed": len(failed),
+                    "results": [item.to_dict() for item in items]}), 200
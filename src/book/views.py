@@ -1,110 +1,151 @@
+import csv
 import json
 
 from flask import abort, jsonify, request, url_for, g
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
-from sqlalchemy.orm import joinedload
 
 from . import book
 from .. import db, LOGGER
-from ..models import AuthorBook, Book, books_schema, book_schema, Author
-
-
-def get_paginated_list(query_result, url: str, start: int, limit: int) -> dict:
-    """
-    Return a paginate response
-    """
-
-    if not isinstance(start, int):
-        start = int(start)
-
-    if not isinstance(limit, int):
-        limit = int(limit)
-
-    count = len(query_result)
-
-    if count < start:
-        abort(404)
-
-    pages = {"start": start, "limit": limit, "count": count}
-
-    LOGGER.info("Build the urls to return")
-    if start == 1:
-        pages["previous"] = ""
-    else:
-        start_copy = max(1, start - limit)
-        limit_copy = start - 1
-        pages["previous"] = url + "?start=%d&limit=%d" % (start_copy, limit_copy)
-
-    if start + limit > count:
-        pages["next"] = ""
-    else:
-        start_copy = start + limit
-        pages["next"] = url + "?start=%d&limit=%d" % (start_copy, limit)
-
-    LOGGER.info("Extract result according to the bounds")
-    pages["results"] = query_result[(start - 1): (start - 1 + limit)]
-    return pages
+from ..batch import clean_book_fields, run_batch
+from ..bulk import delete_rows, get_batch_size, get_resume_from, get_upload_stream, import_books, ImportReport, open_csv
+from ..cache import cached
+from ..export import export_response
+from ..imports.jobs import is_async_request, submit_import
+from ..filters import apply_filters, BOOK_FILTERS, filter_clauses
+from ..models import AuthorBook, Book, book_schema, Author
+from ..pagination import paginate
+from ..queries import aggregate_ids, split_ids
+from ..replicas import raise_replica_error, read_replica
+from ..search.index import match_clause
+from ..serializers import book_rows, json_response
+from ..versions import conditional
 
 
 # Books views
 @book.route("/books", methods=["GET"])
 @book.route("/books/page/<int:page>")
-def list_books(page=1, per_page=20):
+@read_replica
+@conditional("books", "author_books")
+@cached("books", "author_books")
+def list_books(page=None, per_page=20):
     """
     List all books
     """
 
     LOGGER.info("Get the list of books from the database")
-    all_books = None
-    try:
-        query = db.session.query(Book)
+    # Column-only rows: the authors of the whole page are loaded with one extra query by the serializer
+    query = db.session.query(*book_rows.columns(Book))
 
-        if "name" in request.args:
-            query = query.filter(Book.name.like(f'%{request.args.get("name")}%'))
+    if "q" in request.args:
+        query = query.filter(match_clause(Book, request.args.get("q")))
 
-        if "edition" in request.args:
-            query = query.filter(Book.edition.like(f'%{request.args.get("edition")}%'))
+    if "name" in request.args:
+        query = query.filter(match_clause(Book, request.args.get("name"), columns=("name",)))
 
-        if "publication_year" in request.args:
-            query = query.filter(Book.publication_year.like(f'%{request.args.get("publication_year")}%'))
+    if "edition" in request.args:
+        query = query.filter(match_clause(Book, request.args.get("edition"), columns=("edition",)))
 
-        all_books = books_schema.dump(query.order_by(Book.name.asc()).all(), many=True)
+    query = apply_filters(query, Book, BOOK_FILTERS)
 
-    except Exception as error:
-        LOGGER.error(f"ExceptionError: {error}")
+    try:
+        all_books = paginate(
+            query=query,
+            columns=(Book.name, Book.id),
+            schema=book_rows,
+            endpoint="book.list_books",
+            page=page,
+            per_page=per_page,
+        )
+    except SQLAlchemyError as error:
+        raise_replica_error(error)
+        LOGGER.error(f"SQLAlchemyError: {error}")
         abort(500, error)
 
-    if all_books is None:
-        return jsonify({"message": "There is no data to show"})
-
     LOGGER.info("Response the list of books")
-    return get_paginated_list(
-        query_result=all_books,
-        url=url_for("book.list_books"),
-        start=request.args.get("start", page),
-        limit=request.args.get("limit", per_page),
-    ), 200
+    return json_response(all_books)
+
+
+@book.route("/books/export", methods=["GET"])
+def export_books():
+    """
+    Stream all books, or the filtered ones, with their author IDs as NDJSON or CSV
+    """
+
+    query = db.session.query(Book.id, Book.name, Book.edition, Book.publication_year).order_by(Book.id)
+    query = apply_filters(query, Book, BOOK_FILTERS)
+    return export_response(query, AuthorBook.book_id, AuthorBook.author_id, "authors", "books")
 
 
 @book.route("/books/<int:id>", methods=["GET"])
+@read_replica
+@conditional("books", "author_books")
+@cached("books", "author_books")
 def book_detail(id):
     """
     List details for a book
     """
 
-    book_instance = Book.query.get_or_404(id)
-    author_instance = AuthorBook.query.filter_by(book_id=book_instance.id).all()
-    authors = [author.author_id for author in author_instance]
+    # Fetch the book columns and its author IDs in a single query
+    book_row = (
+        db.session.query(Book.id, Book.name, Book.publication_year, aggregate_ids(AuthorBook.author_id))
+        .outerjoin(AuthorBook, AuthorBook.book_id == Book.id)
+        .filter(Book.id == id)
+        .group_by(Book.id)
+        .first()
+    )
+    if book_row is None:
+        abort(404)
 
-    LOGGER.info(f"Return book added: '{book_instance.name}'")
+    book_id, name, publication_year, authors = book_row
+
+    LOGGER.info(f"Return details for the book: '{name}'")
     return {
-        'id': book_instance.id,
-        'name': book_instance.name,
-        'publication_year': book_instance.publication_year,
-        'authors': authors
+        'id': book_id,
+        'name': name,
+        'publication_year': publication_year,
+        'authors': split_ids(authors)
     }, 200
 
 
+def get_author_ids(request_fields) -> list:
+    """
+    Read the author IDs of a request and check they all exist with a single IN query
+    """
+
+    if hasattr(request_fields, "getlist"):
+        values = request_fields.getlist("authors")
+    else:
+        values = request_fields.get("authors") or []
+
+    if not isinstance(values, list):
+        abort(400, "authors must be a list of author IDs.")
+
+    try:
+        author_ids = list(dict.fromkeys(int(value) for value in values))
+    except (TypeError, ValueError):
+        abort(400, "authors must be a list of author IDs.")
+
+    if author_ids:
+        found = {author_id for author_id, in db.session.query(Author.id).filter(Author.id.in_(author_ids))}
+        unknown = [str(author_id) for author_id in author_ids if author_id not in found]
+        if unknown:
+            abort(400, f"There is no author with the ID: {', '.join(unknown)}.")
+
+    return author_ids
+
+
+def insert_author_links(book_id: int, author_ids: list):
+    """
+    Link authors to a book with one multi-row INSERT
+    """
+
+    if author_ids:
+        db.session.execute(
+            AuthorBook.__table__.insert().values([{"author_id": author_id, "book_id": book_id}
+                                                  for author_id in author_ids])
+        )
+
+
 @book.route("/books/add", methods=["POST"])
 def add_book():
     """
@@ -123,16 +164,21 @@ def add_book():
         abort(400,
               f"{' and '.join(missing_fields)} {'field is' if len(missing_fields) == 1 else 'fields are'} missing.")
 
+    LOGGER.info("Check the authors of the book")
+    author_ids = get_author_ids(request_fields)
+
     LOGGER.info("Set book variables from request")
     book_instance = Book()
     book_instance.name = request_fields.get("name")
     book_instance.edition = request_fields.get("edition")
     book_instance.publication_year = request_fields.get("publication_year")
 
-    LOGGER.info(f"Add book '{book_instance.name}' to the database")
+    LOGGER.info(f"Add book '{book_instance.name}' and its authors to the database")
     try:
-        # Add book to the database (it will generate an book_id to store at the association table)
+        # Flush the book to get its primary key, then write the book and its authors in one transaction
         db.session.add(book_instance)
+        db.session.flush()
+        insert_author_links(book_instance.id, author_ids)
         db.session.commit()
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -140,34 +186,60 @@ def add_book():
     except Exception as e:
         abort(500, e)
 
-    book_instance = Book.query.filter_by(name=request_fields.get("name")).first()
-    if 'authors' in request_fields:
-        LOGGER.info(f"Add authors for the book '{book_instance.name}'")
-
-        for author in request_fields.get("authors"):
-            association_instance = AuthorBook()
-            association_instance.author_id = author
-            association_instance.book_id = book_instance.id
-            try:
-                db.session.add(association_instance)
-                db.session.commit()
-            except SQLAlchemyError as e:
-                db.session.rollback()
-                abort(403, f"SQLAlchemyError: {e}")
-            except Exception as e:
-                abort(500, e)
-
     LOGGER.info(f"Return book added: '{book_instance.name}'")
-    author_instance = AuthorBook.query.filter_by(book_id=book_instance.id).all()
-    authors = [author.author_id for author in author_instance]
-
     return {'id': book_instance.id,
             'name': book_instance.name,
             'publication_year': book_instance.publication_year,
-            'authors': authors
+            'authors': sorted(author_ids)
             }, 201
 
 
+@book.route("/books/add/bulk", methods=["POST"])
+def add_book_bulk():
+    """
+    Add books and their authors in bulk
+    """
+
+    LOGGER.info("Import books in bulk")
+
+    stream = get_upload_stream()
+    if stream is None:
+        abort(400, "A CSV file is mandatory ('csv_upload' form field or a text/csv body).")
+
+    batch_size = get_batch_size()
+
+    if is_async_request():
+        job = submit_import("books", stream, batch_size)
+        LOGGER.info(f"Books import queued as job {job.id}")
+        return jsonify(job.to_dict()), 202, {"Location": url_for("imports.import_status", id=job.id)}
+
+    report = ImportReport(resume_from=get_resume_from())
+
+    LOGGER.info(f"Add books in bulk to the database, {batch_size} rows per transaction")
+    try:
+        result = import_books(open_csv(stream), batch_size, report)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        abort(403, f"SQLAlchemyError: {e}. {report.committed_rows} rows were committed, "
+                   f"resume with resume_from={report.committed_rows}.")
+    except (csv.Error, UnicodeDecodeError) as e:
+        db.session.rollback()
+        abort(400, f"Invalid CSV file: {e}. {report.committed_rows} rows were committed, "
+                   f"resume with resume_from={report.committed_rows}.")
+
+    return jsonify({"message": "The books have successfully been imported.", **result}), 201
+
+
+@book.route("/books/batch", methods=["POST"])
+def batch_books():
+    """
+    Create, update and delete books and their author links in one transaction
+    """
+
+    LOGGER.info("Run a batch of book operations")
+    return run_batch(Book, clean_book_fields, AuthorBook.book_id)
+
+
 @book.route("/books/edit/<int:id>", methods=["PUT"])
 def edit_book(id):
     """
@@ -183,24 +255,16 @@ def edit_book(id):
     book_instance.edition = request_fields.get("edition", book_instance.edition)
     book_instance.publication_year = request_fields.get("publication_year", book_instance.publication_year)
 
+    linked_ids = {author_id for author_id, in db.session.query(AuthorBook.author_id).filter_by(book_id=id)}
+    new_author_ids = []
     if 'authors' in request_fields:
         LOGGER.info(f"Edit authors for the book '{book_instance.name}'")
-        for author in request_fields.get("authors"):
-            author_book_instance = AuthorBook()
-            author_book_instance.author_id = author
-            author_book_instance.book_id = book_instance.id
-            try:
-                db.session.add(author_book_instance)
-                db.session.commit()
-            except SQLAlchemyError as e:
-                db.session.rollback()
-                abort(403, f"SQLAlchemyError: {e}")
-            except Exception as e:
-                abort(500, e)
+        new_author_ids = [author_id for author_id in get_author_ids(request_fields) if author_id not in linked_ids]
 
     LOGGER.info(f"Edit book {book_instance.id} in the database")
     try:
-        # Edit book in the database
+        # Edit book and add its new authors in one transaction
+        insert_author_links(book_instance.id, new_author_ids)
         db.session.commit()
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -209,27 +273,22 @@ def edit_book(id):
         abort(500, e)
 
     LOGGER.info(f"Return book edited: '{book_instance.name}'")
-    author_instance = AuthorBook.query.filter_by(book_id=book_instance.id).all()
-    authors = [author.author_id for author in author_instance]
-
     return {'id': book_instance.id,
             'name': book_instance.name,
             'publication_year': book_instance.publication_year,
-            'authors': authors
+            'authors': sorted(linked_ids.union(new_author_ids))
             }, 200
 
 
 @book.route("/books/delete/<int:id>", methods=["DELETE"])
 def delete_book(id):
     """
-    Delete a book from the database
+    Delete a book and its author links from the database
     """
 
-    book_instance = Book.query.get_or_404(id)
-
-    LOGGER.info(f"Delete {book_instance} from the database")
+    LOGGER.info(f"Delete the book {id} from the database")
     try:
-        db.session.delete(book_instance)
+        deleted = delete_rows(Book, AuthorBook.book_id, Book.id == id)
         db.session.commit()
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -237,4 +296,30 @@ def delete_book(id):
     except Exception as e:
         abort(500, e)
 
+    if not deleted:
+        abort(404)
+
     return jsonify({"message": "The book has successfully been deleted."}), 200
+
+
+@book.route("/books/delete", methods=["DELETE"])
+def delete_books():
+    """
+    Delete the books matching the filters of the request (e.g. ?publication_year__lt=1950) and their author links
+    """
+
+    clauses = filter_clauses(Book, BOOK_FILTERS, strict=True)
+    if not clauses:
+        abort(400, "At least one filter is needed to delete books.")
+
+    LOGGER.info(f"Delete the books matching {request.query_string.decode()} from the database")
+    try:
+        deleted = delete_rows(Book, AuthorBook.book_id, *clauses)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        abort(400, f"SQLAlchemyError: {e}.")
+    except Exception as e:
+        abort(500, e)
+
+    return jsonify({"message": f"{deleted} books have successfully been deleted.", "deleted": deleted}), 200
@@ -0,0 +1,346 @@
+import csv
+import io
+import itertools
+import time
+
+from flask import abort, current_app, request
+from sqlalchemy import and_, func, select, text
+
+from . import allowed_file, db, LOGGER
+from .changes import mark_changed
+from .filters import INTEGER_MAX
+from .models import Author, AuthorBook, Book
+
+AUTHORS_SEPARATOR = ";"
+MAX_REPORTED_ERRORS = 1000
+
+
+def open_csv(stream) -> csv.DictReader:
+    """
+    Read CSV rows from a binary stream, one line at a time
+    """
+
+    return csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+
+
+def get_upload_stream():
+    """
+    Return the binary stream of the CSV sent with the request, or None when there is none
+
+    The file comes from the 'csv_upload' part of a multipart form, or is the request body itself when it is sent
+    as 'text/csv'.
+    """
+
+    if "csv_upload" in request.files:
+        data_file = request.files["csv_upload"]
+        if not data_file or not allowed_file(data_file.filename):
+            abort(400, "The file must be a CSV file.")
+        return data_file.stream
+
+    if request.mimetype == "text/csv":
+        return request.stream
+
+    return None
+
+
+def get_resume_from() -> int:
+    """
+    Read the number of data rows to skip, i.e. the 'committed_rows' of an interrupted import
+    """
+
+    resume_from = request.args.get("resume_from", 0)
+    try:
+        resume_from = int(resume_from)
+    except (TypeError, ValueError):
+        abort(400, "'resume_from' must be an integer.")
+
+    if resume_from < 0:
+        abort(400, "'resume_from' must be greater than or equal to 0.")
+
+    return resume_from
+
+
+def get_batch_size() -> int:
+    """
+    Read the number of rows written per transaction from the query string
+    """
+
+    batch_size = request.args.get("batch_size", current_app.config["BULK_BATCH_SIZE"])
+    try:
+        batch_size = int(batch_size)
+    except (TypeError, ValueError):
+        abort(400, "'batch_size' must be an integer.")
+
+    if batch_size < 1:
+        abort(400, "'batch_size' must be greater than or equal to 1.")
+
+    return batch_size
+
+
+def batched(iterable, size: int):
+    """
+    Yield lists of at most 'size' items without reading further ahead
+    """
+
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def numbered_rows(reader: csv.DictReader, skip: int = 0):
+    """
+    Yield (line number, row) pairs after the first 'skip' data rows, the header being line 1
+    """
+
+    for row in itertools.islice(reader, skip, None):
+        yield reader.line_num, row
+
+
+def reserve_ids(model, count: int):
+    """
+    Return an iterator over 'count' free primary keys of 'model'
+
+    Bulk inserts are sent with executemany or COPY, which do not return the generated keys, so the keys needed by
+    the association rows are assigned up front. On PostgreSQL they are taken from the sequence of the table, which
+    the later single-row inserts keep using. Elsewhere they follow the highest key, read under the write lock of the
+    transaction that inserts the rows: concurrent writers wait for its commit instead of picking the same keys.
+    """
+
+    if db.engine.dialect.name == "postgresql":
+        statement = text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)")
+        return iter([id for id, in db.session.execute(statement, {"table": model.__tablename__, "count": count})])
+
+    # pysqlite runs a SELECT outside of any transaction and only begins one before a write: a write matching no row
+    # takes the lock, held until the commit. Raw SQL is not tracked as a change of the table.
+    db.session.execute(text(f"DELETE FROM {model.__tablename__} WHERE 1 = 0"))
+    last_id = db.session.query(func.coalesce(func.max(model.id), 0)).scalar()
+    return iter(range(last_id + 1, last_id + 1 + count))
+
+
+def insert_rows(table, rows: list):
+    """
+    Insert 'rows', dicts with the same keys, into 'table': with COPY FROM STDIN on PostgreSQL, an executemany INSERT
+    elsewhere
+    """
+
+    if not rows:
+        return
+
+    connection = db.session.connection()
+    if connection.dialect.name != "postgresql":
+        connection.execute(table.insert(), rows)
+        return
+
+    columns = list(rows[0])
+    data = io.StringIO()
+    csv.writer(data).writerows([row[column] for column in columns] for row in rows)
+    data.seek(0)
+
+    # COPY goes through the DBAPI cursor of the session transaction, out of sight of the DML tracking
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", data)
+    finally:
+        cursor.close()
+    mark_changed(connection, table.name)
+
+
+def delete_rows(model, link_column, *conditions) -> int:
+    """
+    Delete the rows of 'model' matching 'conditions' and their author links, with two set-based statements in the
+    current transaction, without loading them; return the number of deleted rows
+
+    The links are deleted first: they must not outlive their book or author, even where the foreign keys and
+    their ON DELETE CASCADE are not enforced (SQLite without PRAGMA foreign_keys).
+    """
+
+    table = model.__table__
+    condition = and_(*conditions)
+    db.session.execute(AuthorBook.__table__.delete().where(link_column.in_(select([table.c.id]).where(condition))))
+    return db.session.execute(table.delete().where(condition)).rowcount
+
+
+class ImportReport:
+    """
+    Counters and per-row errors of a bulk import
+
+    The counters include the batch being written, 'committed_rows' only the committed ones: it is where an
+    interrupted import resumes.
+    """
+
+    def __init__(self, resume_from: int = 0, inserted: int = 0, error_count: int = 0, errors: list = None):
+        self.started = time.perf_counter()
+        self.resume_from = resume_from
+        self.committed_rows = resume_from
+        self.rows = 0
+        self.inserted = inserted
+        self.error_count = error_count
+        self.errors = errors or []
+
+    @property
+    def rows_per_second(self):
+        seconds = time.perf_counter() - self.started
+        return round(self.rows / seconds, 1) if seconds else None
+
+    def add_error(self, line: int, error: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def add_batch(self, rows: int, inserted: int, errors: list):
+        self.rows += rows
+        self.inserted += inserted
+        for line, error in sorted(errors):
+            self.add_error(line, error)
+
+    def commit(self, checkpoint=None):
+        """
+        Commit the batch, letting 'checkpoint' record the progress in the same transaction
+        """
+
+        if checkpoint is not None:
+            checkpoint(self)
+        db.session.commit()
+        self.committed_rows = self.resume_from + self.rows
+
+    def as_dict(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "committed_rows": self.committed_rows,
+            "inserted": self.inserted,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "rows_per_second": self.rows_per_second,
+        }
+
+
+class AuthorResolver:
+    """
+    In-memory map from author names and IDs to author IDs, filled with one query per batch
+    """
+
+    def __init__(self):
+        self.ids = set()
+        self.names = {}
+
+    @staticmethod
+    def is_id(reference: str) -> bool:
+        # isdigit() also accepts digits int() cannot read, like superscripts
+        return reference.isdecimal()
+
+    def load(self, references: set):
+        # An ID too large for the column names no author, and cannot be sent to the database
+        wanted_ids = {int(ref) for ref in references if self.is_id(ref) and int(ref) <= INTEGER_MAX} - self.ids
+        wanted_names = {ref for ref in references if not self.is_id(ref)} - self.names.keys()
+
+        if wanted_ids:
+            self.ids.update(id for id, in db.session.query(Author.id).filter(Author.id.in_(wanted_ids)))
+
+        if wanted_names:
+            query = db.session.query(Author.name, func.min(Author.id)).filter(Author.name.in_(wanted_names))
+            self.names.update(query.group_by(Author.name))
+
+    def resolve(self, reference: str):
+        if self.is_id(reference):
+            return int(reference) if int(reference) in self.ids else None
+        return self.names.get(reference)
+
+
+def parse_book_row(row: dict) -> tuple:
+    """
+    Validate a CSV row and return the book values and the author references, or raise ValueError
+    """
+
+    name = (row.get("name") or "").strip()
+    edition = (row.get("edition") or "").strip()
+    publication_year = (row.get("publication_year") or "").strip()
+
+    missing_fields = [field for field, value in
+                      (("name", name), ("edition", edition), ("publication_year", publication_year)) if not value]
+    if missing_fields:
+        raise ValueError(f"{' and '.join(missing_fields)} {'field is' if len(missing_fields) == 1 else 'fields are'}"
+                         f" missing.")
+
+    if not publication_year.isdecimal() or int(publication_year) > INTEGER_MAX:
+        raise ValueError(f"publication_year must be an integer between 0 and {INTEGER_MAX}.")
+
+    authors = [ref.strip() for ref in (row.get("authors") or "").split(AUTHORS_SEPARATOR) if ref.strip()]
+    book = {"name": name, "edition": edition, "publication_year": int(publication_year)}
+    return book, list(dict.fromkeys(authors))
+
+
+def import_authors(reader: csv.DictReader, batch_size: int, report: ImportReport, checkpoint=None) -> dict:
+    """
+    Insert the authors of a CSV file, committing every 'batch_size' rows
+
+    Only one batch is held in memory. Rows without a name are skipped and reported with their line number.
+    'checkpoint' is called with the report before each commit.
+    """
+
+    for batch in batched(numbered_rows(reader, report.resume_from), batch_size):
+        authors = []
+        errors = []
+        for line, row in batch:
+            name = (row.get("name") or "").strip()
+            if name:
+                authors.append({"name": name})
+            else:
+                errors.append((line, "Name cannot be empty or null."))
+
+        insert_rows(Author.__table__, authors)
+
+        report.add_batch(len(batch), len(authors), errors)
+        report.commit(checkpoint)
+        LOGGER.info(f"Imported {report.inserted} authors, {report.committed_rows} rows committed")
+
+    return report.as_dict()
+
+
+def import_books(reader: csv.DictReader, batch_size: int, report: ImportReport, checkpoint=None) -> dict:
+    """
+    Insert the books of a CSV file and their author links, committing every 'batch_size' rows
+
+    Columns: name, edition, publication_year and authors (author names or IDs separated by ';'). Invalid rows are
+    skipped and reported with their line number. 'checkpoint' is called with the report before each commit.
+    """
+
+    resolver = AuthorResolver()
+
+    for batch in batched(numbered_rows(reader, report.resume_from), batch_size):
+        parsed = []
+        errors = []
+        for line, row in batch:
+            try:
+                parsed.append((line,) + parse_book_row(row))
+            except ValueError as e:
+                errors.append((line, str(e)))
+
+        resolver.load({ref for _, _, authors in parsed for ref in authors})
+
+        books = []
+        links = []
+        ids = reserve_ids(Book, len(parsed))
+        for line, book, authors in parsed:
+            author_ids = [resolver.resolve(ref) for ref in authors]
+            unknown = [ref for ref, author_id in zip(authors, author_ids) if author_id is None]
+            if unknown:
+                errors.append((line, f"Unknown authors: {', '.join(unknown)}."))
+                continue
+
+            book["id"] = next(ids)
+            books.append(book)
+            links.extend({"book_id": book["id"], "author_id": author_id} for author_id in dict.fromkeys(author_ids))
+
+        insert_rows(Book.__table__, books)
+        insert_rows(AuthorBook.__table__, links)
+
+        report.add_batch(len(batch), len(books), errors)
+        report.commit(checkpoint)
+        LOGGER.info(f"Imported {report.inserted} books, {report.committed_rows} rows committed")
+
+    return report.as_dict()
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, g, make_response, request
+
+from . import LOGGER
+from .changes import on_commit
+from .database import READ_BIND_KEY
+
+CACHE_BACKENDS = ("memory", "file", "none")
+
+# Name of the ETag of the current request, computed from table_versions by 'conditional' (see src/versions.py)
+ETAG_KEY = "etag"
+
+# Caches of every app of the process, invalidated together by the commit listener
+_caches = weakref.WeakSet()
+
+
+class ResponseCache(ABC):
+    """
+    Cached responses tagged with the tables they were read from
+
+    Every tag has a version, changed by 'invalidate'. An entry keeps the versions of its tags at the time the
+    response was built and is stale as soon as one of them changes, or when its TTL has passed.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        _caches.add(self)
+
+    def versions(self, tags: tuple) -> tuple:
+        return tuple(self.tag_version(tag) for tag in tags)
+
+    def get(self, key: str, tags: tuple):
+        entry = self.load(key)
+        if entry is None:
+            return None
+
+        expires_at, versions, value = entry
+        if expires_at < time.time() or versions != self.versions(tags):
+            self.discard(key)
+            return None
+
+        return value
+
+    def set(self, key: str, value, versions: tuple):
+        """
+        Store 'value' with the tag versions read before it was built, so a commit in between leaves it stale
+        """
+
+        self.store(key, (time.time() + self.ttl, versions, value))
+
+    def invalidate(self, tags):
+        for tag in tags:
+            self.bump(tag)
+
+    @abstractmethod
+    def load(self, key: str):
+        pass
+
+    @abstractmethod
+    def store(self, key: str, entry: tuple):
+        pass
+
+    @abstractmethod
+    def discard(self, key: str):
+        pass
+
+    @abstractmethod
+    def tag_version(self, tag: str):
+        pass
+
+    @abstractmethod
+    def bump(self, tag: str):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class MemoryCache(ResponseCache):
+    """
+    LRU cache of one process, holding at most 'max_entries' responses
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.tags = {}
+
+    def load(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def store(self, key: str, entry: tuple):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def tag_version(self, tag: str):
+        return self.tags.get(tag, 0)
+
+    def bump(self, tag: str):
+        with self.lock:
+            self.tags[tag] = self.tags.get(tag, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FileCache(ResponseCache):
+    """
+    Cache stored as files in 'directory', shared by every worker of the host
+
+    Point 'directory' to a tmpfs such as /dev/shm to keep it in shared memory. Files are replaced atomically, so
+    readers never see a partial entry and no lock is needed between processes. Expired entries are removed when
+    they are read, and by a sweep every quarter of 'max_entries' stores or every TTL, which also removes the oldest
+    entries beyond 'max_entries'.
+    """
+
+    def __init__(self, ttl: int, directory: str, max_entries: int):
+        super().__init__(ttl)
+        self.directory = directory
+        self.max_entries = max_entries
+        self.tags_directory = os.path.join(directory, "tags")
+        os.makedirs(self.tags_directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.stores = 0
+        self.swept_at = time.time()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha1(key.encode()).hexdigest()}.entry")
+
+    @staticmethod
+    def replace(path: str, data: bytes):
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "wb") as temporary_file:
+            temporary_file.write(data)
+        os.replace(temporary_path, path)
+
+    def load(self, key: str):
+        try:
+            with open(self.entry_path(key), "rb") as entry_file:
+                stored_key, entry = pickle.load(entry_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return entry if stored_key == key else None
+
+    def store(self, key: str, entry: tuple):
+        self.replace(self.entry_path(key), pickle.dumps((key, entry)))
+
+        with self.lock:
+            self.stores += 1
+            sweep = self.stores >= max(self.max_entries // 4, 1) or time.time() - self.swept_at >= self.ttl
+            if sweep:
+                self.stores = 0
+                self.swept_at = time.time()
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """
+        Remove the expired entries and the temporary files left by a crashed worker, then the oldest entries
+        beyond 'max_entries'. An entry expires TTL seconds after its file was written.
+        """
+
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith((".entry", ".tmp")):
+                continue
+
+            path = os.path.join(self.directory, name)
+            try:
+                written_at = os.stat(path).st_mtime
+            except OSError:
+                continue
+
+            if written_at + self.ttl < now:
+                self.remove(path)
+            elif name.endswith(".entry"):
+                entries.append((written_at, path))
+
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            self.remove(path)
+
+    def discard(self, key: str):
+        self.remove(self.entry_path(key))
+
+    def tag_version(self, tag: str):
+        try:
+            with open(os.path.join(self.tags_directory, tag), "rb") as tag_file:
+                return tag_file.read()
+        except OSError:
+            return b""
+
+    def bump(self, tag: str):
+        # Any new value invalidates the entries, so concurrent bumps from several workers cannot be lost
+        self.replace(os.path.join(self.tags_directory, tag), uuid.uuid4().bytes)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".entry"):
+                self.remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@on_commit
+def invalidate_tables(tables: frozenset):
+    """
+    Invalidate the responses read from the tables written by a committed transaction, whatever wrote them
+    """
+
+    for cache in list(_caches):
+        cache.invalidate(tables)
+
+
+def create_cache(app):
+    backend = app.config["RESPONSE_CACHE_BACKEND"]
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"RESPONSE_CACHE_BACKEND must be one of: {', '.join(CACHE_BACKENDS)}.")
+
+    ttl = app.config["RESPONSE_CACHE_TTL"]
+    if backend == "memory":
+        return MemoryCache(ttl, app.config["RESPONSE_CACHE_MAX_ENTRIES"])
+    if backend == "file":
+        directory = app.config["RESPONSE_CACHE_DIR"] or os.path.join(app.instance_path, "cache")
+        return FileCache(ttl, directory, app.config["RESPONSE_CACHE_MAX_ENTRIES"])
+    return None
+
+
+def get_cache():
+    """
+    Return the response cache of the current app, created on first use from its configuration
+    """
+
+    app = current_app._get_current_object()
+    if "response_cache" not in app.extensions:
+        app.extensions["response_cache"] = create_cache(app)
+    return app.extensions["response_cache"]
+
+
+def cache_key() -> str:
+    """
+    Build the key of a request from its endpoint, its URL arguments and its sorted query string
+    """
+
+    view_args = urlencode(sorted((request.view_args or {}).items()))
+    args = urlencode(sorted(request.args.items(multi=True)))
+    return f"{request.endpoint}|{view_args}|{args}"
+
+
+def cached(*tags: str):
+    """
+    Cache the successful responses of a GET view, until a commit writes to one of the 'tags' tables
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None or request.method != "GET":
+                return view(*args, **kwargs)
+
+            # A replica lags behind the primary: its responses are kept apart from the ones read by the clients
+            # pinned to the primary after a write. The ETag ties an entry to the versions of table_versions, which
+            # change with the writes of every worker, not only the ones this process invalidated its tags for.
+            key = f"{cache_key()}|{g.get(READ_BIND_KEY) or 'primary'}|{g.get(ETAG_KEY, '')}"
+            entry = cache.get(key, tags)
+            if entry is not None:
+                body, mimetype = entry
+                response = current_app.response_class(body, status=200, mimetype=mimetype)
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            versions = cache.versions(tags)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache.set(key, (response.get_data(), response.mimetype), versions)
+                LOGGER.debug(f"Cached the response of {key}")
+            response.headers["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
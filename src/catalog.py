@@ -0,0 +1,98 @@
+import itertools
+import random
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from . import db, LOGGER
+from .bulk import batched, insert_rows, reserve_ids
+from .models import Author, AuthorBook, Book
+
+FIRST_NAMES = ("Ana", "Ariano", "Carlos", "Cecília", "Clarice", "Ferenc", "Graciliano", "Helena", "Jorge", "José",
+               "Lygia", "Machado", "Manuel", "Maria", "Mário", "Paulo", "Rachel", "Raquel", "Rubem", "Vinicius")
+LAST_NAMES = ("Alencar", "Amado", "Andrade", "Assis", "Bandeira", "Braga", "Fonseca", "Lispector", "Meireles",
+              "Molnar", "Moraes", "Queiroz", "Ramos", "Rosa", "Suassuna", "Telles", "Veríssimo", "Xavier")
+TITLE_WORDS = ("Boys", "Captains", "Dead", "Dreams", "Dry", "Garden", "Hour", "House", "Lives", "Night", "Paths",
+               "River", "Saint", "Sand", "Sea", "Sow", "Star", "Street", "Time", "Wind", "Winter", "World")
+EDITIONS = ("1st Edition", "2nd Edition", "3rd Edition", "4th Edition", "5th Edition", "Pocket Edition")
+
+# Share of books with 1, 2, 3 and 4 authors
+AUTHORS_PER_BOOK_WEIGHTS = (70, 20, 7, 3)
+
+# Author popularity follows a power law: a few authors write most books
+POPULARITY_EXPONENT = 0.8
+
+
+def author_name(index: int, rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {index}"
+
+
+def book_values(index: int, rng: random.Random) -> dict:
+    words = rng.sample(TITLE_WORDS, 2)
+    return {
+        "name": f"The {words[0]} of the {words[1]} {index}",
+        "edition": rng.choice(EDITIONS),
+        # More recent years are more frequent
+        "publication_year": int(2024 - rng.expovariate(1 / 40)) if rng.random() < 0.98 else rng.randint(1500, 1800),
+    }
+
+
+def generate_catalog(books: int, authors: int, seed: int = 0, batch_size: int = 10000) -> dict:
+    """
+    Insert 'authors' authors and 'books' books linked to 1-4 authors each, committing every 'batch_size' rows
+
+    The catalog is deterministic for a given seed and appended after the existing rows. Only one batch is held in
+    memory, so a million books can be generated with a flat footprint.
+    """
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    # The IDs of each batch are reserved in its transaction: with the max+1 reservation of SQLite, IDs reserved for
+    # a later batch could be taken by another writer in between
+    author_ids = []
+    for batch in batched(range(authors), batch_size):
+        batch_ids = list(reserve_ids(Author, len(batch)))
+        insert_rows(Author.__table__, [{"id": id, "name": author_name(id, rng)} for id in batch_ids])
+        db.session.commit()
+        author_ids.extend(batch_ids)
+    LOGGER.info(f"Generated {authors} authors")
+
+    cumulative_weights = list(itertools.accumulate(1 / (rank ** POPULARITY_EXPONENT)
+                                                   for rank in range(1, authors + 1)))
+
+    links = 0
+    for batch in batched(range(books), batch_size):
+        book_rows = []
+        link_rows = []
+        for id in reserve_ids(Book, len(batch)):
+            book_rows.append(dict(book_values(id, rng), id=id))
+            fan_out = rng.choices((1, 2, 3, 4), weights=AUTHORS_PER_BOOK_WEIGHTS)[0]
+            linked = set(rng.choices(author_ids, cum_weights=cumulative_weights, k=fan_out)) if authors else set()
+            link_rows.extend({"book_id": id, "author_id": author_id} for author_id in sorted(linked))
+
+        insert_rows(Book.__table__, book_rows)
+        insert_rows(AuthorBook.__table__, link_rows)
+        db.session.commit()
+        links += len(link_rows)
+        LOGGER.info(f"Generated {batch[-1] + 1} books")
+
+    return {"authors": authors, "books": books, "links": links, "seconds": round(time.perf_counter() - started, 3)}
+
+
+@click.command("generate-catalog")
+@click.option("--books", default=1000, show_default=True, help="Number of books to generate.")
+@click.option("--authors", default=None, type=int, help="Number of authors [default: books / 5].")
+@click.option("--seed", default=0, show_default=True, help="Seed of the random generator.")
+@click.option("--batch-size", default=10000, show_default=True, help="Rows inserted per transaction.")
+@with_appcontext
+def generate_catalog_command(books, authors, seed, batch_size):
+    """
+    Fill the database with a synthetic catalog, e.g. to benchmark it with 1k, 100k or 1M books
+    """
+
+    authors = max(1, books // 5) if authors is None else authors
+    result = generate_catalog(books, authors, seed, batch_size)
+    click.echo(f"Generated {result['authors']} authors, {result['books']} books and {result['links']} author links "
+               f"in {result['seconds']} s.")
@@ -0,0 +1,101 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+CHANGED_TABLES_KEY = "changed_tables"
+COMMITTED_TABLES_KEY = "committed_tables"
+SESSION_CONNECTIONS_KEY = "transaction_connections"
+
+_commit_listeners = []
+_before_commit_listeners = []
+
+
+def on_commit(listener):
+    """
+    Register a callable receiving the names of the tables written by each committed transaction
+
+    It runs once the database has committed, so a reader it lets in (e.g. by invalidating a cache) cannot read the
+    rows of before the commit.
+    """
+
+    _commit_listeners.append(listener)
+    return listener
+
+
+def before_commit(listener):
+    """
+    Register a callable run right before the COMMIT, inside the transaction, with the connection and the names of
+    the tables written
+
+    It must write through the DBAPI connection ('connection.connection'): statements run through SQLAlchemy at
+    this point would not be tracked.
+    """
+
+    _before_commit_listeners.append(listener)
+    return listener
+
+
+def mark_changed(connection, *tables: str):
+    """
+    Record tables written by statements the DML tracking cannot see (e.g. raw SQL)
+    """
+
+    connection.info.setdefault(CHANGED_TABLES_KEY, set()).update(tables)
+
+
+@event.listens_for(Engine, "after_execute")
+def record_changed_table(connection, clauseelement, multiparams, params, result):
+    """
+    Remember the table of every INSERT/UPDATE/DELETE, from the ORM flush or from bulk statements
+    """
+
+    if isinstance(clauseelement, UpdateBase):
+        mark_changed(connection, clauseelement.table.name)
+
+
+@event.listens_for(Engine, "commit")
+def prepare_changed_tables(connection):
+    """
+    Run the before_commit listeners inside the transaction, and keep the tables for the session to notify once
+    the DBAPI commit is done: the Engine "commit" event fires before it
+    """
+
+    tables = connection.info.pop(CHANGED_TABLES_KEY, None)
+    if not tables:
+        return
+
+    tables = frozenset(tables)
+    for listener in _before_commit_listeners:
+        listener(connection, tables)
+    connection.info[COMMITTED_TABLES_KEY] = tables
+
+
+@event.listens_for(Engine, "begin")
+@event.listens_for(Engine, "rollback")
+def discard_changed_tables(connection):
+    # Also drops the tables of a commit that failed: the info dict outlives the checkout of the connection
+    connection.info.pop(CHANGED_TABLES_KEY, None)
+    connection.info.pop(COMMITTED_TABLES_KEY, None)
+
+
+@event.listens_for(Session, "after_begin")
+def remember_connection(session, transaction, connection):
+    session.info.setdefault(SESSION_CONNECTIONS_KEY, []).append(connection)
+
+
+@event.listens_for(Session, "after_commit")
+def notify_changed_tables(session):
+    for connection in session.info.get(SESSION_CONNECTIONS_KEY, ()):
+        tables = connection.info.pop(COMMITTED_TABLES_KEY, None)
+        if not tables:
+            continue
+
+        for listener in _commit_listeners:
+            listener(tables)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def forget_connections(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(SESSION_CONNECTIONS_KEY, None)
@@ -0,0 +1,115 @@
+import sqlite3
+
+from flask import g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+# Name of the bind the reads of the current request are routed to (see src/replicas.py)
+READ_BIND_KEY = "read_bind"
+
+# Pragmas run on every new connection, and the pool sharing the connections between the threads of a worker.
+# "default" keeps the SQLite defaults: a rollback journal, and a connection opened for each session.
+SQLITE_PROFILES = {
+    "default": {},
+    "production": {
+        "pragmas": {
+            # Readers do not block the writer and the writer does not block readers
+            "journal_mode": "WAL",
+            # In WAL mode, NORMAL only syncs at checkpoints: a power loss may lose the last commits, never corrupt
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            # Negative values are in KiB: a 64 MiB page cache per connection
+            "cache_size": -64 * 1024,
+            # Wait for the write lock instead of failing with 'database is locked'
+            "busy_timeout": 5000,
+            "temp_store": "MEMORY",
+            # Enforce the foreign keys, and their ON DELETE CASCADE
+            "foreign_keys": "ON",
+        },
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+    },
+}
+
+
+def get_sqlite_profile(config) -> dict:
+    name = config["SQLITE_PROFILE"]
+    if name not in SQLITE_PROFILES:
+        raise ValueError(f"The SQLite profile must be one of: {', '.join(SQLITE_PROFILES)}.")
+    return SQLITE_PROFILES[name]
+
+
+def sqlite_creator(database: str, pragmas: dict):
+    """
+    Return a function opening 'database' with the pragmas set, for the connections shared by the pool threads
+    """
+
+    def connect():
+        connection = sqlite3.connect(database, check_same_thread=False)
+        for name, value in pragmas.items():
+            connection.execute(f"PRAGMA {name}={value}")
+        return connection
+
+    return connect
+
+
+def apply_pool_settings(config, options: dict):
+    """
+    Size the pool of a server database: each worker process keeps DATABASE_POOL_SIZE connections, and checks them
+    before use so a restarted server or a dropped connection does not fail a request
+    """
+
+    options["pool_size"] = config["DATABASE_POOL_SIZE"]
+    options["max_overflow"] = config["DATABASE_MAX_OVERFLOW"]
+    options["pool_recycle"] = config["DATABASE_POOL_RECYCLE"]
+    options["pool_pre_ping"] = config["DATABASE_POOL_PRE_PING"]
+    options["pool_timeout"] = config["DATABASE_POOL_TIMEOUT"]
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session sending the statements of a read-only view to the replica chosen for the request, and everything else
+    (flushes, INSERT/UPDATE/DELETE, other views) to the primary
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        read_bind = g.get(READ_BIND_KEY) if has_app_context() else None
+        if read_bind is not None and not self._flushing and not isinstance(clause, UpdateBase):
+            return self.db.get_engine(self.app, bind=read_bind)
+        return super().get_bind(mapper, clause)
+
+
+class Database(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with read routing, applying the pool settings of the application to PostgreSQL, and its
+    SQLITE_PROFILE to the SQLite file databases
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith("postgresql"):
+            apply_pool_settings(app.config, options)
+            return
+
+        if sa_url.drivername != "sqlite" or sa_url.database in (None, "", ":memory:"):
+            return
+
+        profile = get_sqlite_profile(app.config)
+        if "pragmas" in profile:
+            # The database path was made absolute by the parent class
+            options["creator"] = sqlite_creator(sa_url.database, profile["pragmas"])
+        if "pool_size" in profile:
+            options["poolclass"] = QueuePool
+            options["pool_size"] = profile["pool_size"]
+            options["max_overflow"] = profile["max_overflow"]
+            options["pool_timeout"] = profile["pool_timeout"]
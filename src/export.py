@@ -0,0 +1,93 @@
+import csv
+import io
+
+from flask import abort, current_app, request, Response, stream_with_context
+
+from . import db, LOGGER
+from .bulk import AUTHORS_SEPARATOR, batched
+from .serializers import dumps
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def get_export_format() -> str:
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        abort(400, f"'format' must be one of: {', '.join(EXPORT_FORMATS)}.")
+    return export_format
+
+
+def export_rows(query, owner_column, linked_column, field: str, chunk_size: int):
+    """
+    Yield lists of row dicts, each row with the IDs linked to it through author_books in 'field'
+
+    'query' must be ordered by ID. The links are read from a second cursor ordered the same way and merged with
+    the rows, so each table is read once whatever its size (an IN query per chunk scans author_books every time
+    when it has no index). Both cursors are server-side and memory only depends on 'chunk_size'. When 'query' is
+    filtered, the links are limited to the IDs it selects.
+    """
+
+    links = db.session.query(owner_column, linked_column).filter(owner_column.isnot(None))
+    if query.whereclause is not None:
+        id_column = next(description["expr"] for description in query.column_descriptions
+                         if description["name"] == "id")
+        links = links.filter(owner_column.in_(query.with_entities(id_column).order_by(None).subquery()))
+
+    links = iter(links.order_by(owner_column, linked_column).yield_per(chunk_size))
+    link = next(links, None)
+
+    for chunk in batched(query.yield_per(chunk_size), chunk_size):
+        rows = []
+        for row in chunk:
+            linked_ids = []
+            while link is not None and link[0] <= row.id:
+                if link[0] == row.id:
+                    linked_ids.append(link[1])
+                link = next(links, None)
+            rows.append(dict(row._asdict(), **{field: linked_ids}))
+        yield rows
+
+
+def ndjson_chunks(chunks):
+    for rows in chunks:
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def csv_chunks(chunks, fields: list, field: str):
+    """
+    Yield CSV text in the format of the bulk imports, the linked IDs being separated by ';'
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+
+    for rows in chunks:
+        for row in rows:
+            row[field] = AUTHORS_SEPARATOR.join(str(id) for id in row[field])
+            writer.writerow([row[name] for name in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # The header of an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(query, owner_column, linked_column, field: str, name: str) -> Response:
+    """
+    Stream every row of 'query' as NDJSON or CSV, the first chunk being sent before the query has finished
+    """
+
+    export_format = get_export_format()
+    fields = [description["name"] for description in query.column_descriptions] + [field]
+    chunks = export_rows(query, owner_column, linked_column, field, current_app.config["EXPORT_CHUNK_SIZE"])
+
+    LOGGER.info(f"Export the {name} as {export_format}")
+    body = ndjson_chunks(chunks) if export_format == "ndjson" else csv_chunks(chunks, fields, field)
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename={name}.{export_format}"},
+    )
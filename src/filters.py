@@ -0,0 +1,144 @@
+import sys
+
+from flask import abort, request
+from sqlalchemy import and_, true
+
+from . import db
+
+LOOKUP_SEPARATOR = "__"
+
+# Range of an INTEGER column on PostgreSQL, within the 64-bit range of SQLite
+INTEGER_MIN = -2 ** 31
+INTEGER_MAX = 2 ** 31 - 1
+
+# Surrogates cannot be encoded, so the code point after the last one before them is the first one after them
+SURROGATES = range(0xD800, 0xE000)
+
+LIKE_ESCAPE = "\\"
+
+# Typed filters accepted by 'GET /books': the bare argument uses the default operator, when there is one
+BOOK_FILTERS = {
+    "publication_year": {"type": int, "operators": ("exact", "gt", "gte", "lt", "lte", "in"), "default": "exact"},
+    "edition": {"type": str, "operators": ("exact", "startswith"), "default": None},
+}
+
+
+def next_character(character: str) -> str:
+    code_point = ord(character) + 1
+    if code_point in SURROGATES:
+        code_point = SURROGATES.stop
+    return chr(code_point)
+
+
+def escape_like(value: str) -> str:
+    return value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+
+
+def prefix_range(column, prefix: str):
+    """
+    Match values starting with 'prefix' with a predicate that can use the column index
+
+    PostgreSQL compares strings with the collation of the database, under which the prefix does not bound a range:
+    it matches LIKE 'prefix%' with a text_pattern_ops index instead. Elsewhere the range compares code points,
+    unlike LIKE, which SQLite does not run on an index.
+    """
+
+    if not prefix:
+        return true()
+
+    if db.engine.dialect.name == "postgresql":
+        return column.like(f"{escape_like(prefix)}%", escape=LIKE_ESCAPE)
+
+    # The highest code point has no successor: bound the range by the prefix without its trailing ones, or not at all
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return column >= prefix
+
+    upper_bound = stem[:-1] + next_character(stem[-1])
+    return and_(column >= prefix, column < upper_bound)
+
+
+OPERATORS = {
+    "exact": lambda column, value: column == value,
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+    "in": lambda column, values: column.in_(values),
+    "startswith": prefix_range,
+}
+
+
+def convert(name: str, value: str, value_type):
+    try:
+        value = value_type(value)
+    except (TypeError, ValueError):
+        abort(400, f"'{name}' must be {'an integer' if value_type is int else 'a string'}.")
+
+    if value_type is int and not INTEGER_MIN <= value <= INTEGER_MAX:
+        abort(400, f"'{name}' must be between {INTEGER_MIN} and {INTEGER_MAX}.")
+
+    return value
+
+
+def parse_lookup(argument: str, filters: dict):
+    """
+    Split 'field__operator' into the filtered field and its operator, or return None for other arguments
+    """
+
+    field, _, operator = argument.partition(LOOKUP_SEPARATOR)
+    if field not in filters:
+        return None
+
+    spec = filters[field]
+    operator = operator or spec["default"]
+    if operator is None:
+        return None
+
+    if operator not in spec["operators"]:
+        abort(400, f"'{argument}' is not a valid filter. Operators for '{field}': {', '.join(spec['operators'])}.")
+
+    return field, operator
+
+
+def lookup_names(filters: dict) -> list:
+    return [f"{field}{LOOKUP_SEPARATOR}{operator}" for field, spec in filters.items() for operator in spec["operators"]]
+
+
+def filter_clauses(model, filters: dict, strict: bool = False) -> list:
+    """
+    Return the typed filters of the request as index-friendly predicates on the columns of 'model'
+
+    Other arguments are ignored, unless 'strict': a destructive request must not match more rows than asked for
+    because one of its arguments is not a typed filter.
+    """
+
+    clauses = []
+    for argument, value in request.args.items(multi=True):
+        lookup = parse_lookup(argument, filters)
+        if lookup is None:
+            if strict:
+                abort(400, f"'{argument}' is not a supported filter. Filters: {', '.join(lookup_names(filters))}.")
+            continue
+
+        field, operator = lookup
+        value_type = filters[field]["type"]
+        if operator == "in":
+            value = [convert(argument, item.strip(), value_type) for item in value.split(",") if item.strip()]
+        else:
+            value = convert(argument, value, value_type)
+
+        clauses.append(OPERATORS[operator](getattr(model, field), value))
+
+    return clauses
+
+
+def apply_filters(query, model, filters: dict):
+    """
+    Add the typed filters of the request to 'query'
+    """
+
+    for clause in filter_clauses(model, filters):
+        query = query.filter(clause)
+
+    return query
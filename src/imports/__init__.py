@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+imports = Blueprint('imports', __name__)
+
+from . import views
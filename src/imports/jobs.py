@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+from flask import current_app, request
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from .. import db, LOGGER
+from ..bulk import import_authors, import_books, ImportReport, open_csv
+from ..models import ImportJob
+
+IMPORTERS = {"authors": import_authors, "books": import_books}
+
+_executor = None
+_executor_lock = threading.Lock()
+# Jobs submitted to the pool of this process and not finished yet
+_pending_jobs = set()
+
+
+def get_executor(app) -> ThreadPoolExecutor:
+    """
+    Return the pool running the import jobs of this process
+
+    It is created on first use, so every gunicorn worker gets its own threads after the fork.
+    """
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config["IMPORT_WORKERS"], thread_name_prefix="import")
+    return _executor
+
+
+def submit_job(app, job_id: str):
+    """
+    Hand a job to the pool of this process, unless it is already waiting or running in it
+    """
+
+    with _executor_lock:
+        if job_id in _pending_jobs:
+            return
+        _pending_jobs.add(job_id)
+
+    future = get_executor(app).submit(run_job, app, job_id)
+    future.add_done_callback(lambda _: forget_job(job_id))
+
+
+def forget_job(job_id: str):
+    with _executor_lock:
+        _pending_jobs.discard(job_id)
+
+
+def is_async_request() -> bool:
+    return request.args.get("async", "").lower() in ("1", "true", "yes")
+
+
+def get_jobs_folder(app) -> str:
+    folder = os.path.join(app.instance_path, "imports")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=current_app.config["IMPORT_JOB_STALE_SECONDS"])
+
+
+def is_stale():
+    """
+    Jobs running without progress report for too long: their worker stopped
+    """
+
+    return and_(ImportJob.status == "running", ImportJob.heartbeat_at < stale_before())
+
+
+def is_runnable():
+    """
+    Jobs waiting for a worker: queued, or stale
+    """
+
+    return or_(ImportJob.status == "queued", is_stale())
+
+
+def submit_import(kind: str, stream, batch_size: int) -> ImportJob:
+    """
+    Store the upload with the job, record the job as queued and hand it to the worker pool
+    """
+
+    app = current_app._get_current_object()
+    job_id = uuid.uuid4().hex
+    path = os.path.join(get_jobs_folder(app), f"{job_id}.csv")
+
+    LOGGER.info(f"Store the file of the import job {job_id}")
+    with open(path, "wb") as job_file:
+        shutil.copyfileobj(stream, job_file)
+
+    job = ImportJob(id=job_id, kind=kind, status="queued", path=path, batch_size=batch_size,
+                    created_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+
+    submit_job(app, job_id)
+    return job
+
+
+def recover_jobs(app):
+    """
+    Queue again the jobs left behind by a stopped worker or a restart
+    """
+
+    job_ids = [job_id for job_id, in db.session.query(ImportJob.id).filter(is_runnable())]
+
+    for job_id in job_ids:
+        LOGGER.info(f"Recover the import job {job_id}")
+        submit_job(app, job_id)
+
+
+def install_import_jobs(app):
+    """
+    Resume the import jobs left queued or running by a previous process, before the first request of 'app'
+    """
+
+    @app.before_first_request
+    def resume_import_jobs():
+        try:
+            recover_jobs(app)
+        except SQLAlchemyError as e:
+            LOGGER.error(f"Cannot recover the import jobs: {e}")
+
+
+def claim_job(job_id: str, token: str) -> bool:
+    """
+    Mark a runnable job as running for the worker holding 'token'. Only one worker can win the claim
+    """
+
+    now = datetime.utcnow()
+    claimed = ImportJob.query.filter(ImportJob.id == job_id, is_runnable()).update(
+        {"status": "running", "worker": token, "heartbeat_at": now,
+         "started_at": func.coalesce(ImportJob.started_at, now)},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def checkpoint_job(job_id: str, token: str, report: ImportReport):
+    """
+    Record the progress of a batch in the transaction writing it, so a restarted job resumes after it
+    """
+
+    updated = ImportJob.query.filter_by(id=job_id, worker=token).update(
+        {"committed_rows": report.resume_from + report.rows, "inserted": report.inserted,
+         "error_count": report.error_count, "errors": json.dumps(report.errors),
+         "rows_per_second": report.rows_per_second, "heartbeat_at": datetime.utcnow()},
+        synchronize_session=False,
+    )
+    if not updated:
+        raise RuntimeError(f"The import job {job_id} has been claimed by another worker.")
+
+
+class Heartbeat:
+    """
+    Report that a job is alive every IMPORT_JOB_HEARTBEAT_SECONDS, from a thread and in transactions of its own
+
+    The checkpoints only report progress when a batch commits: a batch running for longer than
+    IMPORT_JOB_STALE_SECONDS would otherwise let another worker claim the job while it still runs.
+    """
+
+    def __init__(self, app, job_id: str, token: str):
+        self.app = app
+        self.job_id = job_id
+        self.token = token
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        with self.app.app_context():
+            try:
+                while not self.stopped.wait(self.app.config["IMPORT_JOB_HEARTBEAT_SECONDS"]):
+                    self.beat()
+            finally:
+                db.session.remove()
+
+    def beat(self):
+        try:
+            ImportJob.query.filter_by(id=self.job_id, worker=self.token).update(
+                {"heartbeat_at": datetime.utcnow()}, synchronize_session=False,
+            )
+            db.session.commit()
+        except SQLAlchemyError as e:
+            # e.g. SQLite locked by the batch being written: its checkpoint reports progress when it commits
+            db.session.rollback()
+            LOGGER.warning(f"Cannot update the heartbeat of the import job {self.job_id}: {e}")
+
+
+def finish_job(job_id: str, token: str, status: str, message: str):
+    ImportJob.query.filter_by(id=job_id, worker=token).update(
+        {"status": status, "message": message, "finished_at": datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def run_job(app, job_id: str):
+    """
+    Run an import job in a worker thread, resuming after its last committed batch
+    """
+
+    with app.app_context():
+        token = uuid.uuid4().hex
+        try:
+            if not claim_job(job_id, token):
+                return
+
+            job = ImportJob.query.get(job_id)
+            path, kind, batch_size = job.path, job.kind, job.batch_size
+            report = ImportReport(resume_from=job.committed_rows, inserted=job.inserted,
+                                  error_count=job.error_count, errors=json.loads(job.errors))
+
+            LOGGER.info(f"Run the import job {job_id} from row {report.resume_from}")
+            with open(path, "rb") as job_file, Heartbeat(app, job_id, token):
+                IMPORTERS[kind](open_csv(job_file), batch_size, report, checkpoint=partial(checkpoint_job, job_id, token))
+
+            finish_job(job_id, token, "done", f"The {kind} have successfully been imported.")
+            os.remove(path)
+        except Exception as e:
+            LOGGER.error(f"Import job {job_id} failed: {e}")
+            db.session.rollback()
+            finish_job(job_id, token, "failed", str(e))
+        finally:
+            db.session.remove()
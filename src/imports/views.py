@@ -0,0 +1,23 @@
+from flask import current_app
+
+from . import imports
+from .jobs import is_stale, submit_job
+from .. import LOGGER
+from ..models import ImportJob
+
+
+@imports.route("/imports/<id>", methods=["GET"])
+def import_status(id):
+    """
+    Show the progress of a bulk import job
+    """
+
+    job = ImportJob.query.get_or_404(id)
+
+    # A job abandoned by a stopped worker is picked up by the worker answering the poll. A queued job is already in
+    # the pool of a worker, or recovered by 'recover_jobs' when the workers restart
+    if ImportJob.query.filter(ImportJob.id == id, is_stale()).count():
+        LOGGER.info(f"Resume the import job {id}")
+        submit_job(current_app._get_current_object(), id)
+
+    return job.to_dict(), 200
@@ -0,0 +1,273 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+# Histograms recorded for every request, labelled with its endpoint
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("Wall time of the request handling", DURATION_BUCKETS),
+    "db_duration_seconds": ("Time spent executing SQL statements during a request", DURATION_BUCKETS),
+    "db_statements": ("SQL statements executed during a request", COUNT_BUCKETS),
+    "serialization_duration_seconds": ("Time spent serializing response bodies", DURATION_BUCKETS),
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+QUERY_START_KEY = "query_start"
+
+_statement_listeners = []
+
+
+class MmapFile:
+    """
+    Float values by key in a memory-mapped file written by a single process
+
+    Layout: an 8-byte header with the used size, then entries made of the key length (4 bytes), the UTF-8 key
+    padded to 8 bytes and the value (8-byte double). Other processes read it without locks: a value is one
+    aligned write, and an entry is complete before the used size covers it.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.positions = {}
+
+        with open(path, "ab") as data_file:
+            if data_file.tell() < self.INITIAL_SIZE:
+                data_file.truncate(self.INITIAL_SIZE)
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = struct.unpack_from("Q", self.map, 0)[0] or 8
+
+        for key, value, position in read_entries(self.map, self.used):
+            self.positions[key] = position
+
+    def add(self, key: str, amount: float):
+        with self.lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self.append(key)
+            value = struct.unpack_from("d", self.map, position)[0]
+            struct.pack_into("d", self.map, position, value + amount)
+
+    def append(self, key: str) -> int:
+        encoded = key.encode()
+        padded_length = 4 + len(encoded) + (-(4 + len(encoded)) % 8)
+        if self.used + padded_length + 8 > len(self.map):
+            self.grow(self.used + padded_length + 8)
+
+        struct.pack_into(f"i{padded_length - 4}sd", self.map, self.used, len(encoded), encoded, 0.0)
+        position = self.used + padded_length
+        self.used += padded_length + 8
+        struct.pack_into("Q", self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def grow(self, minimum: int):
+        size = len(self.map)
+        while size < minimum:
+            size *= 2
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+
+def read_entries(data, used: int):
+    position = 8
+    while position < used:
+        key_length = struct.unpack_from("i", data, position)[0]
+        padded_length = 4 + key_length + (-(4 + key_length) % 8)
+        key = bytes(data[position + 4:position + 4 + key_length]).decode()
+        value_position = position + padded_length
+        yield key, struct.unpack_from("d", data, value_position)[0], value_position
+        position = value_position + 8
+
+
+def read_file(path: str) -> dict:
+    with open(path, "rb") as data_file:
+        data = data_file.read()
+    if len(data) < 8:
+        return {}
+    used = struct.unpack_from("Q", data, 0)[0]
+    return {key: value for key, value, _ in read_entries(data, used)}
+
+
+class MetricsStore:
+    """
+    Histograms shared by the workers of a host: each process writes its own file in 'directory', and the
+    exposition sums the files of all processes
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.pid = None
+        self.file = None
+        self.lock = threading.Lock()
+
+    def get_file(self) -> MmapFile:
+        # A worker forked from a process that already wrote metrics must not share its file
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.file = MmapFile(os.path.join(self.directory, f"metrics_{self.pid}.db"))
+            return self.file
+
+    def observe(self, name: str, endpoint: str, value: float):
+        data_file = self.get_file()
+        buckets = HISTOGRAMS[name][1]
+        bucket = next((str(bound) for bound in buckets if value <= bound), "+Inf")
+        data_file.add(json.dumps([name, endpoint, bucket]), 1)
+        data_file.add(json.dumps([name, endpoint, "sum"]), value)
+
+    def collect(self) -> dict:
+        values = defaultdict(float)
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.db")):
+            for key, value in read_file(path).items():
+                values[key] += value
+        return values
+
+    def exposition(self) -> str:
+        """
+        Render the summed histograms in the Prometheus text format, with cumulative buckets
+        """
+
+        values = self.collect()
+        endpoints = defaultdict(set)
+        for key in values:
+            name, endpoint, _ = json.loads(key)
+            endpoints[name].add(endpoint)
+
+        lines = []
+        for name, (description, buckets) in HISTOGRAMS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} histogram")
+            for endpoint in sorted(endpoints[name]):
+                label = f'endpoint="{endpoint}"'
+                count = 0
+                for bound in [str(bound) for bound in buckets] + ["+Inf"]:
+                    count += values.get(json.dumps([name, endpoint, bound]), 0)
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count:g}')
+                lines.append(f"{name}_sum{{{label}}} {values.get(json.dumps([name, endpoint, 'sum']), 0):g}")
+                lines.append(f"{name}_count{{{label}}} {count:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+def on_statement(listener):
+    """
+    Register a callable receiving every executed statement with its duration in seconds:
+    listener(conn, cursor, statement, parameters, executemany, elapsed)
+    """
+
+    _statement_listeners.append(listener)
+    return listener
+
+
+class RequestMetrics:
+    """
+    Timings of the request being handled
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.statements = 0
+        self.serialization_time = 0.0
+
+
+def current_metrics():
+    if has_app_context():
+        return g.get("request_metrics")
+    return None
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Add the time spent in the block to the serialization time of the current request
+    """
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.serialization_time += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(QUERY_START_KEY, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_statement_time(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info[QUERY_START_KEY].pop()
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.db_time += elapsed
+        metrics.statements += 1
+
+    for listener in _statement_listeners:
+        listener(conn, cursor, statement, parameters, executemany, elapsed)
+
+
+def get_store() -> MetricsStore:
+    app = current_app._get_current_object()
+    if "metrics_store" not in app.extensions:
+        directory = app.config["METRICS_DIR"] or os.path.join(app.instance_path, "metrics")
+        app.extensions["metrics_store"] = MetricsStore(directory)
+    return app.extensions["metrics_store"]
+
+
+def server_timing(metrics: RequestMetrics, wall_time: float) -> str:
+    return (f"app;dur={wall_time * 1000:.2f}, "
+            f"db;dur={metrics.db_time * 1000:.2f};desc=\"{metrics.statements} queries\", "
+            f"serialize;dur={metrics.serialization_time * 1000:.2f}")
+
+
+def install_metrics(app):
+    """
+    Time every request of 'app', add a Server-Timing header and expose the histograms on '/metrics'
+    """
+
+    @app.before_request
+    def start_request_metrics():
+        if app.config["METRICS_ENABLED"]:
+            g.request_metrics = RequestMetrics()
+
+    @app.after_request
+    def record_request_metrics(response):
+        metrics = g.pop("request_metrics", None)
+        if metrics is None or request.endpoint in (None, "metrics"):
+            return response
+
+        wall_time = time.perf_counter() - metrics.started
+        response.headers["Server-Timing"] = server_timing(metrics, wall_time)
+
+        store = get_store()
+        store.observe("http_request_duration_seconds", request.endpoint, wall_time)
+        store.observe("db_duration_seconds", request.endpoint, metrics.db_time)
+        store.observe("db_statements", request.endpoint, metrics.statements)
+        store.observe("serialization_duration_seconds", request.endpoint, metrics.serialization_time)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return app.response_class(get_store().exposition(), content_type=CONTENT_TYPE)
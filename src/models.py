@@ -1,4 +1,7 @@
+import json
+
 from flask import url_for
+from sqlalchemy import DDL, event
 
 from src import db, ma
 
@@ -9,10 +12,16 @@ class AuthorBook(db.Model):
     """
 
     __tablename__ = 'author_books'
+    __table_args__ = (
+        # A book is linked once to an author, and the detail views read the links of a book or of an author from
+        # the index alone
+        db.Index('ix_author_books_book_id_author_id', 'book_id', 'author_id', unique=True),
+        db.Index('ix_author_books_author_id_book_id', 'author_id', 'book_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    author_id = db.Column(db.Integer, db.ForeignKey('authors.id'))
-    book_id = db.Column(db.Integer, db.ForeignKey('books.id'))
+    author_id = db.Column(db.Integer, db.ForeignKey('authors.id', ondelete='CASCADE'))
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'))
 
 
 class Author(db.Model):
@@ -25,6 +34,10 @@ class Author(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(60), index=True)
 
+    # Read-only: associations are written through AuthorBook
+    books = db.relationship("Book", secondary="author_books", back_populates="authors", order_by="Book.id",
+                            viewonly=True, sync_backref=False)
+
     def get_url(self):
         return url_for("author.list_authors", id=self.id, _external=True)
 
@@ -32,17 +45,6 @@ class Author(db.Model):
         return f"<Author: {self.name}>"
 
 
-class AuthorSchema(ma.SQLAlchemyAutoSchema):
-    class Meta:
-        # Fields to expose
-        fields = ("id", "name", "books")
-        model = Author
-
-
-author_schema = AuthorSchema()
-authors_schema = AuthorSchema(many=True)
-
-
 class Book(db.Model):
     """
     Create a Book table
@@ -55,6 +57,10 @@ class Book(db.Model):
     edition = db.Column(db.String(10), index=True, nullable=False)
     publication_year = db.Column(db.Integer(), index=True, nullable=False)
 
+    # Read-only: associations are written through AuthorBook
+    authors = db.relationship("Author", secondary="author_books", back_populates="books", order_by="Author.id",
+                              viewonly=True, sync_backref=False)
+
     def get_url(self):
         return url_for("book.list_books", id=self.id, _external=True)
 
@@ -62,6 +68,134 @@ class Book(db.Model):
         return f"<Book: {self.name}>"
 
 
+# The edition prefix filter runs LIKE 'prefix%' on PostgreSQL, which only uses an index of the pattern operators
+# under a collation other than C (see src/filters.py)
+event.listen(Book.__table__, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_books_edition_pattern ON books (edition text_pattern_ops)"
+).execute_if(dialect="postgresql"))
+
+
+class ImportJob(db.Model):
+    """
+    Create an ImportJob table: the state of a bulk import running in the background
+    """
+
+    __tablename__ = 'import_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(10), index=True, nullable=False, default='queued')
+    path = db.Column(db.String(255), nullable=False)
+    batch_size = db.Column(db.Integer, nullable=False)
+    committed_rows = db.Column(db.Integer, nullable=False, default=0)
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text, nullable=False, default='[]')
+    rows_per_second = db.Column(db.Float)
+    message = db.Column(db.Text)
+    # Claim token of the worker running the job, and the last time it reported progress
+    worker = db.Column(db.String(32))
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'committed_rows': self.committed_rows,
+            'inserted': self.inserted,
+            'error_count': self.error_count,
+            'errors': json.loads(self.errors),
+            'rows_per_second': self.rows_per_second,
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<ImportJob: {self.id} ({self.kind}, {self.status})>"
+
+
+class TableVersion(db.Model):
+    """
+    Create a TableVersion table: a counter bumped by every transaction writing to a table, and the time of the bump
+    """
+
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<TableVersion: {self.name} ({self.version})>"
+
+
+class CatalogTotal(db.Model):
+    """
+    Create a CatalogTotal table: the number of rows of a catalog table, kept by triggers (see src/stats/summary.py)
+    and spread over shards, so concurrent writers update different rows
+    """
+
+    __tablename__ = 'catalog_totals'
+
+    name = db.Column(db.String(32), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CatalogTotal: {self.name}/{self.shard} ({self.total})>"
+
+
+class YearStat(db.Model):
+    """
+    Create a YearStat table: the number of books published each year, kept by triggers and spread over shards
+    """
+
+    __tablename__ = 'book_year_counts'
+
+    publication_year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+    books = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<YearStat: {self.publication_year}/{self.shard} ({self.books})>"
+
+
+class AuthorStat(db.Model):
+    """
+    Create an AuthorStat table: the number of books of each author with at least one, kept by triggers
+    """
+
+    __tablename__ = 'author_book_counts'
+
+    author_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    books = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<AuthorStat: {self.author_id} ({self.books})>"
+
+
+# Most prolific authors first, read without sorting
+db.Index('ix_author_book_counts_books', AuthorStat.books.desc(), AuthorStat.author_id)
+
+
+class AuthorSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        # Fields to expose
+        fields = ("id", "name", "books")
+        model = Author
+        include_relationships = True
+
+
+author_schema = AuthorSchema()
+authors_schema = AuthorSchema(many=True)
+
+
 class BookSchema(ma.SQLAlchemyAutoSchema):
 
     class Meta:
@@ -69,6 +203,7 @@ class BookSchema(ma.SQLAlchemyAutoSchema):
         fields = ("id", "name", "edition", "publication_year", "authors")
         model = Book
         include_fk = True
+        include_relationships = True
 
 
 book_schema = BookSchema()
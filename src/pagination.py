@@ -0,0 +1,282 @@
+import base64
+import binascii
+import json
+import threading
+import time
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import and_, or_, tuple_
+
+from . import LOGGER
+from .changes import on_commit
+from .filters import INTEGER_MAX, INTEGER_MIN
+from .metrics import timed_serialization
+
+DEFAULT_LIMIT = 20
+CURSOR_DIRECTIONS = ("next", "previous")
+COUNT_MODES = ("exact", "cached", "none")
+PAGINATION_ARGS = ("start", "limit", "cursor", "count")
+
+
+class CountCache:
+    """
+    Per-process cache of listing counts, keyed by endpoint and filters and grouped by table
+
+    Entries are dropped when a transaction writing their table commits. The TTL bounds how long a worker can serve
+    a count made stale by a commit in another worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, table: str, key: tuple):
+        with self._lock:
+            entry = self._entries.get(table, {}).get(key)
+
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def set(self, table: str, key: tuple, count: int, ttl: float):
+        with self._lock:
+            self._entries.setdefault(table, {})[key] = (count, time.monotonic() + ttl)
+
+    def invalidate(self, tables):
+        with self._lock:
+            for table in tables:
+                self._entries.pop(table, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+on_commit(count_cache.invalidate)
+
+
+def encode_cursor(values: list, direction: str) -> str:
+    """
+    Build an opaque cursor token from the ordering key of a row
+    """
+
+    payload = json.dumps({"k": values, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf8")).decode("ascii").rstrip("=")
+
+
+def is_cursor_value(column, value) -> bool:
+    """
+    Check a value of a cursor has the type of its column: a tampered cursor must not reach the database
+    """
+
+    if value is None:
+        return column.expression.nullable
+
+    python_type = column.type.python_type
+    if python_type is int:
+        return isinstance(value, int) and not isinstance(value, bool) and INTEGER_MIN <= value <= INTEGER_MAX
+    return isinstance(value, python_type)
+
+
+def decode_cursor(token: str, columns: tuple) -> tuple:
+    """
+    Return the ordering key and the direction stored in a cursor token on 'columns'
+    """
+
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf8"))
+        values, direction = payload["k"], payload["d"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        abort(400, "Invalid pagination cursor.")
+
+    if direction not in CURSOR_DIRECTIONS or not isinstance(values, list) or len(values) != len(columns):
+        abort(400, "Invalid pagination cursor.")
+
+    if not all(is_cursor_value(column, value) for column, value in zip(columns, values)):
+        abort(400, "Invalid pagination cursor.")
+
+    return values, direction
+
+
+def get_int_arg(name: str, default: int, minimum: int = 1) -> int:
+    """
+    Read a positive integer from the query string
+    """
+
+    value = request.args.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        abort(400, f"'{name}' must be an integer.")
+
+    if value < minimum:
+        abort(400, f"'{name}' must be greater than or equal to {minimum}.")
+
+    return value
+
+
+def ordering(columns: tuple, forward: bool = True) -> list:
+    """
+    Return the ORDER BY of a (column, primary key) ordering key, NULLs of the column first in ascending order
+
+    The NULL placement is explicit: SQLite sorts NULL first by default and PostgreSQL last, and the cursors must
+    match the order of the rows on every database.
+    """
+
+    column, pk = columns
+    if forward:
+        return [column.asc().nullsfirst(), pk.asc()]
+    return [column.desc().nullslast(), pk.desc()]
+
+
+def keyset_predicate(columns: tuple, values: list, forward: bool = True):
+    """
+    Return the WHERE clause selecting the rows after (or before) a cursor, in the order of 'ordering'
+
+    Row values do not compare NULLs, so a NULL in the leading column, first in ascending order, is compared by hand.
+    """
+
+    column, pk = columns
+    value, pk_value = values
+
+    if value is None:
+        if forward:
+            return or_(and_(column.is_(None), pk > pk_value), column.isnot(None))
+        return and_(column.is_(None), pk < pk_value)
+
+    if forward:
+        return tuple_(column, pk) > tuple_(value, pk_value)
+    return or_(column.is_(None), tuple_(column, pk) < tuple_(value, pk_value))
+
+
+def get_count(query, endpoint: str):
+    """
+    Count the rows of a listing according to the 'count' argument: exact, cached or none
+    """
+
+    mode = request.args.get("count", "exact")
+    if mode not in COUNT_MODES:
+        abort(400, f"'count' must be one of: {', '.join(COUNT_MODES)}.")
+
+    if mode == "none":
+        return None
+
+    count_query = query.order_by(None)
+    if mode == "exact":
+        return count_query.count()
+
+    table = query.column_descriptions[0]["entity"].__tablename__
+    key = (endpoint, tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k not in PAGINATION_ARGS)))
+    count = count_cache.get(table, key)
+    if count is None:
+        LOGGER.debug(f"Count cache miss for {key}")
+        count = count_query.count()
+        count_cache.set(table, key, count, current_app.config["COUNT_CACHE_TTL"])
+
+    return count
+
+
+def page_url(endpoint: str, **params) -> str:
+    """
+    Build the url of another page keeping the filters of the current request
+    """
+
+    args = {key: value for key, value in request.args.items() if key not in ("start", "limit", "cursor")}
+    args.update(params)
+    return url_for(endpoint, **args)
+
+
+def paginate(query, columns: tuple, schema, endpoint: str, page: int = None, per_page: int = DEFAULT_LIMIT) -> dict:
+    """
+    Return a paginated response, fetching and serializing only the rows of the requested page
+
+    Requests with a 'start' argument (or coming from the '/page/<page>' routes) use LIMIT/OFFSET as before. Any
+    other request is paginated with keyset cursors on 'columns'.
+    """
+
+    limit = get_int_arg("limit", per_page)
+
+    if "start" in request.args or page is not None:
+        return paginate_offset(query, columns, schema, endpoint, get_int_arg("start", page or 1), limit)
+
+    return paginate_keyset(query, columns, schema, endpoint, request.args.get("cursor"), limit)
+
+
+def paginate_offset(query, columns: tuple, schema, endpoint: str, start: int, limit: int) -> dict:
+    """
+    Return a page selected with LIMIT/OFFSET (compatibility mode for the 'start'/'limit' arguments)
+    """
+
+    count = get_count(query, endpoint)
+
+    if count is not None and count < start:
+        abort(404)
+
+    LOGGER.debug("Extract result according to the bounds")
+    rows = query.order_by(*ordering(columns)).offset(start - 1).limit(limit + 1).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    if count is None and not rows and start > 1:
+        abort(404)
+
+    pages = {"start": start, "limit": limit, "count": count}
+
+    LOGGER.debug("Build the urls to return")
+    if start == 1:
+        pages["previous"] = ""
+    else:
+        pages["previous"] = page_url(endpoint, start=max(1, start - limit), limit=start - 1)
+
+    if has_next:
+        pages["next"] = page_url(endpoint, start=start + limit, limit=limit)
+    else:
+        pages["next"] = ""
+
+    with timed_serialization():
+        pages["results"] = schema.dump(rows, many=True)
+    return pages
+
+
+def paginate_keyset(query, columns: tuple, schema, endpoint: str, cursor: str, limit: int) -> dict:
+    """
+    Return a page selected with a keyset cursor: WHERE (column, id) > (:last_column, :last_id)
+    """
+
+    forward = True
+    count = get_count(query, endpoint)
+
+    page_query = query
+    if cursor:
+        values, direction = decode_cursor(cursor, columns)
+        forward = direction == "next"
+        page_query = page_query.filter(keyset_predicate(columns, values, forward))
+
+    page_query = page_query.order_by(*ordering(columns, forward))
+
+    LOGGER.debug("Extract result according to the cursor")
+    rows = page_query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+
+    has_next = has_more if forward else bool(cursor)
+    has_previous = bool(cursor) if forward else has_more
+
+    pages = {"limit": limit, "count": count, "previous": "", "next": ""}
+
+    LOGGER.debug("Build the urls to return")
+    if rows and has_previous:
+        first_key = [getattr(rows[0], column.key) for column in columns]
+        pages["previous"] = page_url(endpoint, cursor=encode_cursor(first_key, "previous"), limit=limit)
+
+    if rows and has_next:
+        last_key = [getattr(rows[-1], column.key) for column in columns]
+        pages["next"] = page_url(endpoint, cursor=encode_cursor(last_key, "next"), limit=limit)
+
+    with timed_serialization():
+        pages["results"] = schema.dump(rows, many=True)
+    return pages
@@ -0,0 +1,27 @@
+from sqlalchemy import func
+
+from . import db
+
+
+def aggregate_ids(column):
+    """
+    Aggregate the IDs of a group in a single column: an array on PostgreSQL, a comma separated string elsewhere
+    """
+
+    if db.engine.dialect.name == "postgresql":
+        return func.array_agg(column)
+    return func.group_concat(column)
+
+
+def split_ids(value) -> list:
+    """
+    Return the sorted IDs aggregated by 'aggregate_ids'
+    """
+
+    if not value:
+        return []
+
+    if isinstance(value, str):
+        value = value.split(",")
+
+    return sorted(int(item) for item in value if item is not None)
@@ -0,0 +1,156 @@
+import functools
+import random
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+from . import db, LOGGER
+from .changes import on_commit
+from .database import READ_BIND_KEY
+
+# Cookie holding the time until which a client that wrote reads from the primary (read-your-writes)
+PIN_COOKIE = "olist_primary_until"
+
+# A query on a replicated table: a missing SQLite copy is created empty instead of failing to connect
+PING_STATEMENT = text("SELECT 1 FROM table_versions LIMIT 1")
+
+
+def replica_bind(index: int) -> str:
+    return f"replica_{index}"
+
+
+def configure_replicas(app):
+    """
+    Declare a Flask-SQLAlchemy bind for each URI of DATABASE_REPLICA_URIS
+    """
+
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    for index, uri in enumerate(app.config["DATABASE_REPLICA_URIS"]):
+        binds[replica_bind(index)] = uri
+    app.config["SQLALCHEMY_BINDS"] = binds
+
+
+class ReplicaSet:
+    """
+    Health of the replicas of an application: a replica is checked at most every REPLICA_CHECK_SECONDS, and one
+    that failed is left out for REPLICA_RETRY_SECONDS
+    """
+
+    def __init__(self, binds: list, check_seconds: float, retry_seconds: float):
+        self.binds = binds
+        self.check_seconds = check_seconds
+        self.retry_seconds = retry_seconds
+        self.lock = threading.Lock()
+        self.checks = {}
+
+    def is_available(self, app, bind: str) -> bool:
+        with self.lock:
+            checked_at, healthy = self.checks.get(bind, (None, False))
+        if checked_at is not None:
+            delay = self.check_seconds if healthy else self.retry_seconds
+            if time.monotonic() - checked_at < delay:
+                return healthy
+
+        try:
+            with db.get_engine(app, bind=bind).connect() as connection:
+                connection.execute(PING_STATEMENT)
+        except SQLAlchemyError as e:
+            LOGGER.warning(f"The replica {bind} is unavailable: {e}")
+            self.mark(bind, healthy=False)
+            return False
+
+        self.mark(bind, healthy=True)
+        return True
+
+    def mark(self, bind: str, healthy: bool):
+        with self.lock:
+            self.checks[bind] = (time.monotonic(), healthy)
+
+    def choose(self, app):
+        """
+        Return the bind of an available replica picked at random, or None to read from the primary
+        """
+
+        for bind in random.sample(self.binds, len(self.binds)):
+            if self.is_available(app, bind):
+                return bind
+        return None
+
+
+def get_replicas() -> ReplicaSet:
+    app = current_app._get_current_object()
+    if "replicas" not in app.extensions:
+        binds = [replica_bind(index) for index in range(len(app.config["DATABASE_REPLICA_URIS"]))]
+        app.extensions["replicas"] = ReplicaSet(binds, app.config["REPLICA_CHECK_SECONDS"],
+                                                app.config["REPLICA_RETRY_SECONDS"])
+    return app.extensions["replicas"]
+
+
+def is_pinned_to_primary() -> bool:
+    try:
+        return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def raise_replica_error(error: SQLAlchemyError):
+    """
+    Re-raise an error of the replica read by the current view, for 'read_replica' to run the view on the primary
+    """
+
+    if isinstance(error, OperationalError) and g.get(READ_BIND_KEY) is not None:
+        raise error
+
+
+def read_replica(view):
+    """
+    Run a read-only view against a replica, unless the client wrote recently or no replica is available
+
+    A replica failing during the view is left out and the view runs again on the primary.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config["DATABASE_REPLICA_URIS"] or is_pinned_to_primary():
+            return view(*args, **kwargs)
+
+        replicas = get_replicas()
+        bind = replicas.choose(current_app)
+        if bind is None:
+            return view(*args, **kwargs)
+
+        setattr(g, READ_BIND_KEY, bind)
+        try:
+            return view(*args, **kwargs)
+        except OperationalError as e:
+            LOGGER.warning(f"Read from the primary, the replica {bind} failed: {e}")
+            replicas.mark(bind, healthy=False)
+            db.session.rollback()
+            g.pop(READ_BIND_KEY, None)
+            return view(*args, **kwargs)
+        finally:
+            g.pop(READ_BIND_KEY, None)
+
+    return wrapper
+
+
+@on_commit
+def remember_write(tables):
+    if has_request_context():
+        g.wrote_to_primary = True
+
+
+def install_replicas(app):
+    """
+    Pin the clients of 'app' to the primary for READ_YOUR_WRITES_SECONDS after each request that wrote
+    """
+
+    @app.after_request
+    def pin_to_primary(response):
+        window = app.config["READ_YOUR_WRITES_SECONDS"]
+        if g.pop("wrote_to_primary", False) and app.config["DATABASE_REPLICA_URIS"] and window:
+            response.set_cookie(PIN_COOKIE, str(time.time() + window), max_age=window, httponly=True)
+        return response
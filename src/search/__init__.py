@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+search = Blueprint('search', __name__)
+
+from . import views
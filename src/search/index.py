@@ -0,0 +1,164 @@
+import re
+
+from sqlalchemy import DDL, column, desc, event, func, literal_column, or_, select, table, true
+from sqlalchemy.orm import selectinload
+
+from .. import db
+from ..models import Author, Book
+
+# Columns of each table indexed for full-text search
+SEARCH_COLUMNS = {
+    "authors": ("name",),
+    "books": ("name", "edition"),
+}
+
+# Relationship dumped with the results of each table, loaded for all of them with one query
+SEARCH_RELATIONSHIPS = {
+    "authors": Author.books,
+    "books": Book.authors,
+}
+
+# PostgreSQL text search configuration: no stemming or stop words, like the SQLite unicode61 tokenizer
+PG_SEARCH_CONFIG = "simple"
+
+
+def fts_table_name(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def sqlite_create_statements(table_name: str, columns: tuple) -> list:
+    """
+    Return the statements creating an external content FTS5 table and the triggers keeping it in sync
+    """
+
+    fts = fts_table_name(table_name)
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{name}" for name in columns)
+    old_values = ", ".join(f"old.{name}" for name in columns)
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table_name}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def postgresql_create_statements(table_name: str, columns: tuple) -> list:
+    """
+    Return the statements creating one GIN expression index per searchable column
+    """
+
+    return [
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{name}_search ON {table_name} "
+        f"USING gin (to_tsvector('{PG_SEARCH_CONFIG}', coalesce({name}, '')))"
+        for name in columns
+    ]
+
+
+def install_search_index(model):
+    """
+    Build the search index whenever 'db.create_all()' creates the table of 'model'
+    """
+
+    table_name = model.__tablename__
+    columns = SEARCH_COLUMNS[table_name]
+
+    for statement in sqlite_create_statements(table_name, columns):
+        event.listen(model.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+    for statement in postgresql_create_statements(table_name, columns):
+        event.listen(model.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+    event.listen(
+        model.__table__,
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {fts_table_name(table_name)}").execute_if(dialect="sqlite"),
+    )
+
+
+install_search_index(Author)
+install_search_index(Book)
+
+
+def get_tokens(term: str) -> list:
+    return re.findall(r"\w+", term or "")
+
+
+def search_vector(model, name: str):
+    return func.to_tsvector(PG_SEARCH_CONFIG, func.coalesce(getattr(model, name), ""))
+
+
+def search_query(tokens: list):
+    return func.to_tsquery(PG_SEARCH_CONFIG, " & ".join(f"{token}:*" for token in tokens))
+
+
+def match_expression(tokens: list, columns: tuple) -> str:
+    """
+    Return an FTS5 query matching every token as a prefix inside the given columns
+    """
+
+    phrases = " ".join(f'"{token}"*' for token in tokens)
+    return f"{{{' '.join(columns)}}} : ({phrases})"
+
+
+def match_clause(model, term: str, columns: tuple = None):
+    """
+    Return a WHERE clause matching every token of 'term' as a prefix of a word in the indexed columns of 'model'
+    """
+
+    table_name = model.__tablename__
+    columns = columns or SEARCH_COLUMNS[table_name]
+    tokens = get_tokens(term)
+    if not tokens:
+        return true()
+
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        fts = fts_table_name(table_name)
+        rowids = select([literal_column("rowid")]).select_from(table(fts)).where(
+            literal_column(fts).op("MATCH")(match_expression(tokens, columns))
+        )
+        return model.id.in_(rowids)
+
+    if dialect == "postgresql":
+        query = search_query(tokens)
+        return or_(*[search_vector(model, name).op("@@")(query) for name in columns])
+
+    return or_(*[getattr(model, name).like(f"%{term}%") for name in columns])
+
+
+def ranked_search(model, term: str, limit: int) -> list:
+    """
+    Return the rows of 'model' matching 'term', best matches first
+    """
+
+    table_name = model.__tablename__
+    columns = SEARCH_COLUMNS[table_name]
+    tokens = get_tokens(term)
+    if not tokens:
+        return []
+
+    query = db.session.query(model).options(selectinload(SEARCH_RELATIONSHIPS[table_name]))
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        fts = fts_table_name(table_name)
+        fts_table = table(fts, column("rowid"), column("rank"))
+        query = (
+            query.join(fts_table, fts_table.c.rowid == model.id)
+            .filter(literal_column(fts).op("MATCH")(match_expression(tokens, columns)))
+            .order_by(fts_table.c.rank, model.id)
+        )
+    elif dialect == "postgresql":
+        ts_query = search_query(tokens)
+        rank = sum(func.ts_rank(search_vector(model, name), ts_query) for name in columns)
+        query = query.filter(match_clause(model, term)).order_by(desc(rank), model.id)
+    else:
+        query = query.filter(match_clause(model, term)).order_by(model.name, model.id)
+
+    return query.limit(limit).all()
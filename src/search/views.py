@@ -0,0 +1,27 @@
+from flask import abort, request
+
+from . import search
+from .index import ranked_search
+from .. import LOGGER
+from ..models import Author, authors_schema, Book, books_schema
+from ..pagination import get_int_arg
+
+
+@search.route("/search", methods=["GET"])
+def search_catalog():
+    """
+    Search books and authors by name, best matches first
+    """
+
+    term = request.args.get("q", "").strip()
+    if not term:
+        abort(400, "'q' is a mandatory argument.")
+
+    limit = get_int_arg("limit", 20)
+
+    LOGGER.info(f"Search books and authors matching '{term}'")
+    return {
+        "q": term,
+        "books": books_schema.dump(ranked_search(Book, term, limit), many=True),
+        "authors": authors_schema.dump(ranked_search(Author, term, limit), many=True),
+    }, 200
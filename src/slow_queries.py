@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import click
+from flask import current_app, has_app_context, has_request_context, request
+from flask.cli import with_appcontext
+
+from . import LOGGER
+from .metrics import on_statement
+
+EXPLAINED_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+MAX_PARAMETERS_LENGTH = 1000
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+_log_lock = threading.Lock()
+
+
+def get_log_path(app) -> str:
+    return app.config["SLOW_QUERY_LOG"] or os.path.join(app.instance_path, "slow_queries.log")
+
+
+def get_origin() -> str:
+    """
+    Return the view that ran the statement, or the thread for work done outside a request (e.g. import jobs)
+    """
+
+    if has_request_context():
+        return request.endpoint or request.path
+    return f"thread:{threading.current_thread().name}"
+
+
+def explain_prefix(dialect: str, keyword: str, analyze: bool) -> str:
+    if dialect == "sqlite":
+        return "EXPLAIN QUERY PLAN "
+    # ANALYZE runs the statement again: only for plain SELECTs, as a WITH may hold an INSERT, UPDATE or DELETE
+    if dialect == "postgresql" and analyze and keyword == "SELECT":
+        return "EXPLAIN ANALYZE "
+    return "EXPLAIN "
+
+
+def explain(conn, statement: str, parameters, analyze: bool = False) -> list:
+    """
+    Return the query plan of 'statement' through a new DBAPI cursor, so it is neither tracked nor timed
+
+    On PostgreSQL it runs in a savepoint: a failed EXPLAIN would otherwise abort the transaction of the request.
+    """
+
+    dialect = conn.dialect.name
+    keyword = statement.lstrip().split(None, 1)[0].upper()
+    if keyword not in EXPLAINED_STATEMENTS:
+        return []
+
+    savepoint = dialect == "postgresql"
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        cursor.execute(explain_prefix(dialect, keyword, analyze) + statement, parameters)
+        plan = [" ".join(str(column) for column in row) if dialect != "sqlite" else str(row[-1])
+                for row in cursor.fetchall()]
+        if savepoint:
+            cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        return plan
+    except Exception as e:
+        if savepoint:
+            rollback_explain(cursor)
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        cursor.close()
+
+
+def rollback_explain(cursor):
+    try:
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+    except Exception as e:
+        LOGGER.warning(f"Cannot roll back the EXPLAIN of a slow query: {e}")
+
+
+def format_parameters(parameters) -> str:
+    text = repr(parameters)
+    if len(text) > MAX_PARAMETERS_LENGTH:
+        text = f"{text[:MAX_PARAMETERS_LENGTH]}... [{len(text) - MAX_PARAMETERS_LENGTH} characters truncated]"
+    return text
+
+
+@on_statement
+def log_slow_statement(conn, cursor, statement, parameters, executemany, elapsed):
+    """
+    Log the statements slower than SLOW_QUERY_THRESHOLD_MS with their parameters, view and query plan
+    """
+
+    if not has_app_context():
+        return
+
+    threshold = current_app.config["SLOW_QUERY_THRESHOLD_MS"]
+    if threshold is None or elapsed * 1000 < threshold:
+        return
+
+    # executemany runs the statement once per parameter set: explain it with the first one
+    explained_parameters = parameters[0] if executemany and parameters else parameters
+    entry = {
+        "time": datetime.utcnow().isoformat(timespec="seconds"),
+        "duration_ms": round(elapsed * 1000, 3),
+        "origin": get_origin(),
+        "statement": statement,
+        "parameters": format_parameters(parameters),
+        "executemany": executemany,
+        "plan": explain(conn, statement, explained_parameters, current_app.config["SLOW_QUERY_EXPLAIN_ANALYZE"]),
+    }
+
+    LOGGER.warning(f"Slow query ({entry['duration_ms']} ms) in {entry['origin']}: {statement}")
+    with _log_lock:
+        with open(get_log_path(current_app), "a") as log_file:
+            log_file.write(json.dumps(entry) + "\n")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Group the statements differing only by their number of bound parameters, e.g. IN lists of another size
+    """
+
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return re.sub(r"\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,?)+\)", "(...)", statement)
+
+
+def summarize(entries, top: int) -> list:
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[normalize_statement(entry["statement"])].append(entry)
+
+    summary = []
+    for statement, group in groups.items():
+        durations = [entry["duration_ms"] for entry in group]
+        slowest = max(group, key=lambda entry: entry["duration_ms"])
+        summary.append({
+            "statement": statement,
+            "count": len(group),
+            "total_ms": round(sum(durations), 3),
+            "max_ms": max(durations),
+            "mean_ms": round(sum(durations) / len(durations), 3),
+            "origins": sorted({entry["origin"] for entry in group}),
+            "plan": slowest["plan"],
+        })
+
+    return sorted(summary, key=lambda item: item["total_ms"], reverse=True)[:top]
+
+
+@click.command("slow-queries")
+@click.option("--top", default=10, show_default=True, help="Number of statements to show.")
+@click.option("--log", "log_path", default=None, help="Slow query log to read (SLOW_QUERY_LOG by default).")
+@with_appcontext
+def slow_queries_command(top, log_path):
+    """
+    Summarize the slow query log: the statements with the highest total time first
+    """
+
+    log_path = log_path or get_log_path(current_app)
+    if not os.path.exists(log_path):
+        click.echo(f"There is no slow query log at {log_path}.")
+        return
+
+    with open(log_path) as log_file:
+        entries = [json.loads(line) for line in log_file if line.strip()]
+
+    for rank, item in enumerate(summarize(entries, top), start=1):
+        click.echo(f"{rank}. {item['count']} x, total {item['total_ms']} ms, max {item['max_ms']} ms, "
+                   f"mean {item['mean_ms']} ms, from {', '.join(item['origins'])}")
+        click.echo(f"   {item['statement']}")
+        for line in item["plan"]:
+            click.echo(f"     {line}")
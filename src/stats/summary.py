@@ -0,0 +1,176 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import DDL, event, func, literal, select
+
+from .. import db, LOGGER
+from ..models import Author, AuthorBook, AuthorStat, Book, CatalogTotal, YearStat
+
+# Counters kept by the triggers: (summary table, key columns, count column). The totals and the year counts are
+# spread over COUNTER_SHARDS rows per key, read as their sum
+TOTALS = ("catalog_totals", ("name", "shard"), "total")
+YEARS = ("book_year_counts", ("publication_year", "shard"), "books")
+AUTHORS = ("author_book_counts", ("author_id",), "books")
+
+# On PostgreSQL a transaction updates the shard picked by its ID, so concurrent writers do not wait for each other
+# on the row of a total or of a popular year. SQLite has a single writer: everything goes to shard 0.
+COUNTER_SHARDS = 16
+SHARD_EXPRESSIONS = {
+    "sqlite": "0",
+    "postgresql": f"(txid_current() & {COUNTER_SHARDS - 1})",
+}
+
+
+def add(counter: tuple, keys: tuple, delta: int) -> str:
+    """
+    Return the statements adding 'delta' to the counter of 'keys', unless its first key is NULL
+
+    A row counting nothing is deleted, so the summary tables only grow with the distinct keys of the catalog.
+    """
+
+    table_name, key_columns, count_column = counter
+    columns = ", ".join(key_columns)
+    match = " AND ".join(f"{column} = {key}" for column, key in zip(key_columns, keys))
+    return (f"INSERT INTO {table_name} ({columns}, {count_column}) SELECT {', '.join(keys)}, {delta} "
+            f"WHERE {keys[0]} IS NOT NULL "
+            f"ON CONFLICT ({columns}) DO UPDATE SET {count_column} = {table_name}.{count_column} + {delta}; "
+            f"DELETE FROM {table_name} WHERE {match} AND {count_column} = 0;")
+
+
+def stats_triggers(shard: str) -> dict:
+    """
+    Return the statements run for each row inserted into, deleted from or updated in a catalog table, and the
+    column whose update moves the row to another counter
+    """
+
+    return {
+        "books": {
+            "INSERT": [add(YEARS, ("new.publication_year", shard), 1), add(TOTALS, ("'books'", shard), 1)],
+            "DELETE": [add(YEARS, ("old.publication_year", shard), -1), add(TOTALS, ("'books'", shard), -1)],
+            "UPDATE": ("publication_year", [add(YEARS, ("old.publication_year", shard), -1),
+                                            add(YEARS, ("new.publication_year", shard), 1)]),
+        },
+        "authors": {
+            "INSERT": [add(TOTALS, ("'authors'", shard), 1)],
+            "DELETE": [add(TOTALS, ("'authors'", shard), -1),
+                       "DELETE FROM author_book_counts WHERE author_id = old.id;"],
+        },
+        "author_books": {
+            "INSERT": [add(AUTHORS, ("new.author_id",), 1)],
+            "DELETE": [add(AUTHORS, ("old.author_id",), -1)],
+            "UPDATE": ("author_id", [add(AUTHORS, ("old.author_id",), -1), add(AUTHORS, ("new.author_id",), 1)]),
+        },
+    }
+
+
+def stats_trigger_name(table_name: str) -> str:
+    return f"{table_name}_stats"
+
+
+def sqlite_create_statements(table_name: str, events: dict) -> list:
+    """
+    Return the statements creating one trigger per event of 'table_name', updating the counters in the transaction
+    of the write
+    """
+
+    trigger = stats_trigger_name(table_name)
+    statements = [
+        f"CREATE TRIGGER IF NOT EXISTS {trigger}_ai AFTER INSERT ON {table_name} BEGIN "
+        f"{' '.join(events['INSERT'])} END",
+        f"CREATE TRIGGER IF NOT EXISTS {trigger}_ad AFTER DELETE ON {table_name} BEGIN "
+        f"{' '.join(events['DELETE'])} END",
+    ]
+    if "UPDATE" in events:
+        name, update = events["UPDATE"]
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS {trigger}_au AFTER UPDATE OF {name} ON {table_name} "
+            f"WHEN old.{name} IS NOT new.{name} BEGIN {' '.join(update)} END"
+        )
+    return statements
+
+
+def postgresql_create_statements(table_name: str, events: dict) -> list:
+    """
+    Return the statements creating a row trigger of 'table_name' and the function it runs
+    """
+
+    trigger = stats_trigger_name(table_name)
+    branches = (f"IF TG_OP = 'INSERT' THEN {' '.join(events['INSERT'])} "
+                f"ELSIF TG_OP = 'DELETE' THEN {' '.join(events['DELETE'])} ")
+    operations = "INSERT OR DELETE"
+    if "UPDATE" in events:
+        name, update = events["UPDATE"]
+        branches += f"ELSIF old.{name} IS DISTINCT FROM new.{name} THEN {' '.join(update)} "
+        operations += f" OR UPDATE OF {name}"
+
+    return [
+        f"CREATE OR REPLACE FUNCTION {trigger}() RETURNS trigger AS $$ BEGIN {branches}END IF; RETURN NULL; END; $$ "
+        f"LANGUAGE plpgsql",
+        f"CREATE TRIGGER {trigger} AFTER {operations} ON {table_name} FOR EACH ROW EXECUTE PROCEDURE {trigger}()",
+    ]
+
+
+def install_stats_triggers(model):
+    """
+    Keep the summary tables up to date whenever 'db.create_all()' creates the table of 'model'
+    """
+
+    table_name = model.__tablename__
+
+    events = stats_triggers(SHARD_EXPRESSIONS["sqlite"])[table_name]
+    for statement in sqlite_create_statements(table_name, events):
+        event.listen(model.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+    events = stats_triggers(SHARD_EXPRESSIONS["postgresql"])[table_name]
+    for statement in postgresql_create_statements(table_name, events):
+        event.listen(model.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+install_stats_triggers(Author)
+install_stats_triggers(Book)
+install_stats_triggers(AuthorBook)
+
+
+def rebuild_stats() -> dict:
+    """
+    Recompute the summary tables from the catalog in one transaction, and return the totals
+    """
+
+    for model in (CatalogTotal, YearStat, AuthorStat):
+        db.session.execute(model.__table__.delete())
+
+    db.session.execute(CatalogTotal.__table__.insert().from_select(
+        ["name", "shard", "total"],
+        select([literal("authors"), literal(0), func.count(Author.id)]).having(func.count(Author.id) > 0).union_all(
+            select([literal("books"), literal(0), func.count(Book.id)]).having(func.count(Book.id) > 0)
+        ),
+    ))
+    db.session.execute(YearStat.__table__.insert().from_select(
+        ["publication_year", "shard", "books"],
+        select([Book.publication_year, literal(0), func.count()]).group_by(Book.publication_year),
+    ))
+    db.session.execute(AuthorStat.__table__.insert().from_select(
+        ["author_id", "books"],
+        select([AuthorBook.author_id, func.count()]).where(AuthorBook.author_id.isnot(None))
+        .group_by(AuthorBook.author_id),
+    ))
+    db.session.commit()
+
+    totals = get_totals()
+    LOGGER.info(f"Rebuilt the catalog stats: {totals}")
+    return totals
+
+
+def get_totals() -> dict:
+    totals = dict(db.session.query(CatalogTotal.name, func.sum(CatalogTotal.total)).group_by(CatalogTotal.name))
+    return {"authors": totals.get("authors") or 0, "books": totals.get("books") or 0}
+
+
+@click.command("rebuild-stats")
+@with_appcontext
+def rebuild_stats_command():
+    """
+    Recompute the summary tables of '/stats', e.g. after writing to the catalog with the triggers disabled
+    """
+
+    totals = rebuild_stats()
+    click.echo(f"Rebuilt the stats of {totals['authors']} authors and {totals['books']} books.")
@@ -0,0 +1,61 @@
+from flask import abort
+from sqlalchemy import func
+
+from . import stats
+from .summary import get_totals
+from .. import db, LOGGER
+from ..models import Author, AuthorStat, YearStat
+from ..pagination import get_int_arg
+from ..replicas import read_replica
+
+MAX_TOP_AUTHORS = 100
+
+
+@stats.route("/stats", methods=["GET"])
+@read_replica
+def catalog_stats():
+    """
+    Return the catalog totals, the books published per year and the authors with the most books
+
+    Every figure is read from the summary tables kept by the triggers of src/stats/summary.py: a few primary key and
+    index lookups, whatever the size of the catalog. The totals and the year counts add up the rows of their shards.
+    """
+
+    top = min(get_int_arg("top", 10), MAX_TOP_AUTHORS)
+
+    LOGGER.info("Read the catalog stats")
+    books = func.sum(YearStat.books)
+    years = (
+        db.session.query(YearStat.publication_year, books)
+        .group_by(YearStat.publication_year)
+        .having(books > 0)
+        .order_by(YearStat.publication_year)
+    )
+    top_authors = (
+        db.session.query(Author.id, Author.name, AuthorStat.books)
+        .join(Author, Author.id == AuthorStat.author_id)
+        .order_by(AuthorStat.books.desc(), AuthorStat.author_id)
+        .limit(top)
+    )
+
+    return {
+        "totals": get_totals(),
+        "books_per_year": [{"publication_year": year, "books": books} for year, books in years],
+        "top_authors": [{"id": id, "name": name, "books": books} for id, name, books in top_authors],
+    }, 200
+
+
+@stats.route("/stats/authors/<int:id>", methods=["GET"])
+@read_replica
+def author_stats(id):
+    """
+    Return the number of books of an author
+    """
+
+    LOGGER.info(f"Read the stats of the author id {id}")
+    author = Author.query.get(id)
+    if author is None:
+        abort(404)
+
+    books = db.session.query(AuthorStat.books).filter_by(author_id=id).scalar()
+    return {"id": author.id, "name": author.name, "books": books or 0}, 200
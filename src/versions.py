@@ -0,0 +1,111 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+
+from . import db, LOGGER
+from .cache import cache_key, ETAG_KEY
+from .changes import before_commit
+from .models import TableVersion
+
+# Tables whose writes change the validators of the read endpoints
+VERSIONED_TABLES = ("authors", "books", "author_books")
+
+BUMP_STATEMENT = (
+    "INSERT INTO table_versions (name, version, updated_at) VALUES ({0}, 1, {0}) "
+    "ON CONFLICT (name) DO UPDATE SET version = table_versions.version + 1, updated_at = excluded.updated_at"
+)
+
+
+@before_commit
+def bump_versions(connection, tables: frozenset):
+    """
+    Increment the version of the written tables in the transaction that wrote them
+
+    The upsert is understood by SQLite (3.24+) and PostgreSQL, and creates the row of a table on its first write.
+    """
+
+    names = sorted(tables.intersection(VERSIONED_TABLES))
+    if not names:
+        return
+
+    dialect = connection.dialect
+    statement = BUMP_STATEMENT.format("?" if dialect.paramstyle == "qmark" else "%s")
+    # Last-Modified has a resolution of one second: the bump is dated at the end of its second, which conditional()
+    # only announces once it is over, so a later write in the same second cannot hide behind the same date
+    now = datetime.utcnow()
+    if now.microsecond:
+        now = now.replace(microsecond=0) + timedelta(seconds=1)
+    if dialect.name == "sqlite":
+        now = now.isoformat(" ")
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.executemany(statement, [(name, now) for name in names])
+    finally:
+        cursor.close()
+
+
+def get_validators(tables: tuple) -> tuple:
+    """
+    Return the ETag and the Last-Modified date of the current request, read with one query on table_versions
+    """
+
+    rows = db.session.query(TableVersion.name, TableVersion.version, TableVersion.updated_at).filter(
+        TableVersion.name.in_(tables)
+    ).all()
+
+    versions = {name: version for name, version, _ in rows}
+    fingerprint = "|".join([cache_key()] + [f"{table}={versions.get(table, 0)}" for table in tables])
+    etag = hashlib.sha1(fingerprint.encode()).hexdigest()
+    last_modified = max((updated_at for _, _, updated_at in rows if updated_at is not None), default=None)
+    return etag, last_modified
+
+
+def is_not_modified(etag: str, last_modified) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 7232, section 6)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since.replace(tzinfo=None)
+
+    return False
+
+
+def conditional(*tables: str):
+    """
+    Answer a GET view with 304 when the client's ETag or date is current, before running the view
+
+    The validators change whenever a transaction writes to one of 'tables'.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+
+            etag, last_modified = get_validators(tables)
+            if last_modified is not None and last_modified > datetime.utcnow():
+                # The second of the last write is not over: another write could still get the same date
+                last_modified = None
+
+            setattr(g, ETAG_KEY, etag)
+            if is_not_modified(etag, last_modified):
+                LOGGER.debug(f"Not modified: {request.full_path}")
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+
+            if response.status_code in (200, 304):
+                response.set_etag(etag, weak=True)
+                if last_modified is not None:
+                    response.last_modified = last_modified
+
+            return response
+
+        return wrapper
+
+    return decorator
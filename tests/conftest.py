@@ -1,9 +1,12 @@
 import json
+import os
 import string
+from contextlib import contextmanager
 from random import choice
 
 import pytest
 from flask import url_for
+from sqlalchemy import event
 
 from src import create_app, db
 from src.models import Author, Book, AuthorBook
@@ -17,10 +20,10 @@ def get_url(app, url, next_url=None, id=None):
 @pytest.fixture()
 def app():
     """
-    Create app with a database test
+    Create app with a database test: TEST_DATABASE_URI may name a throwaway PostgreSQL database
     """
 
-    SQLALCHEMY_DATABASE_URI = "sqlite:///../tests/olist-test.db"
+    SQLALCHEMY_DATABASE_URI = os.getenv("TEST_DATABASE_URI", "sqlite:///../tests/olist-test.db")
 
     app = create_app()
     app.config.from_object("config.TestingConfig")
@@ -117,3 +120,21 @@ def get_random_int(length: int) -> int:
     numbers = "0123456789"
     a_string = "".join(choice(numbers) for i in range(length))
     return int(a_string)
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the SQL statements executed inside the block
+    """
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
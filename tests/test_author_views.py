@@ -1,6 +1,8 @@
 import json
 
-from tests.conftest import get_url
+from src.models import Author, AuthorBook
+from src.pagination import encode_cursor
+from tests.conftest import count_queries, get_url, json_of_response
 
 
 def test_list_authors_view(app, client):
@@ -85,3 +87,264 @@ def test_delete_author_that_does_not_exist_view(app, client):
 
     response = client.delete(get_url(app=app, url="author.delete_author", id=1000000))
     assert response.status_code == 404
+
+
+def test_delete_author_deletes_links_view(app, client):
+    """
+    Test deleting an author deletes its book links in the same transaction
+    """
+
+    client.delete(get_url(app=app, url="author.delete_author", id=1))
+
+    assert AuthorBook.query.filter_by(author_id=1).count() == 0
+    assert AuthorBook.query.count() == 1
+
+
+def test_list_authors_keyset_pagination_view(app, client):
+    """
+    Test walking the list of authors with the next/previous cursors
+    """
+
+    response = client.get(get_url(app=app, url="author.list_authors"), query_string={"limit": 1})
+    first_page = json_of_response(response)
+    assert response.status_code == 200
+    assert first_page["count"] == 2
+    assert first_page["previous"] == ""
+    assert [author["name"] for author in first_page["results"]] == ["Ariano Suassuna"]
+
+    response = client.get(first_page["next"])
+    second_page = json_of_response(response)
+    assert response.status_code == 200
+    assert second_page["next"] == ""
+    assert [author["name"] for author in second_page["results"]] == ["Molnar Ferenc"]
+
+    response = client.get(second_page["previous"])
+    assert json_of_response(response)["results"] == first_page["results"]
+
+
+def test_list_authors_keyset_pagination_with_null_names_view(app, client):
+    """
+    Test the cursors walk every author once, those without a name first, with the NULL placement explicit in SQL
+    """
+
+    for _ in range(2):
+        client.put(get_url(app=app, url="author.edit_author", id=client.post(
+            get_url(app=app, url="author.add_author"), json={"name": "Unnamed"}).json["id"]), json={})
+
+    url = get_url(app=app, url="author.list_authors")
+    pages = []
+    with count_queries() as statements:
+        page = json_of_response(client.get(url, query_string={"limit": 1}))
+        pages.append(page)
+        while page["next"]:
+            page = json_of_response(client.get(page["next"]))
+            pages.append(page)
+
+    assert [page["results"][0]["id"] for page in pages] == [3, 4, 2, 1]
+    assert any("NULLS FIRST" in statement for statement in statements)
+
+    previous_ids = []
+    while page["previous"]:
+        page = json_of_response(client.get(page["previous"]))
+        previous_ids.append(page["results"][0]["id"])
+    assert previous_ids == [2, 4, 3]
+
+
+def test_list_authors_start_limit_view(app, client):
+    """
+    Test the start/limit compatibility mode
+    """
+
+    response = client.get(get_url(app=app, url="author.list_authors"), query_string={"start": 2, "limit": 1})
+    page = json_of_response(response)
+    assert response.status_code == 200
+    assert page["start"] == 2
+    assert page["next"] == ""
+    assert "start=1" in page["previous"]
+    assert [author["name"] for author in page["results"]] == ["Molnar Ferenc"]
+
+
+def test_list_authors_invalid_cursor_view(app, client):
+    """
+    Test list authors with a cursor that cannot be decoded
+    """
+
+    response = client.get(get_url(app=app, url="author.list_authors"), query_string={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_list_authors_tampered_cursor_view(app, client):
+    """
+    Test a cursor whose values do not have the types of the ordering columns is refused before any query
+    """
+
+    url = get_url(app=app, url="author.list_authors")
+    for values in ([[1], 1], ["Molnar Ferenc", "1"], ["Molnar Ferenc", None], [1, 1], ["Molnar Ferenc", True],
+                   ["Molnar Ferenc", 10 ** 25], ["Molnar Ferenc", 1, 1]):
+        response = client.get(url, query_string={"cursor": encode_cursor(values, "next")})
+
+        assert response.status_code == 400
+        assert "Invalid pagination cursor." in json_of_response(response)["error"]
+
+
+def test_list_authors_cached_count_view(app, client):
+    """
+    Test the cached count is dropped when an author is added
+    """
+
+    url = get_url(app=app, url="author.list_authors")
+    response = client.get(url, query_string={"count": "cached"})
+    assert json_of_response(response)["count"] == 2
+
+    client.post(
+        get_url(app=app, url="author.add_author"),
+        data=json.dumps({"name": "J. R. R. Tolkien"}),
+        content_type="application/json",
+    )
+
+    response = client.get(url, query_string={"count": "cached"})
+    assert json_of_response(response)["count"] == 3
+
+
+def test_list_authors_without_count_view(app, client):
+    """
+    Test list authors skipping the count
+    """
+
+    response = client.get(get_url(app=app, url="author.list_authors"), query_string={"count": "none", "limit": 1})
+    page = json_of_response(response)
+    assert response.status_code == 200
+    assert page["count"] is None
+    assert "count=none" in page["next"]
+
+
+def test_list_authors_invalid_count_mode_view(app, client):
+    """
+    Test list authors with an unknown count mode
+    """
+
+    response = client.get(get_url(app=app, url="author.list_authors"), query_string={"count": "estimated"})
+    assert response.status_code == 400
+
+
+def test_list_authors_with_books_view(app, client):
+    """
+    Test the books of every author are loaded with a constant number of queries
+    """
+
+    # The first request runs the one-time startup work
+    client.get("/")
+
+    url = get_url(app=app, url="author.list_authors")
+
+    with count_queries() as small_page_queries:
+        client.get(url, query_string={"limit": 1})
+
+    with count_queries() as full_page_queries:
+        response = client.get(url, query_string={"limit": 20})
+
+    assert [author["books"] for author in json_of_response(response)["results"]] == [[2], [1]]
+    assert len(small_page_queries) == len(full_page_queries)
+
+
+def test_author_detail_single_query_view(app, client):
+    """
+    Test the author and its books are fetched with one query
+    """
+
+    # The first request runs the one-time startup work
+    client.get("/")
+
+    with count_queries() as queries:
+        response = client.get(get_url(app=app, url="author.author_detail", id=2))
+
+    assert json_of_response(response) == {"id": 2, "name": "Ariano Suassuna", "books": [2]}
+    # Besides the read of the table versions for the ETag
+    assert len([query for query in queries if "table_versions" not in query]) == 1
+
+
+def test_add_author_bulk_default_file_view(app, client):
+    """
+    Test add authors in bulk from the default CSV file
+    """
+
+    response = client.post(get_url(app=app, url="author.add_author_bulk"), query_string={"batch_size": 7})
+    report = json_of_response(response)
+
+    assert response.status_code == 201
+    assert report["inserted"] == report["rows"] == report["committed_rows"] == 30
+    assert Author.query.count() == 32
+
+
+def test_add_author_bulk_resume_view(app, client):
+    """
+    Test resume an import after its committed rows, streaming the CSV body
+    """
+
+    response = client.post(
+        get_url(app=app, url="author.add_author_bulk"),
+        data="name\nAlready Imported\nJorge Amado\n \nClarice Lispector\n",
+        query_string={"resume_from": 1, "batch_size": 1},
+        content_type="text/csv",
+    )
+    report = json_of_response(response)
+
+    assert response.status_code == 201
+    assert report["committed_rows"] == 4
+    assert report["inserted"] == 2
+    assert [error["line"] for error in report["errors"]] == [4]
+    assert Author.query.filter_by(name="Already Imported").count() == 0
+
+
+def test_batch_authors_view(app, client):
+    """
+    Test create, update and delete authors in one batch, removing the links of the deleted ones
+    """
+
+    operations = [
+        {"op": "create", "data": {"name": "Jorge Amado"}},
+        {"op": "update", "id": 1, "data": {"name": "Ferenc Molnar"}},
+        {"op": "delete", "id": 2},
+        {"op": "rename", "id": 1},
+    ]
+
+    response = client.post(
+        get_url(app=app, url="author.batch_authors"),
+        data=json.dumps({"mode": "best_effort", "operations": operations}),
+        content_type="application/json",
+    )
+    result = json_of_response(response)
+
+    assert response.status_code == 200
+    assert [item["status"] for item in result["results"]] == [201, 200, 200, 400]
+    assert Author.query.get(1).name == "Ferenc Molnar"
+    assert Author.query.get(2) is None
+    assert AuthorBook.query.filter_by(author_id=2).count() == 0
+    assert Author.query.filter_by(name="Jorge Amado").count() == 1
+
+
+def test_batch_authors_invalid_body_view(app, client):
+    """
+    Test a batch without a list of operations
+    """
+
+    response = client.post(
+        get_url(app=app, url="author.batch_authors"),
+        data=json.dumps({"mode": "whatever", "operations": []}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 400
+    assert "mode" in json_of_response(response)["error"]
+
+
+def test_export_authors_csv_view(app, client):
+    """
+    Test export the authors and their book IDs as CSV
+    """
+
+    response = client.get(get_url(app=app, url="author.export_authors"), query_string={"format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == "attachment; filename=authors.csv"
+    assert response.get_data(as_text=True).splitlines() == ["id,name,books", "1,Molnar Ferenc,1", "2,Ariano Suassuna,2"]
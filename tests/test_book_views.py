@@ -1,6 +1,9 @@
+import io
 import json
 
-from tests.conftest import get_url
+from src import db
+from src.models import AuthorBook, Book
+from tests.conftest import count_queries, get_url, json_of_response
 
 
 def test_list_book_view(app, client):
@@ -93,3 +96,516 @@ def test_delete_book_that_does_not_exist_view(app, client):
 
     response = client.delete(get_url(app=app, url="book.delete_book", id=1000000))
     assert response.status_code == 404
+
+
+def test_delete_book_deletes_links_view(app, client):
+    """
+    Test deleting a book deletes its author links in the same transaction
+    """
+
+    client.delete(get_url(app=app, url="book.delete_book", id=1))
+
+    assert AuthorBook.query.filter_by(book_id=1).count() == 0
+    assert AuthorBook.query.count() == 1
+
+
+def test_delete_books_by_filter_view(app, client):
+    """
+    Test deleting the books published before a year, with their author links
+    """
+
+    response = client.delete(get_url(app=app, url="book.delete_books"), query_string={"publication_year__lt": 2000})
+
+    assert response.status_code == 200
+    assert json_of_response(response)["deleted"] == 1
+    assert [book.name for book in Book.query] == ["The Saint and The Sow"]
+    assert [link.book_id for link in AuthorBook.query] == [2]
+
+
+def test_delete_books_without_filter_view(app, client):
+    """
+    Test the bulk delete refuses to delete all books
+    """
+
+    response = client.delete(get_url(app=app, url="book.delete_books"))
+
+    assert response.status_code == 400
+    assert Book.query.count() == 2
+
+
+def test_delete_books_with_unsupported_filter_view(app, client):
+    """
+    Test the bulk delete refuses arguments that are not typed filters, or out of range, instead of ignoring them
+    """
+
+    for arguments in ({"publication_year__lt": 2000, "name": "Delete"}, {"publication_year__lt": 2000, "q": "x"},
+                      {"publication_year__lt": 2000, "edition": "5th Edition"}, {"publication_year__lt": "9" * 25}):
+        response = client.delete(get_url(app=app, url="book.delete_books"), query_string=arguments)
+
+        assert response.status_code == 400
+        assert Book.query.count() == 2
+
+
+def test_list_books_keyset_pagination_keeps_filters_view(app, client):
+    """
+    Test the next cursor keeps the filters of the request
+    """
+
+    response = client.get(get_url(app=app, url="book.list_books"), query_string={"name": "The", "limit": 1})
+    first_page = json_of_response(response)
+    assert response.status_code == 200
+    assert first_page["results"][0]["name"] == "The Paul Street Boys"
+    assert "name=The" in first_page["next"]
+
+    response = client.get(first_page["next"])
+    assert json_of_response(response)["results"][0]["name"] == "The Saint and The Sow"
+
+
+def test_list_books_start_out_of_range_view(app, client):
+    """
+    Test list books starting after the last book
+    """
+
+    response = client.get(get_url(app=app, url="book.list_books"), query_string={"start": 3})
+    assert response.status_code == 404
+
+
+def test_list_books_name_prefix_search_view(app, client):
+    """
+    Test the name filter matches word prefixes through the search index
+    """
+
+    response = client.get(get_url(app=app, url="book.list_books"), query_string={"name": "stre boy"})
+    assert [book["name"] for book in json_of_response(response)["results"]] == ["The Paul Street Boys"]
+
+
+def test_list_books_search_index_follows_edits_view(app, client):
+    """
+    Test the search index is kept in sync when a book is edited
+    """
+
+    client.put(
+        get_url(app=app, url="book.edit_book", id=1),
+        data=json.dumps({"name": "The Hobbit"}),
+        content_type="application/json",
+    )
+
+    response = client.get(get_url(app=app, url="book.list_books"), query_string={"q": "paul"})
+    assert json_of_response(response)["results"] == []
+
+    response = client.get(get_url(app=app, url="book.list_books"), query_string={"q": "hobbit"})
+    assert [book["id"] for book in json_of_response(response)["results"]] == [1]
+
+
+def test_list_books_publication_year_filters_view(app, client):
+    """
+    Test the exact, range and list filters on publication_year
+    """
+
+    url = get_url(app=app, url="book.list_books")
+
+    response = client.get(url, query_string={"publication_year": 1934})
+    assert [book["publication_year"] for book in json_of_response(response)["results"]] == [1934]
+
+    response = client.get(url, query_string={"publication_year__gte": 1900, "publication_year__lt": 2000})
+    assert [book["publication_year"] for book in json_of_response(response)["results"]] == [1934]
+
+    response = client.get(url, query_string={"publication_year__in": "1934,2002"})
+    assert json_of_response(response)["count"] == 2
+
+
+def test_list_books_edition_filters_view(app, client):
+    """
+    Test the exact and prefix filters on edition
+    """
+
+    url = get_url(app=app, url="book.list_books")
+
+    response = client.get(url, query_string={"edition__exact": "3rd Edition"})
+    assert [book["edition"] for book in json_of_response(response)["results"]] == ["3rd Edition"]
+
+    response = client.get(url, query_string={"edition__startswith": "5th"})
+    assert [book["edition"] for book in json_of_response(response)["results"]] == ["5th Edition"]
+
+
+def test_list_books_edition_prefix_ending_with_the_highest_code_point_view(app, client):
+    """
+    Test a prefix ending with U+10FFFF, which has no successor to bound the range with
+    """
+
+    db.session.add(Book(name="Liliom", edition="5th\U0010ffffEd", publication_year=1909))
+    db.session.commit()
+    url = get_url(app=app, url="book.list_books")
+
+    response = client.get(url, query_string={"edition__startswith": "5th\U0010ffff"})
+    assert response.status_code == 200
+    assert [book["name"] for book in json_of_response(response)["results"]] == ["Liliom"]
+
+    response = client.get(url, query_string={"edition__startswith": "\U0010ffff"})
+    assert response.status_code == 200
+    assert json_of_response(response)["results"] == []
+
+
+def test_list_books_edition_prefix_before_the_surrogates_view(app, client):
+    """
+    Test a prefix ending with U+D7FF, whose successor is not a surrogate but U+E000
+    """
+
+    db.session.add(Book(name="Liliom", edition="5th\ud7ffEd", publication_year=1909))
+    db.session.commit()
+    url = get_url(app=app, url="book.list_books")
+
+    response = client.get(url, query_string={"edition__startswith": "5th\ud7ff"})
+    assert response.status_code == 200
+    assert [book["name"] for book in json_of_response(response)["results"]] == ["Liliom"]
+
+
+def test_list_books_invalid_filter_view(app, client):
+    """
+    Test list books with an invalid value or operator
+    """
+
+    url = get_url(app=app, url="book.list_books")
+    assert client.get(url, query_string={"publication_year": "19x4"}).status_code == 400
+    assert client.get(url, query_string={"publication_year__like": "1934"}).status_code == 400
+    assert client.get(url, query_string={"publication_year": "9" * 25}).status_code == 400
+    assert client.get(url, query_string={"publication_year__in": f"1934,-{'9' * 25}"}).status_code == 400
+
+
+def test_list_books_query_count_does_not_depend_on_page_size_view(app, client):
+    """
+    Test the authors of a page are loaded in one query, whatever the page size
+    """
+
+    # The first request runs the one-time startup work
+    client.get("/")
+
+    url = get_url(app=app, url="book.list_books")
+
+    with count_queries() as small_page_queries:
+        response = client.get(url, query_string={"limit": 1})
+    assert len(json_of_response(response)["results"]) == 1
+
+    with count_queries() as full_page_queries:
+        response = client.get(url, query_string={"limit": 20})
+    books = json_of_response(response)["results"]
+
+    assert len(books) == 2
+    assert [book["authors"] for book in books] == [[1], [2]]
+    assert len(small_page_queries) == len(full_page_queries)
+
+
+def test_book_detail_single_query_view(app, client):
+    """
+    Test the book and its authors are fetched with one query
+    """
+
+    # The first request runs the one-time startup work
+    client.get("/")
+
+    with count_queries() as queries:
+        response = client.get(get_url(app=app, url="book.book_detail", id=1))
+
+    assert json_of_response(response) == {
+        "id": 1,
+        "name": "The Paul Street Boys",
+        "publication_year": 1934,
+        "authors": [1],
+    }
+    # Besides the read of the table versions for the ETag
+    assert len([query for query in queries if "table_versions" not in query]) == 1
+
+
+def test_add_book_bulk_view(app, client):
+    """
+    Test add books in bulk with authors given by name or ID
+    """
+
+    csv_file = (
+        "name,edition,publication_year,authors\n"
+        "Auto da Compadecida,1st Edition,1955,Ariano Suassuna\n"
+        "Liliom,2nd Edition,1909,1;2\n"
+        "Unknown Book,1st Edition,2000,Nobody\n"
+        "No Year,1st Edition,,1\n"
+    )
+
+    response = client.post(
+        get_url(app=app, url="book.add_book_bulk"),
+        data={"csv_upload": (io.BytesIO(csv_file.encode("utf8")), "books.csv")},
+        query_string={"batch_size": 2},
+        content_type="multipart/form-data",
+    )
+    report = json_of_response(response)
+
+    assert response.status_code == 201
+    assert report["rows"] == 4
+    assert report["inserted"] == 2
+    assert [error["line"] for error in report["errors"]] == [4, 5]
+    assert "rows_per_second" in report
+
+    response = client.get(get_url(app=app, url="book.list_books"), query_string={"name": "Liliom"})
+    assert json_of_response(response)["results"][0]["authors"] == [1, 2]
+
+
+def test_add_book_bulk_csv_body_view(app, client):
+    """
+    Test add books in bulk sending the CSV file as the request body
+    """
+
+    response = client.post(
+        get_url(app=app, url="book.add_book_bulk"),
+        data="name,edition,publication_year,authors\nLiliom,2nd Edition,1909,1\n",
+        content_type="text/csv",
+    )
+
+    assert response.status_code == 201
+    assert json_of_response(response)["inserted"] == 1
+
+
+def test_add_book_bulk_malformed_numbers_view(app, client):
+    """
+    Test digits int() cannot read and numbers too large for an INTEGER column are reported as invalid rows
+    """
+
+    csv_file = (
+        "name,edition,publication_year,authors\n"
+        "Superscript Author,1st Edition,1955,\u00b2\n"
+        "Superscript Year,1st Edition,19\u00b25,1\n"
+        "Large Author,1st Edition,1955,99999999999999999999999\n"
+        "Large Year,1st Edition,99999999999999999999999,1\n"
+        "Liliom,2nd Edition,1909,1\n"
+    )
+
+    response = client.post(get_url(app=app, url="book.add_book_bulk"), data=csv_file, content_type="text/csv")
+    report = json_of_response(response)
+
+    assert response.status_code == 201
+    assert report["inserted"] == 1
+    assert [error["line"] for error in report["errors"]] == [2, 3, 4, 5]
+
+
+def test_add_book_bulk_without_file_view(app, client):
+    """
+    Test add books in bulk without a CSV file
+    """
+
+    response = client.post(get_url(app=app, url="book.add_book_bulk"))
+    assert response.status_code == 400
+
+
+def test_add_book_with_authors_view(app, client):
+    """
+    Test add a book and its authors with one multi-row insert
+    """
+
+    with count_queries() as queries:
+        response = client.post(
+            get_url(app=app, url="book.add_book"),
+            data=json.dumps({
+                "name": "The Niggard Rich",
+                "edition": "2nd Edition",
+                "publication_year": "1954",
+                "authors": [2, 1, 2],
+            }),
+            content_type="application/json",
+        )
+
+    assert response.status_code == 201
+    assert json_of_response(response)["authors"] == [1, 2]
+    assert len([query for query in queries if query.startswith("INSERT INTO author_books")]) == 1
+
+
+def test_add_book_with_unknown_author_view(app, client):
+    """
+    Test add a book with an author that does not exist
+    """
+
+    response = client.post(
+        get_url(app=app, url="book.add_book"),
+        data=json.dumps({"name": "Liliom", "edition": "1st Edition", "publication_year": "1909", "authors": [1, 99]}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 400
+    assert "99" in json_of_response(response)["error"]
+    assert Book.query.filter_by(name="Liliom").count() == 0
+
+
+def test_edit_book_authors_view(app, client):
+    """
+    Test edit a book adding only the authors it does not have yet
+    """
+
+    response = client.put(
+        get_url(app=app, url="book.edit_book", id=1),
+        data=json.dumps({"authors": [1, 2]}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    assert json_of_response(response)["authors"] == [1, 2]
+    assert AuthorBook.query.filter_by(book_id=1).count() == 2
+
+
+def test_batch_books_view(app, client):
+    """
+    Test create, update and delete books in one batch with one statement per kind of write
+    """
+
+    operations = [
+        {"op": "create", "data": {"name": "Liliom", "edition": "1st Edition", "publication_year": 1909,
+                                  "authors": [1]}},
+        {"op": "create", "data": {"name": "The Devil", "edition": "2nd Edition", "publication_year": "1907"}},
+        {"op": "update", "id": 1, "data": {"edition": "6th Edition", "authors": [1, 2]}},
+        {"op": "delete", "id": 2},
+    ]
+
+    with count_queries() as queries:
+        response = client.post(
+            get_url(app=app, url="book.batch_books"),
+            data=json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+    result = json_of_response(response)
+
+    assert response.status_code == 200
+    assert result["succeeded"] == 4
+    assert [item["status"] for item in result["results"]] == [201, 201, 200, 200]
+    assert [item["id"] for item in result["results"]] == [3, 4, 1, 2]
+    assert len([query for query in queries if query.startswith("INSERT INTO books")]) == 1
+    assert Book.query.get(1).edition == "6th Edition"
+    assert Book.query.get(2) is None
+    assert AuthorBook.query.filter_by(book_id=2).count() == 0
+    assert sorted(link.author_id for link in AuthorBook.query.filter_by(book_id=1)) == [1, 2]
+    assert [link.author_id for link in AuthorBook.query.filter_by(book_id=3)] == [1]
+
+
+def test_batch_books_atomic_view(app, client):
+    """
+    Test an atomic batch with an invalid operation does not apply any operation
+    """
+
+    operations = [
+        {"op": "create", "data": {"name": "Liliom", "edition": "1st Edition", "publication_year": 1909}},
+        {"op": "update", "id": 99, "data": {"edition": "6th Edition"}},
+        {"op": "create", "data": {"name": "The Devil", "authors": [99]}},
+    ]
+
+    response = client.post(
+        get_url(app=app, url="book.batch_books"),
+        data=json.dumps({"mode": "atomic", "operations": operations}),
+        content_type="application/json",
+    )
+    result = json_of_response(response)
+
+    assert response.status_code == 400
+    assert [item["status"] for item in result["results"]] == [409, 404, 400]
+    assert Book.query.count() == 2
+
+
+def test_batch_books_best_effort_view(app, client):
+    """
+    Test a best-effort batch applies the valid operations and reports the invalid ones
+    """
+
+    operations = [
+        {"op": "create", "data": {"name": "Liliom", "edition": "1st Edition", "publication_year": 1909,
+                                  "authors": [1, 99]}},
+        {"op": "update", "id": 2, "data": {"publication_year": "next year"}},
+        {"op": "update", "id": 2, "data": {"name": "The Saint and the Sow"}},
+        {"op": "create", "data": {"name": "The Devil", "edition": "2nd Edition", "publication_year": 1907}},
+    ]
+
+    response = client.post(
+        get_url(app=app, url="book.batch_books"),
+        data=json.dumps({"mode": "best_effort", "operations": operations}),
+        content_type="application/json",
+    )
+    result = json_of_response(response)
+
+    assert response.status_code == 200
+    assert (result["succeeded"], result["failed"]) == (1, 3)
+    assert [item["status"] for item in result["results"]] == [400, 400, 400, 201]
+    assert "99" in result["results"][0]["error"]
+    assert Book.query.filter_by(name="The Devil").count() == 1
+    assert Book.query.get(2).name == "The Saint and The Sow"
+
+
+def test_batch_books_malformed_operations_view(app, client):
+    """
+    Test an op that is not a string and values too large for an INTEGER column fail their item with 400
+    """
+
+    operations = [
+        {"op": ["create"], "data": {"name": "Liliom", "edition": "1st Edition", "publication_year": 1909}},
+        {"op": "create", "data": {"name": "Liliom", "edition": "1st Edition", "publication_year": 10 ** 25}},
+        {"op": "update", "id": 10 ** 25, "data": {"name": "Liliom"}},
+        {"op": "update", "id": 1, "data": {"authors": [10 ** 25]}},
+        {"op": "create", "data": {"name": "The Devil", "edition": "2nd Edition", "publication_year": 1907}},
+    ]
+
+    response = client.post(
+        get_url(app=app, url="book.batch_books"),
+        data=json.dumps({"mode": "best_effort", "operations": operations}),
+        content_type="application/json",
+    )
+    result = json_of_response(response)
+
+    assert response.status_code == 200
+    assert [item["status"] for item in result["results"]] == [400, 400, 400, 400, 201]
+    assert "publication_year" in result["results"][1]["error"]
+    assert Book.query.filter_by(name="Liliom").count() == 0
+
+
+def test_export_books_ndjson_view(app, client):
+    """
+    Test export the books and their author IDs as NDJSON, one chunk at a time
+    """
+
+    app.config.update(EXPORT_CHUNK_SIZE=1)
+    client.put(get_url(app=app, url="book.edit_book", id=1), data=json.dumps({"authors": [2]}),
+               content_type="application/json")
+
+    response = client.get(get_url(app=app, url="book.export_books"))
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(line) for line in lines] == [
+        {"id": 1, "name": "The Paul Street Boys", "edition": "5th Edition", "publication_year": 1934, "authors": [1, 2]},
+        {"id": 2, "name": "The Saint and The Sow", "edition": "3rd Edition", "publication_year": 2002, "authors": [2]},
+    ]
+
+
+def test_export_books_csv_view(app, client):
+    """
+    Test export the filtered books as CSV, in the format of the bulk import
+    """
+
+    response = client.get(get_url(app=app, url="book.export_books"),
+                          query_string={"format": "csv", "publication_year__gt": 2000})
+
+    assert response.mimetype == "text/csv"
+    assert response.get_data(as_text=True).splitlines() == [
+        "id,name,edition,publication_year,authors",
+        "2,The Saint and The Sow,3rd Edition,2002,2",
+    ]
+    assert client.get(get_url(app=app, url="book.export_books"), query_string={"format": "xml"}).status_code == 400
+
+
+def test_export_filtered_books_reads_their_links_only_view(app, client):
+    """
+    Test the links of a filtered export are limited to the exported books instead of reading all of author_books
+    """
+
+    url = get_url(app=app, url="book.export_books")
+    with count_queries() as queries:
+        lines = client.get(url, query_string={"publication_year__gt": 2000}).get_data(as_text=True).splitlines()
+
+    assert [json.loads(line)["authors"] for line in lines] == [[2]]
+    links_query = next(query for query in queries if "FROM author_books" in query)
+    assert "publication_year >" in links_query
+
+    with count_queries() as queries:
+        assert len(client.get(url).get_data(as_text=True).splitlines()) == 2
+    assert " IN " not in next(query for query in queries if "FROM author_books" in query)
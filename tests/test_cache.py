@@ -0,0 +1,177 @@
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from src import db
+from src.cache import FileCache, MemoryCache, ResponseCache
+from src.changes import _commit_listeners
+from src.models import Book
+from tests.conftest import count_queries, get_url, json_of_response
+
+
+def test_book_detail_cached_until_edit_view(app, client):
+    """
+    Test a cached detail is served without querying the catalog and invalidated by the commit of an edit
+    """
+
+    url = get_url(app=app, url="book.book_detail", id=1)
+    assert client.get(url).headers["X-Cache"] == "MISS"
+
+    with count_queries() as queries:
+        response = client.get(url)
+
+    assert response.headers["X-Cache"] == "HIT"
+    assert all("table_versions" in query for query in queries)
+
+    client.put(get_url(app=app, url="book.edit_book", id=1), data=json.dumps({"name": "A Pál utcai fiúk"}),
+               content_type="application/json")
+    response = client.get(url)
+
+    assert response.headers["X-Cache"] == "MISS"
+    assert json_of_response(response)["name"] == "A Pál utcai fiúk"
+
+
+def test_list_books_cache_key_normalizes_query_args_view(app, client):
+    """
+    Test the order of the query arguments does not change the cache key
+    """
+
+    url = get_url(app=app, url="book.list_books")
+    client.get(url, query_string="publication_year__gte=1900&limit=1")
+
+    assert client.get(url, query_string="limit=1&publication_year__gte=1900").headers["X-Cache"] == "HIT"
+    assert client.get(url, query_string="limit=2&publication_year__gte=1900").headers["X-Cache"] == "MISS"
+
+
+def test_cache_invalidated_by_bulk_writes_view(app, client):
+    """
+    Test writes made outside the ORM, like the bulk import, invalidate the cached lists
+    """
+
+    url = get_url(app=app, url="author.list_authors")
+    client.get(url)
+
+    client.post(get_url(app=app, url="author.add_author_bulk"), data="name\nJorge Amado\n", content_type="text/csv")
+    response = client.get(url)
+
+    assert response.headers["X-Cache"] == "MISS"
+    assert json_of_response(response)["count"] == 3
+
+
+def test_cache_follows_the_writes_of_other_workers_view(app, client):
+    """
+    Test a write committed by another process, which does not invalidate the tags of this one, is not hidden by the
+    cached body under the new ETag
+    """
+
+    url = get_url(app=app, url="book.book_detail", id=1)
+    client.get(url)
+
+    # Another gunicorn worker edits the book: only table_versions tells this one
+    with sqlite3.connect(db.engine.url.database) as other_worker:
+        other_worker.execute("UPDATE books SET name = 'A Pál utcai fiúk' WHERE id = 1")
+        other_worker.execute("UPDATE table_versions SET version = version + 1 WHERE name = 'books'")
+    other_worker.close()
+
+    response = client.get(url)
+    assert response.headers["X-Cache"] == "MISS"
+    assert json_of_response(response)["name"] == "A Pál utcai fiúk"
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+def test_commit_listeners_run_after_the_commit(app):
+    """
+    Test a reader let in by the invalidation of a commit reads the committed rows, not the ones before the commit
+    """
+
+    reader = create_engine(db.engine.url)
+    counts = []
+
+    def read_books(tables):
+        with reader.connect() as connection:
+            counts.append(connection.execute("SELECT count(*) FROM books").scalar())
+
+    _commit_listeners.append(read_books)
+    try:
+        db.session.add(Book(name="Liliom", edition="1st Edition", publication_year=1909))
+        db.session.commit()
+    finally:
+        _commit_listeners.remove(read_books)
+        reader.dispose()
+
+    assert counts == [3]
+
+
+def test_response_cache_backends_implement_the_storage():
+    """
+    Test the base cache cannot be used without a storage backend
+    """
+
+    with pytest.raises(TypeError):
+        ResponseCache(ttl=60)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    """
+    Test the in-process cache drops the least recently read entry when it is full
+    """
+
+    cache = MemoryCache(ttl=60, max_entries=2)
+    for key in ("a", "b"):
+        cache.set(key, key, cache.versions(("books",)))
+
+    cache.get("a", ("books",))
+    cache.set("c", "c", cache.versions(("books",)))
+
+    assert cache.get("b", ("books",)) is None
+    assert cache.get("a", ("books",)) == "a"
+
+
+def test_file_cache_is_shared_between_workers(tmp_path):
+    """
+    Test two caches on the same directory, like two gunicorn workers, see each other's entries and invalidations
+    """
+
+    worker_1 = FileCache(ttl=60, directory=str(tmp_path), max_entries=10)
+    worker_2 = FileCache(ttl=60, directory=str(tmp_path), max_entries=10)
+
+    worker_1.set("books", b"[]", worker_1.versions(("books",)))
+    assert worker_2.get("books", ("books",)) == b"[]"
+
+    worker_2.invalidate({"books"})
+    assert worker_1.get("books", ("books",)) is None
+
+
+def test_file_cache_sweeps_expired_and_oldest_entries(tmp_path):
+    """
+    Test the entries never read again, like the pages of keyset cursors, are removed when expired or beyond the cap
+    """
+
+    cache = FileCache(ttl=60, directory=str(tmp_path), max_entries=4)
+    cache.set("expired", b"[]", cache.versions(("books",)))
+    os.utime(cache.entry_path("expired"), (time.time() - 120, time.time() - 120))
+
+    for page in range(8):
+        cache.set(f"page {page}", b"[]", cache.versions(("books",)))
+
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".entry")]) == 4
+    assert cache.get("expired", ("books",)) is None
+    assert cache.get("page 0", ("books",)) is None
+    assert cache.get("page 7", ("books",)) == b"[]"
+
+
+def test_cache_entry_built_during_a_commit_is_stale():
+    """
+    Test a response built while a commit invalidated its tags is never served
+    """
+
+    cache = MemoryCache(ttl=60, max_entries=10)
+    versions = cache.versions(("books",))
+    cache.invalidate({"books"})
+    cache.set("books", b"[]", versions)
+
+    assert cache.get("books", ("books",)) is None
@@ -0,0 +1,64 @@
+from src import catalog, db
+from src.catalog import generate_catalog, generate_catalog_command
+from src.models import Author, AuthorBook, Book
+
+
+def test_generate_catalog(app):
+    """
+    Test the catalog is appended after the existing rows with 1-4 authors per book
+    """
+
+    with app.app_context():
+        result = generate_catalog(books=50, authors=10, seed=1, batch_size=20)
+
+        assert db.session.query(Book).count() == 52
+        assert db.session.query(Author).count() == 12
+        assert result["links"] == db.session.query(AuthorBook).filter(AuthorBook.book_id > 2).count()
+        assert 50 <= result["links"] <= 200
+
+
+def test_generate_catalog_reserves_ids_per_batch(app, monkeypatch):
+    """
+    Test an author written by another client between two batches does not take an ID of the next batch
+    """
+
+    insert_rows = catalog.insert_rows
+
+    def insert_then_write_concurrently(table, rows):
+        insert_rows(table, rows)
+        if table is Author.__table__:
+            db.session.commit()
+            db.session.execute(Author.__table__.insert(), {"name": "Concurrent Writer"})
+
+    monkeypatch.setattr(catalog, "insert_rows", insert_then_write_concurrently)
+    with app.app_context():
+        generate_catalog(books=4, authors=6, seed=1, batch_size=3)
+
+        assert db.session.query(Author).count() == 10
+        assert db.session.query(Author).filter_by(name="Concurrent Writer").count() == 2
+
+
+def test_generate_catalog_is_deterministic(app):
+    """
+    Test the same seed generates the same books
+    """
+
+    with app.app_context():
+        generate_catalog(books=5, authors=2, seed=3)
+        first = [book.name for book in db.session.query(Book).filter(Book.id > 2).order_by(Book.id)]
+        generate_catalog(books=5, authors=2, seed=3)
+        second = [book.name for book in db.session.query(Book).filter(Book.id > 7).order_by(Book.id)]
+
+    # The names end with the book id
+    assert [name.rsplit(" ", 1)[0] for name in first] == [name.rsplit(" ", 1)[0] for name in second]
+
+
+def test_generate_catalog_command(app):
+    """
+    Test the CLI defaults to one author for five books
+    """
+
+    result = app.test_cli_runner().invoke(generate_catalog_command, ["--books", "20"])
+
+    assert result.exit_code == 0
+    assert "Generated 4 authors, 20 books" in result.output
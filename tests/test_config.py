@@ -15,3 +15,9 @@ def test_testing_config(app):
     assert app.config["DEBUG"]
     assert app.config["TESTING"]
     assert not app.config["PRESERVE_CONTEXT_ON_EXCEPTION"]
+
+
+def test_sqlite_profile_config(app):
+    assert app.config["SQLITE_PROFILE"] == "default"
+    app.config.from_object("config.ProductionConfig")
+    assert app.config["SQLITE_PROFILE"] == "production"
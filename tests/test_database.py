@@ -0,0 +1,205 @@
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+import config
+from src import create_app, db
+from src.bulk import insert_rows, reserve_ids
+from src.models import Author, AuthorBook, Book
+
+requires_postgresql = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URI", "").startswith("postgresql"),
+                                         reason="TEST_DATABASE_URI does not name a PostgreSQL database")
+
+
+def get_pragmas(app) -> dict:
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        try:
+            return {name: connection.execute(f"PRAGMA {name}").fetchone()[0]
+                    for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size",
+                                 "foreign_keys")}
+        finally:
+            connection.close()
+
+
+def test_production_sqlite_profile(tmp_path):
+    """
+    Test the production profile sets the pragmas on every connection and pools the connections
+    """
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'olist.db'}", "SQLITE_PROFILE": "production"})
+
+    pragmas = get_pragmas(app)
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000, "cache_size": -65536,
+                       "mmap_size": 268435456, "foreign_keys": 1}
+
+    with app.app_context():
+        assert isinstance(db.engine.pool, QueuePool)
+        assert db.engine.pool.size() == 5
+
+
+def test_default_sqlite_profile(tmp_path):
+    """
+    Test the default profile keeps the SQLite defaults and a connection per session
+    """
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'olist.db'}"})
+
+    assert get_pragmas(app)["journal_mode"] == "delete"
+    with app.app_context():
+        assert isinstance(db.engine.pool, NullPool)
+
+
+def test_production_profile_views(tmp_path):
+    """
+    Test the views work on pooled connections shared by the threads
+    """
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'olist.db'}", "SQLITE_PROFILE": "production",
+                      "RESPONSE_CACHE_BACKEND": "none"})
+    with app.app_context():
+        db.create_all()
+
+    client = app.test_client()
+    response = client.post("/authors/add", json={"name": "Clarice Lispector"})
+    assert response.status_code == 201
+    assert client.get("/authors").json["results"][0]["name"] == "Clarice Lispector"
+
+
+def test_production_profile_cascades_deletes(tmp_path):
+    """
+    Test deleting a book deletes its author links when the foreign keys are enforced
+    """
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'olist.db'}", "SQLITE_PROFILE": "production"})
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Author(id=1, name="Graciliano Ramos"),
+                            Book(id=1, name="Vidas Secas", edition="1st", publication_year=1938)])
+        db.session.flush()
+        db.session.add(AuthorBook(author_id=1, book_id=1))
+        db.session.commit()
+
+        db.session.execute(Book.__table__.delete())
+        db.session.commit()
+
+        assert db.session.query(AuthorBook).count() == 0
+
+
+def test_unknown_sqlite_profile(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'olist.db'}", "SQLITE_PROFILE": "fast"})
+
+    with app.app_context(), pytest.raises(ValueError):
+        db.engine
+
+
+def test_create_app_honors_config_class(monkeypatch, tmp_path):
+    """
+    Test FLASK_CONFIG selects a config class of config.py and its DATABASE_URI
+    """
+
+    database_uri = f"sqlite:///{tmp_path / 'production.db'}"
+    monkeypatch.setenv("FLASK_CONFIG", "production")
+    monkeypatch.setattr(config.ProductionConfig, "DATABASE_URI", database_uri)
+
+    app = create_app()
+
+    assert not app.config["DEBUG"]
+    assert app.config["SQLITE_PROFILE"] == "production"
+    assert app.config["SQLALCHEMY_DATABASE_URI"] == database_uri
+
+
+def test_unknown_config_class(monkeypatch):
+    monkeypatch.setenv("FLASK_CONFIG", "staging")
+
+    with pytest.raises(ValueError):
+        create_app()
+
+
+def test_postgresql_pool_settings(tmp_path):
+    """
+    Test the PostgreSQL engines get the pool settings of the configuration
+    """
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'olist.db'}", "DATABASE_POOL_SIZE": 4})
+    options = {}
+    db.apply_driver_hacks(app, make_url("postgresql://olist@localhost/olist"), options)
+
+    assert options == {"pool_size": 4, "max_overflow": 20, "pool_recycle": 1800, "pool_pre_ping": True,
+                       "pool_timeout": 30}
+
+
+def test_reserve_ids_and_insert_rows(app):
+    """
+    Test the reserved keys follow the existing rows and the rows inserted with them are readable
+    """
+
+    with app.app_context():
+        ids = list(reserve_ids(Book, 2))
+        insert_rows(Book.__table__, [{"id": id, "name": f"Book {id}", "edition": "1st", "publication_year": 2000}
+                                     for id in ids])
+        insert_rows(Author.__table__, [{"name": "Rachel de Queiroz"}])
+        db.session.commit()
+
+        assert len(set(ids)) == 2
+        assert db.session.query(Book).filter(Book.id.in_(ids)).count() == 2
+        assert db.session.query(Author).filter_by(name="Rachel de Queiroz").count() == 1
+
+
+def test_reserved_ids_hold_the_write_lock(app):
+    """
+    Test another SQLite writer cannot pick the reserved keys before the transaction that reserved them commits
+    """
+
+    if db.engine.dialect.name != "sqlite":
+        pytest.skip("The keys are taken from a sequence")
+
+    ids = list(reserve_ids(Book, 2))
+    other_writer = sqlite3.connect(db.engine.url.database, timeout=0)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="database is locked"):
+            other_writer.execute("BEGIN IMMEDIATE")
+
+        db.session.commit()
+        other_writer.execute("BEGIN IMMEDIATE")
+        assert other_writer.execute("SELECT max(id) FROM books").fetchone()[0] == ids[0] - 1
+    finally:
+        other_writer.close()
+
+
+@requires_postgresql
+def test_reserved_ids_advance_the_sequence(app):
+    """
+    Test a row added after a bulk insert does not reuse a reserved key
+    """
+
+    with app.app_context():
+        ids = list(reserve_ids(Book, 3))
+        insert_rows(Book.__table__, [{"id": id, "name": f"Book {id}", "edition": "1st", "publication_year": 2000}
+                                     for id in ids])
+        book = Book(name="After the import", edition="1st", publication_year=2001)
+        db.session.add(book)
+        db.session.commit()
+
+        assert book.id > max(ids)
+
+
+@requires_postgresql
+def test_bulk_import_copies_rows_on_postgresql(app):
+    """
+    Test the CSV import loads the books and their links with COPY, keeping the separators and quotes of the values
+    """
+
+    csv_file = (
+        'name,edition,publication_year,authors\n'
+        '"Liliom, a Legend","2nd ""Ed""",1909,1;Ariano Suassuna\n'
+    )
+    response = app.test_client().post("/books/add/bulk", data=csv_file, content_type="text/csv")
+
+    assert response.status_code == 201
+    book = Book.query.filter_by(name="Liliom, a Legend").one()
+    assert book.edition == '2nd "Ed"'
+    assert [author.id for author in book.authors] == [1, 2]
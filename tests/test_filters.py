@@ -0,0 +1,77 @@
+import os
+
+import pytest
+from sqlalchemy.dialects import sqlite
+
+from src import db
+from src.filters import apply_filters, BOOK_FILTERS, prefix_range
+from src.models import Book
+
+requires_postgresql = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URI", "").startswith("postgresql"),
+                                         reason="TEST_DATABASE_URI does not name a PostgreSQL database")
+
+
+def get_query_plan(app, query_string: str) -> str:
+    """
+    Return the SQLite query plan of the list of books filtered by 'query_string'
+    """
+
+    with app.test_request_context(f"/books?{query_string}"):
+        query = apply_filters(db.session.query(Book.id), Book, BOOK_FILTERS)
+        statement = query.statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+        plan = db.session.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+
+    return " ".join(str(row[-1]) for row in plan)
+
+
+def test_publication_year_exact_uses_index(app):
+    """
+    Test the exact year filter searches ix_books_publication_year
+    """
+
+    assert "USING COVERING INDEX ix_books_publication_year (publication_year=?)" in get_query_plan(
+        app, "publication_year=1934"
+    )
+
+
+def test_publication_year_range_uses_index(app):
+    """
+    Test the year range filter searches ix_books_publication_year
+    """
+
+    plan = get_query_plan(app, "publication_year__gte=1900&publication_year__lt=2000")
+    assert "USING COVERING INDEX ix_books_publication_year (publication_year>? AND publication_year<?)" in plan
+
+
+def test_publication_year_in_uses_index(app):
+    """
+    Test the year list filter searches ix_books_publication_year
+    """
+
+    assert "USING COVERING INDEX ix_books_publication_year (publication_year=?)" in get_query_plan(
+        app, "publication_year__in=1934,2002"
+    )
+
+
+def test_edition_prefix_uses_index(app):
+    """
+    Test the edition prefix filter searches ix_books_edition
+    """
+
+    assert "USING COVERING INDEX ix_books_edition (edition>? AND edition<?)" in get_query_plan(
+        app, "edition__startswith=5th"
+    )
+
+
+@requires_postgresql
+def test_edition_prefix_matches_like_on_postgresql(app):
+    """
+    Test the prefix filter matches with LIKE under the collation of the database, escaping its wildcards
+    """
+
+    db.session.add(Book(name="Liliom", edition="5th_Ed%", publication_year=1909))
+    db.session.commit()
+
+    editions = Book.query.with_entities(Book.edition).order_by(Book.id)
+    assert [edition for edition, in editions.filter(prefix_range(Book.edition, "5th"))] == ["5th Edition", "5th_Ed%"]
+    assert [edition for edition, in editions.filter(prefix_range(Book.edition, "5th_"))] == ["5th_Ed%"]
@@ -0,0 +1,152 @@
+import os
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from src import db
+from src.imports.jobs import get_jobs_folder, Heartbeat, is_runnable, recover_jobs
+from src.models import Author, Book, ImportJob
+from tests.conftest import get_url, json_of_response
+
+
+def wait_for_job(app, client, job_id: str, timeout: float = 10) -> dict:
+    """
+    Poll an import job until it is finished
+    """
+
+    deadline = time.monotonic() + timeout
+    while True:
+        job = json_of_response(client.get(get_url(app=app, url="imports.import_status", id=job_id)))
+        if job["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_add_author_bulk_async_view(app, client):
+    """
+    Test import authors as a background job
+    """
+
+    response = client.post(
+        get_url(app=app, url="author.add_author_bulk"),
+        data="name\nJorge Amado\nClarice Lispector\n",
+        query_string={"async": "true", "batch_size": 1},
+        content_type="text/csv",
+    )
+    job = json_of_response(response)
+
+    assert response.status_code == 202
+    assert response.headers["Location"].endswith(f"/imports/{job['id']}")
+
+    job = wait_for_job(app, client, job["id"])
+    assert job["status"] == "done"
+    assert job["committed_rows"] == job["inserted"] == 2
+    assert Author.query.count() == 4
+
+
+def test_add_book_bulk_async_view(app, client):
+    """
+    Test import books as a background job, reporting the invalid rows
+    """
+
+    response = client.post(
+        get_url(app=app, url="book.add_book_bulk"),
+        data="name,edition,publication_year,authors\nLiliom,2nd Edition,1909,1\nNo Year,1st Edition,,1\n",
+        query_string={"async": "1"},
+        content_type="text/csv",
+    )
+    assert response.status_code == 202
+
+    job = wait_for_job(app, client, json_of_response(response)["id"])
+    assert job["status"] == "done"
+    assert job["inserted"] == 1
+    assert [error["line"] for error in job["errors"]] == [3]
+    assert Book.query.count() == 3
+
+
+def test_recover_abandoned_import_job(app, client):
+    """
+    Test a job abandoned by a stopped worker resumes after its last committed row
+    """
+
+    path = os.path.join(get_jobs_folder(app), "abandoned.csv")
+    with open(path, "w") as job_file:
+        job_file.write("name\nAlready Imported\nJorge Amado\n")
+
+    db.session.add(ImportJob(
+        id="abandoned", kind="authors", status="running", path=path, batch_size=1, committed_rows=1, inserted=1,
+        worker="stopped", heartbeat_at=datetime.utcnow() - timedelta(hours=1), created_at=datetime.utcnow(),
+    ))
+    db.session.commit()
+
+    recover_jobs(app)
+
+    job = wait_for_job(app, client, "abandoned")
+    assert job["status"] == "done"
+    assert job["committed_rows"] == 2
+    assert job["inserted"] == 2
+    assert Author.query.filter_by(name="Already Imported").count() == 0
+    assert Author.query.filter_by(name="Jorge Amado").count() == 1
+
+
+def test_import_status_resubmits_only_stale_jobs_view(app, client, monkeypatch):
+    """
+    Test polling a job waiting for a busy worker does not queue it again, and a stale job is queued once per process
+    """
+
+    submitted = []
+
+    class BusyPool:
+        def submit(self, function, app, job_id):
+            submitted.append(Future())
+            return submitted[-1]
+
+    monkeypatch.setattr("src.imports.jobs.get_executor", lambda app: BusyPool())
+    # The first request recovers the runnable jobs
+    client.get(get_url(app=app, url="imports.import_status", id="unknown"))
+    db.session.add_all([
+        ImportJob(id="waiting", kind="authors", status="queued", path="waiting.csv", batch_size=1,
+                  created_at=datetime.utcnow()),
+        ImportJob(id="stale", kind="authors", status="running", path="stale.csv", batch_size=1, worker="stopped",
+                  heartbeat_at=datetime.utcnow() - timedelta(hours=1), created_at=datetime.utcnow()),
+    ])
+    db.session.commit()
+
+    try:
+        for _ in range(3):
+            for job_id in ("waiting", "stale"):
+                assert client.get(get_url(app=app, url="imports.import_status", id=job_id)).status_code == 200
+
+        assert len(submitted) == 1
+    finally:
+        for future in submitted:
+            future.set_result(None)
+
+
+def test_import_job_that_does_not_exist_view(app, client):
+    """
+    Test show an import job that does not exist
+    """
+
+    response = client.get(get_url(app=app, url="imports.import_status", id="unknown"))
+    assert response.status_code == 404
+
+
+def test_heartbeat_keeps_a_long_batch_claimed(app):
+    """
+    Test a job keeps reporting it is alive between two checkpoints, so another worker cannot claim it
+    """
+
+    app.config["IMPORT_JOB_HEARTBEAT_SECONDS"] = 0.05
+    db.session.add(ImportJob(
+        id="long-batch", kind="authors", status="running", path="long-batch.csv", batch_size=1000, worker="alive",
+        heartbeat_at=datetime.utcnow() - timedelta(hours=1), created_at=datetime.utcnow(),
+    ))
+    db.session.commit()
+
+    with Heartbeat(app, "long-batch", "alive"):
+        time.sleep(0.3)
+
+    db.session.expire_all()
+    assert ImportJob.query.get("long-batch").heartbeat_at > datetime.utcnow() - timedelta(seconds=5)
+    assert ImportJob.query.filter(ImportJob.id == "long-batch", is_runnable()).count() == 0
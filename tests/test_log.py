@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+from logging.handlers import QueueHandler
+
+from log import Log
+
+
+def read_entries(log: Log, tmp_path) -> list:
+    """
+    Stop the listener, so every queued record is written, and return the JSON entries of the log file
+    """
+
+    log.stop()
+    (log_file_path,) = tmp_path.glob("test_*.log")
+    return [json.loads(line) for line in log_file_path.read_text().splitlines()]
+
+
+def get_logger(tmp_path, **options):
+    log = Log(os.path.join(str(tmp_path), "test"))
+    logger = logging.getLogger(f"test-{tmp_path.name}")
+    logger.propagate = False
+    return log, log.configure(logger, **options)
+
+
+def test_logger_only_enqueues_records(tmp_path):
+    """
+    Test the logger hands the records to a queue, the handlers writing them run in the listener thread
+    """
+
+    log, logger = get_logger(tmp_path, level="WARNING", log_format="json")
+
+    assert [type(handler) for handler in logger.handlers] == [QueueHandler]
+    logger.info("Filtered out by the level")
+    logger.warning("Written")
+
+    assert [entry["message"] for entry in read_entries(log, tmp_path)] == ["Written"]
+
+
+def test_large_messages_are_truncated(tmp_path):
+    """
+    Test a message above the configured length is cut before being queued
+    """
+
+    log, logger = get_logger(tmp_path, level="INFO", log_format="json", max_length=20)
+    logger.info("x" * 500)
+
+    message = read_entries(log, tmp_path)[0]["message"]
+    assert message == "x" * 20 + "... [480 characters truncated]"
+
+
+def test_json_entries_have_the_request(app, tmp_path):
+    """
+    Test the records logged while handling a request carry its method, path and endpoint
+    """
+
+    log, logger = get_logger(tmp_path, level="INFO", log_format="json")
+    with app.test_request_context("/books?limit=1"):
+        logger.info("In a request")
+
+    entry = read_entries(log, tmp_path)[0]
+    assert (entry["level"], entry["method"], entry["path"]) == ("INFO", "GET", "/books")
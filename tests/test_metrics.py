@@ -0,0 +1,56 @@
+import os
+
+from src.metrics import MetricsStore, MmapFile
+from tests.conftest import get_url
+
+
+def test_server_timing_header_view(app, client):
+    """
+    Test a response carries its wall, DB and serialization times and its SQL statement count
+    """
+
+    response = client.get(get_url(app=app, url="book.list_books"))
+    server_timing = response.headers["Server-Timing"]
+
+    assert server_timing.startswith("app;dur=")
+    # Table versions, count, page and the authors of the page
+    assert 'db;dur=' in server_timing and 'desc="4 queries"' in server_timing
+    assert "serialize;dur=" in server_timing
+
+
+def test_metrics_view(app, client, tmp_path):
+    """
+    Test the request histograms are exposed per endpoint in the Prometheus text format
+    """
+
+    app.config.update(METRICS_DIR=str(tmp_path))
+    for _ in range(3):
+        client.get(get_url(app=app, url="author.list_authors"))
+
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+
+    assert response.content_type == "text/plain; version=0.0.4; charset=utf-8"
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{endpoint="author.list_authors"} 3' in body
+    assert 'db_statements_bucket{endpoint="author.list_authors",le="+Inf"} 3' in body
+    assert 'endpoint="metrics"' not in body
+
+
+def test_metrics_store_sums_the_files_of_all_workers(tmp_path):
+    """
+    Test the exposition adds up the files written by every process, each file growing past its initial size
+    """
+
+    worker_1 = MmapFile(os.path.join(str(tmp_path), "metrics_1.db"))
+    worker_2 = MmapFile(os.path.join(str(tmp_path), "metrics_2.db"))
+    for index in range(5000):
+        worker_1.add(f"key {index}", 1)
+    worker_1.add("shared", 1.5)
+    worker_2.add("shared", 2)
+
+    values = MetricsStore(str(tmp_path)).collect()
+
+    assert values["shared"] == 3.5
+    assert values["key 4999"] == 1
+    assert len(values) == 5001
@@ -1,3 +1,7 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src import db
 from src.models import Author, Book, AuthorBook
 
 
@@ -23,3 +27,16 @@ def test_author_book_model(app):
     """
 
     assert AuthorBook.query.count() == 2
+
+
+def test_author_book_unique_link(app):
+    """
+    Test a book cannot be linked twice to the same author
+    """
+
+    link = AuthorBook.query.first()
+    db.session.add(AuthorBook(book_id=link.book_id, author_id=link.author_id))
+
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
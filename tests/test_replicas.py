@@ -0,0 +1,135 @@
+import shutil
+
+import pytest
+
+from src import create_app, db
+from src.models import Author, TableVersion
+from src.replicas import PIN_COOKIE
+
+
+@pytest.fixture()
+def replicated_app(tmp_path):
+    """
+    Create an app reading from a file copy of its SQLite database
+    """
+
+    primary = tmp_path / "primary.db"
+    replica = tmp_path / "replica.db"
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{primary}",
+        "DATABASE_REPLICA_URIS": [f"sqlite:///{replica}"],
+    })
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Author(name="Jorge Amado"))
+        db.session.commit()
+    shutil.copy(primary, replica)
+
+    # A write the replica has not received yet
+    with app.app_context():
+        db.session.add(Author(name="Cecília Meireles"))
+        db.session.commit()
+
+    return app
+
+
+def author_names(response) -> list:
+    return [author["name"] for author in response.json["results"]]
+
+
+def test_reads_from_replica(replicated_app):
+    """
+    Test the list and detail views read from the replica
+    """
+
+    client = replicated_app.test_client()
+
+    assert author_names(client.get("/authors")) == ["Jorge Amado"]
+    assert client.get("/authors/1").status_code == 200
+    assert client.get("/authors/2").status_code == 404
+
+
+def test_read_your_writes(replicated_app):
+    """
+    Test a client reads from the primary for a while after it wrote, and the other clients from the replica
+    """
+
+    writer = replicated_app.test_client()
+    response = writer.post("/authors/add", json={"name": "Rubem Braga"})
+    assert PIN_COOKIE in response.headers["Set-Cookie"]
+
+    assert author_names(writer.get("/authors")) == ["Cecília Meireles", "Jorge Amado", "Rubem Braga"]
+    assert author_names(replicated_app.test_client().get("/authors")) == ["Jorge Amado"]
+
+
+def test_read_your_writes_with_response_cache(replicated_app):
+    """
+    Test a response cached from the lagging replica is not served to the client that wrote
+    """
+
+    writer = replicated_app.test_client()
+    writer.post("/authors/add", json={"name": "Rubem Braga"})
+
+    reader = replicated_app.test_client()
+    assert author_names(reader.get("/authors")) == ["Jorge Amado"]
+    assert reader.get("/authors").headers["X-Cache"] == "HIT"
+
+    response = writer.get("/authors")
+    assert response.headers["X-Cache"] == "MISS"
+    assert author_names(response) == ["Cecília Meireles", "Jorge Amado", "Rubem Braga"]
+
+
+def test_writes_go_to_primary(replicated_app):
+    replicated_app.test_client().put("/authors/edit/1", json={"name": "Jorge Amado de Faria"})
+
+    with replicated_app.app_context():
+        assert db.session.query(Author).get(1).name == "Jorge Amado de Faria"
+
+
+def test_fallback_to_primary(tmp_path):
+    """
+    Test the reads go to the primary when the replica is unavailable
+    """
+
+    primary = tmp_path / "primary.db"
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{primary}",
+        "DATABASE_REPLICA_URIS": [f"sqlite:///{tmp_path / 'missing.db'}"],
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add(Author(name="Jorge Amado"))
+        db.session.commit()
+
+    response = app.test_client().get("/authors")
+
+    assert response.status_code == 200
+    assert author_names(response) == ["Jorge Amado"]
+    assert app.extensions["replicas"].checks["replica_0"][1] is False
+
+
+def test_fallback_to_primary_during_view(tmp_path):
+    """
+    Test the list and detail views run again on the primary when the replica fails after its health check
+    """
+
+    primary = tmp_path / "primary.db"
+    replica = tmp_path / "replica.db"
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{primary}",
+        "DATABASE_REPLICA_URIS": [f"sqlite:///{replica}"],
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add(Author(name="Jorge Amado"))
+        db.session.commit()
+        # The replica answers the health check but has no catalog tables
+        TableVersion.__table__.create(db.get_engine(app, bind="replica_0"))
+
+    for url in ("/authors", "/books", "/authors/1"):
+        client = app.test_client()
+        app.extensions.pop("replicas", None)
+
+        assert client.get(url).status_code == 200
+        assert app.extensions["replicas"].checks["replica_0"][1] is False
@@ -0,0 +1,46 @@
+from tests.conftest import count_queries, get_url, json_of_response
+
+
+def test_search_view(app, client):
+    """
+    Test search books and authors
+    """
+
+    response = client.get(get_url(app=app, url="search.search_catalog"), query_string={"q": "sua"})
+    result = json_of_response(response)
+    assert response.status_code == 200
+    assert result["books"] == []
+    assert [author["name"] for author in result["authors"]] == ["Ariano Suassuna"]
+
+
+def test_search_ranking_view(app, client):
+    """
+    Test the best match comes first
+    """
+
+    response = client.get(get_url(app=app, url="search.search_catalog"), query_string={"q": "the"})
+    books = json_of_response(response)["books"]
+    assert [book["name"] for book in books] == ["The Saint and The Sow", "The Paul Street Boys"]
+
+
+def test_search_without_term_view(app, client):
+    """
+    Test search without the q argument
+    """
+
+    response = client.get(get_url(app=app, url="search.search_catalog"))
+    assert response.status_code == 400
+
+
+def test_search_loads_relationships_at_once_view(app, client):
+    """
+    Test the linked books and authors of the results are loaded with one query per table, not one per result
+    """
+
+    url = get_url(app=app, url="search.search_catalog")
+    client.get(url, query_string={"q": "the"})
+    with count_queries() as statements:
+        response = client.get(url, query_string={"q": "the"})
+
+    assert [book["authors"] for book in json_of_response(response)["books"]] == [[2], [1]]
+    assert len(statements) == 3
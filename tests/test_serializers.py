@@ -0,0 +1,28 @@
+import json
+
+from src import db, serializers
+from src.models import Book, books_schema
+from src.serializers import book_rows, dumps
+
+
+def test_row_serializer_matches_marshmallow(app):
+    """
+    Test the column-only serializer returns what the marshmallow schema returned for the listings
+    """
+
+    rows = db.session.query(*book_rows.columns(Book)).order_by(Book.id).all()
+    books = Book.query.order_by(Book.id).all()
+
+    assert book_rows.dump(rows) == books_schema.dump(books, many=True)
+
+
+def test_dumps_without_orjson(monkeypatch):
+    """
+    Test the standard json module is used when orjson is not installed
+    """
+
+    value = {"results": [{"id": 1, "name": "Liliom", "authors": [1, 2]}]}
+    monkeypatch.setattr(serializers, "orjson", None)
+
+    assert dumps(value) == b'{"results":[{"id":1,"name":"Liliom","authors":[1,2]}]}'
+    assert json.loads(dumps(value)) == value
@@ -0,0 +1,111 @@
+import json
+from types import SimpleNamespace
+
+from src.slow_queries import explain, explain_prefix, normalize_statement, slow_queries_command
+from tests.conftest import get_url
+
+
+def read_log(path) -> list:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_slow_query_logged_with_plan_view(app, client, tmp_path):
+    """
+    Test a statement over the threshold is logged with its parameters, its view and its query plan
+    """
+
+    log_path = tmp_path / "slow.log"
+    app.config.update(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=str(log_path))
+
+    client.get(get_url(app=app, url="book.list_books"), query_string={"publication_year__gte": 2000})
+    entries = [entry for entry in read_log(log_path) if "publication_year >=" in entry["statement"]]
+
+    assert entries
+    assert entries[0]["origin"] == "book.list_books"
+    assert "2000" in entries[0]["parameters"]
+    assert any("ix_books_publication_year" in line for line in entries[0]["plan"])
+
+
+def test_fast_queries_are_not_logged_view(app, client, tmp_path):
+    """
+    Test the statements under the threshold are not logged
+    """
+
+    log_path = tmp_path / "slow.log"
+    app.config.update(SLOW_QUERY_THRESHOLD_MS=10000, SLOW_QUERY_LOG=str(log_path))
+    client.get(get_url(app=app, url="book.list_books"))
+
+    assert not log_path.exists()
+
+
+def test_slow_queries_command(app, client, tmp_path):
+    """
+    Test the CLI groups the logged statements and lists the highest total time first
+    """
+
+    log_path = tmp_path / "slow.log"
+    entries = [
+        {"duration_ms": 300, "origin": "book.list_books", "statement": "SELECT * FROM books WHERE id IN (?, ?)",
+         "plan": ["SCAN books"]},
+        {"duration_ms": 500, "origin": "author.list_authors", "statement": "SELECT * FROM books WHERE id IN (?)",
+         "plan": ["SEARCH books"]},
+        {"duration_ms": 700, "origin": "book.book_detail", "statement": "SELECT * FROM authors", "plan": []},
+    ]
+    log_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    result = app.test_cli_runner().invoke(slow_queries_command, ["--log", str(log_path), "--top", "1"])
+
+    assert result.exit_code == 0
+    assert "1. 2 x, total 800 ms, max 500 ms" in result.output
+    assert "SELECT * FROM books WHERE id IN (...)" in result.output
+    assert "SEARCH books" in result.output
+    assert "SELECT * FROM authors" not in result.output
+
+
+def test_normalize_statement():
+    """
+    Test the statements differing only by the size of their IN lists are grouped
+    """
+
+    assert normalize_statement("SELECT id\n  FROM books WHERE id IN (?, ?, ?)") == "SELECT id FROM books WHERE id IN (...)"
+
+
+class FailingExplainCursor:
+    def __init__(self, executed: list):
+        self.executed = executed
+
+    def execute(self, statement, parameters=None):
+        self.executed.append(statement)
+        if statement.startswith("EXPLAIN"):
+            raise RuntimeError("syntax error")
+
+    def close(self):
+        pass
+
+
+def test_failed_explain_is_rolled_back_to_a_savepoint():
+    """
+    Test a failed EXPLAIN on PostgreSQL does not leave the transaction of the request aborted
+    """
+
+    executed = []
+    conn = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"),
+                           connection=SimpleNamespace(cursor=lambda: FailingExplainCursor(executed)))
+
+    plan = explain(conn, "SELECT * FROM books WHERE id = %s", (1,))
+
+    assert plan == ["EXPLAIN failed: syntax error"]
+    assert executed == ["SAVEPOINT slow_query_explain", "EXPLAIN SELECT * FROM books WHERE id = %s",
+                        "ROLLBACK TO SAVEPOINT slow_query_explain"]
+
+
+def test_explain_analyze_only_plain_selects():
+    """
+    Test EXPLAIN ANALYZE is opt-in and never runs a statement that may write
+    """
+
+    assert explain_prefix("postgresql", "SELECT", analyze=False) == "EXPLAIN "
+    assert explain_prefix("postgresql", "SELECT", analyze=True) == "EXPLAIN ANALYZE "
+    assert explain_prefix("postgresql", "WITH", analyze=True) == "EXPLAIN "
+    assert explain_prefix("postgresql", "DELETE", analyze=True) == "EXPLAIN "
+    assert explain_prefix("sqlite", "SELECT", analyze=True) == "EXPLAIN QUERY PLAN "
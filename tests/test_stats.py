@@ -0,0 +1,149 @@
+import io
+import json
+
+from src import db
+from src.models import CatalogTotal, YearStat
+from src.stats.summary import postgresql_create_statements, rebuild_stats_command, SHARD_EXPRESSIONS, stats_triggers
+from tests.conftest import count_queries, get_url, json_of_response
+
+
+def get_stats(app, client) -> dict:
+    response = client.get(get_url(app=app, url="stats.catalog_stats"))
+    assert response.status_code == 200
+    return json_of_response(response)
+
+
+def test_stats_view(app, client):
+    """
+    Test the totals, books per year and top authors of the catalog
+    """
+
+    stats = get_stats(app, client)
+    assert stats["totals"] == {"authors": 2, "books": 2}
+    assert stats["books_per_year"] == [{"publication_year": 1934, "books": 1}, {"publication_year": 2002, "books": 1}]
+    assert stats["top_authors"] == [{"id": 1, "name": "Molnar Ferenc", "books": 1},
+                                    {"id": 2, "name": "Ariano Suassuna", "books": 1}]
+
+
+def test_stats_follow_the_write_views(app, client):
+    """
+    Test adding, editing and deleting books and authors updates the stats in the same request
+    """
+
+    response = client.post(
+        get_url(app=app, url="book.add_book"),
+        data=json.dumps({"name": "Liliom", "edition": "1st Edition", "publication_year": "1934", "authors": [1]}),
+        content_type="application/json",
+    )
+    assert response.status_code == 201
+    book_id = json_of_response(response)["id"]
+
+    stats = get_stats(app, client)
+    assert stats["totals"]["books"] == 3
+    assert stats["books_per_year"][0] == {"publication_year": 1934, "books": 2}
+    assert stats["top_authors"][0] == {"id": 1, "name": "Molnar Ferenc", "books": 2}
+
+    response = client.put(get_url(app=app, url="book.edit_book", id=book_id),
+                          data=json.dumps({"publication_year": "1909"}), content_type="application/json")
+    assert response.status_code == 200
+    assert get_stats(app, client)["books_per_year"][:2] == [{"publication_year": 1909, "books": 1},
+                                                            {"publication_year": 1934, "books": 1}]
+
+    assert client.delete(get_url(app=app, url="author.delete_author", id=1)).status_code == 200
+    stats = get_stats(app, client)
+    assert stats["totals"] == {"authors": 1, "books": 3}
+    assert [author["id"] for author in stats["top_authors"]] == [2]
+
+    assert client.delete(get_url(app=app, url="book.delete_books"),
+                         query_string={"publication_year__lt": 2000}).status_code == 200
+    stats = get_stats(app, client)
+    assert stats["totals"] == {"authors": 1, "books": 1}
+    assert stats["books_per_year"] == [{"publication_year": 2002, "books": 1}]
+
+
+def test_stats_follow_the_bulk_import(app, client):
+    """
+    Test the books imported in bulk are counted
+    """
+
+    csv_file = (
+        "name,edition,publication_year,authors\n"
+        "Auto da Compadecida,1st Edition,1955,Ariano Suassuna\n"
+        "Liliom,2nd Edition,1909,1;2\n"
+    )
+    response = client.post(
+        get_url(app=app, url="book.add_book_bulk"),
+        data={"csv_upload": (io.BytesIO(csv_file.encode("utf8")), "books.csv")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 201
+
+    stats = get_stats(app, client)
+    assert stats["totals"] == {"authors": 2, "books": 4}
+    assert len(stats["books_per_year"]) == 4
+    assert stats["top_authors"][0] == {"id": 2, "name": "Ariano Suassuna", "books": 3}
+
+
+def test_stats_read_the_summary_tables(app, client):
+    """
+    Test the stats do not scan the catalog tables
+    """
+
+    with count_queries() as statements:
+        get_stats(app, client)
+
+    assert not any("FROM books" in statement or "count(" in statement.lower() for statement in statements)
+
+
+def test_stats_add_up_the_shards(app, client):
+    """
+    Test the totals and year counts written to other shards by concurrent PostgreSQL transactions are added up
+    """
+
+    db.session.add_all([CatalogTotal(name="books", shard=3, total=5), YearStat(publication_year=1934, shard=7, books=2),
+                        YearStat(publication_year=1950, shard=2, books=-1), YearStat(publication_year=1950, books=1)])
+    db.session.commit()
+
+    stats = get_stats(app, client)
+    assert stats["totals"] == {"authors": 2, "books": 7}
+    assert stats["books_per_year"] == [{"publication_year": 1934, "books": 3}, {"publication_year": 2002, "books": 1}]
+
+
+def test_postgresql_triggers_spread_the_counters():
+    """
+    Test the PostgreSQL triggers pick the shard of the totals and years from the transaction
+    """
+
+    function, trigger = postgresql_create_statements("books", stats_triggers(SHARD_EXPRESSIONS["postgresql"])["books"])
+
+    assert "SELECT 'books', (txid_current() & 15), 1" in function
+    assert "ON CONFLICT (publication_year, shard)" in function
+    assert trigger.startswith("CREATE TRIGGER books_stats AFTER INSERT OR DELETE OR UPDATE OF publication_year")
+
+
+def test_author_stats_view(app, client):
+    """
+    Test the book count of one author
+    """
+
+    response = client.get(get_url(app=app, url="stats.author_stats", id=2))
+    assert response.status_code == 200
+    assert json_of_response(response) == {"id": 2, "name": "Ariano Suassuna", "books": 1}
+
+    response = client.get(get_url(app=app, url="stats.author_stats", id=1000000))
+    assert response.status_code == 404
+
+
+def test_rebuild_stats_command(app, client):
+    """
+    Test the CLI recomputes summary tables that drifted from the catalog
+    """
+
+    db.session.execute(YearStat.__table__.update().values(books=100))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(rebuild_stats_command)
+
+    assert result.exit_code == 0
+    assert "Rebuilt the stats of 2 authors and 2 books." in result.output
+    assert [year["books"] for year in get_stats(app, client)["books_per_year"]] == [1, 1]
@@ -0,0 +1,120 @@
+import json
+from datetime import datetime, timedelta
+
+from werkzeug.http import http_date
+
+from src import db
+from src.models import Book, TableVersion
+from tests.conftest import count_queries, get_url
+
+
+def get_version(name: str) -> int:
+    return db.session.query(TableVersion.version).filter_by(name=name).scalar()
+
+
+def date_back_versions(seconds: int = 60):
+    """
+    Move the dates of the fixture writes to a past second, whose Last-Modified date can be announced
+    """
+
+    updated_at = datetime.utcnow().replace(microsecond=0) - timedelta(seconds=seconds)
+    db.session.execute(TableVersion.__table__.update().values(updated_at=updated_at))
+    db.session.commit()
+
+
+def test_book_detail_not_modified_view(app, client):
+    """
+    Test a matching If-None-Match gets a 304 without querying the books
+    """
+
+    date_back_versions()
+    url = get_url(app=app, url="book.book_detail", id=1)
+    response = client.get(url)
+    etag = response.headers["ETag"]
+
+    assert response.status_code == 200
+    assert response.headers["Last-Modified"]
+
+    with count_queries() as queries:
+        response = client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.get_data() == b""
+    assert all("table_versions" in query for query in queries)
+
+
+def test_book_detail_etag_changes_with_writes_view(app, client):
+    """
+    Test a write to the books makes the previous ETag stale
+    """
+
+    url = get_url(app=app, url="book.book_detail", id=1)
+    etag = client.get(url).headers["ETag"]
+
+    client.put(get_url(app=app, url="book.edit_book", id=2), data=json.dumps({"edition": "4th Edition"}),
+               content_type="application/json")
+    response = client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_list_books_if_modified_since_view(app, client):
+    """
+    Test a request with the Last-Modified date gets a 304, and the ETag depends on the query string
+    """
+
+    date_back_versions()
+    url = get_url(app=app, url="book.list_books")
+    response = client.get(url)
+
+    assert client.get(url, headers={"If-Modified-Since": response.headers["Last-Modified"]}).status_code == 304
+    assert client.get(url, query_string={"limit": 1}).headers["ETag"] != response.headers["ETag"]
+
+
+def test_if_none_match_takes_precedence_view(app, client):
+    """
+    Test a stale ETag gets a 200 even when the Last-Modified date sent with it is current
+    """
+
+    date_back_versions()
+    url = get_url(app=app, url="book.list_books")
+    response = client.get(url)
+
+    headers = {"If-None-Match": '"stale"', "If-Modified-Since": response.headers["Last-Modified"]}
+    assert client.get(url, headers=headers).status_code == 200
+
+
+def test_last_modified_within_the_second_of_a_write_view(app, client):
+    """
+    Test no Last-Modified date is announced, or honoured, before the second of the last write is over
+    """
+
+    date_back_versions(seconds=-5)
+    updated_at = db.session.query(TableVersion.updated_at).filter_by(name="books").scalar()
+
+    url = get_url(app=app, url="book.list_books")
+    response = client.get(url)
+    assert response.status_code == 200
+    assert "Last-Modified" not in response.headers
+
+    assert client.get(url, headers={"If-Modified-Since": http_date(updated_at)}).status_code == 200
+
+
+def test_version_bumped_in_the_writing_transaction(app):
+    """
+    Test a commit bumps the versions of the tables it wrote, and a rollback does not
+    """
+
+    version = get_version("books")
+
+    db.session.add(Book(name="Liliom", edition="1st Edition", publication_year=1909))
+    db.session.rollback()
+    assert get_version("books") == version
+
+    db.session.add(Book(name="Liliom", edition="1st Edition", publication_year=1909))
+    db.session.commit()
+    assert get_version("books") == version + 1
+    assert get_version("authors") == 1
+    assert db.session.query(TableVersion.updated_at).filter_by(name="books").scalar().microsecond == 0